@@ -1,6 +1,8 @@
 from .api import (
+    abort_change,
     check_change,
     check_changes,
+    iter_changes,
     enable,
     enable_all,
     disable,
@@ -26,7 +28,9 @@ from .api import (
     logs,
     list,
     list_all,
+    iter_list_all,
     get_conf,
+    get_conf_many,
     set_conf,
     get_confdb,
     set_confdb,
@@ -51,6 +55,7 @@ from .api import (
     get_assertion_types,
     get_assertions,
     add_assertion,
+    add_assertions,
     list_users,
     add_user,
     remove_user,
@@ -66,7 +71,59 @@ from .api import (
     update_recovery_key,
 )
 
-from .http import SnapdHttpException
+from .assertions import AssertionCache
+
+from .client import SnapdClient
+
+from .confbuffer import ConfWriteBuffer
+
+from .connections import ConnectionGraph
+
+from .fleet import Fleet, FleetResult
+
+from .changes import (
+    ChangeTracker,
+    await_change,
+    awatch_change,
+    wait_change,
+    watch_change,
+)
+
+from .http import (
+    AuthCancelled,
+    DNSFailure,
+    HTTPProtocolError,
+    InsufficientDiskSpace,
+    LoginRequired,
+    NetworkTimeout,
+    SnapAlreadyInstalled,
+    SnapChangeConflict,
+    SnapdHttpException,
+    SnapdResponseTooLarge,
+    SnapdUnavailable,
+    SnapNoUpdateAvailable,
+    SnapNotFound,
+    SnapNotInstalled,
+)
+
+from .limits import Limiter, RequestTiming, priority
+
+from .reconcilers import (
+    ConfResult,
+    Connection,
+    ConnectionsResult,
+    ReconcileResult,
+    SnapState,
+    connect_interfaces,
+    disconnect_interfaces,
+    reconcile,
+    reconcile_conf,
+    reconcile_connections,
+)
+
+from .retry import RetryPolicy
+
+from .scheduler import OperationScheduler
 
 from .types import (
     COMPLETE_STATUSES,
@@ -74,8 +131,11 @@ from .types import (
     SUCCESS_STATUSES,
     ERROR_STATUSES,
     SnapdResponse,
+    AddAssertionsResult,
+    ChangeUpdate,
     FormData,
     JsonData,
     AssertionData,
     FileUpload,
+    SpooledBody,
 )
@@ -15,8 +15,13 @@ from .apps import (
     stop,
     stop_all,
 )
-from .assertions import add_assertion, get_assertion_types, get_assertions
-from .changes import check_change, check_changes
+from .assertions import (
+    add_assertion,
+    add_assertions,
+    get_assertion_types,
+    get_assertions,
+)
+from .changes import abort_change, check_change, check_changes, iter_changes
 from .confdb import delegate_confdb, get_confdb, set_confdb, undelegate_confdb
 from .fde import generate_recovery_key, get_keyslots, update_recovery_key
 from .interfaces import (
@@ -26,7 +31,7 @@ from .interfaces import (
     get_interfaces,
 )
 from .model import get_model, remodel
-from .options import get_conf, set_conf
+from .options import get_conf, get_conf_many, set_conf
 from .snaps import (
     disable,
     disable_all,
@@ -36,6 +41,7 @@ from .snaps import (
     hold_all,
     install,
     install_all,
+    iter_list_all,
     list,
     list_all,
     refresh,
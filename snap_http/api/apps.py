@@ -1,14 +1,21 @@
-from typing import List
+from typing import List, Optional, Sequence
 
 from .. import http
-from ..types import SnapdResponse
+from ..types import SnapdResponse, projector
 
 
-def get_apps(names: List[str] = [], services_only: bool = False) -> SnapdResponse:
+def get_apps(
+    names: List[str] = [],
+    services_only: bool = False,
+    *,
+    fields: Optional[Sequence[str]] = None,
+) -> SnapdResponse:
     """List available apps.
 
     :param services_only: Return only services.
     :param names: List apps for the snaps in `names` only.
+    :param fields: if given, each app is returned as a named tuple of just these fields,
+        see `types.record_type`, decoded one app at a time.
     """
     query_params = {}
 
@@ -18,6 +25,8 @@ def get_apps(names: List[str] = [], services_only: bool = False) -> SnapdRespons
     if names:
         query_params["names"] = ",".join(names)
 
+    if fields is not None:
+        return http.get_mapped("/apps", projector(fields), query_params=query_params)
     return http.get("/apps", query_params=query_params)
 
 
@@ -1,7 +1,12 @@
-from typing import Any, Dict, Optional
+import os
+from itertools import islice
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from .. import http
-from ..types import AssertionData, SnapdResponse
+from ..assertions import ASSERTION_SEPARATOR, iter_assertions
+from ..types import AddAssertionsResult, AssertionData, SnapdResponse
+
+AssertionSource = Union[str, "os.PathLike[str]", IO[bytes], Iterable[Union[str, bytes]]]
 
 
 def get_assertion_types() -> SnapdResponse:
@@ -32,3 +37,90 @@ def add_assertion(assertion: str) -> SnapdResponse:
     """
     body = AssertionData(assertion)
     return http.post("/assertions", body)
+
+
+def add_assertions(
+    assertions: AssertionSource, *, batch_size: int = 100
+) -> AddAssertionsResult:
+    """Add many assertions to the system assertion database.
+
+    Assertions are sent to snapd `batch_size` at a time, each batch in a single request. snapd
+    checks a whole batch before committing any of it, so when a batch is rejected its
+    assertions are retried one by one to find out which of them failed. Assertions rejected
+    for lacking a prerequisite that comes later in the stream are retried once the rest of it
+    has been added.
+
+    Only snapd's rejections of the assertions themselves are recorded as failures. Other
+    errors, such as snapd being unreachable, are raised.
+
+    :param assertions: A path to a file of concatenated assertions, a binary file object of
+        concatenated assertions, or an iterable of individual assertions. Files are read
+        incrementally, so at most `batch_size` assertions, and those rejected, are held in
+        memory.
+    :param batch_size: The maximum number of assertions to send per request.
+    """
+    if isinstance(assertions, (str, os.PathLike)):
+        with open(assertions, "rb") as f:
+            return add_assertions(f, batch_size=batch_size)
+
+    if hasattr(assertions, "readline"):
+        encoded: Iterator[bytes] = iter_assertions(assertions)  # type: ignore[arg-type]
+    else:
+        encoded = (
+            a if isinstance(a, bytes) else a.encode()
+            for a in assertions  # type: ignore[union-attr]
+        )
+
+    result = AddAssertionsResult(added=0)
+    rejected: List[Tuple[bytes, Exception]] = []
+    while True:
+        batch = [*islice(encoded, batch_size)]
+        if not batch:
+            break
+
+        try:
+            http.post("/assertions", AssertionData(ASSERTION_SEPARATOR.join(batch)))
+            result.added += len(batch)
+        except http.SnapdHttpException as e:
+            if not _rejected(e):
+                raise
+            if len(batch) == 1:
+                rejected.append((batch[0], e))
+            else:
+                rejected += _add_one_by_one(batch, result)
+
+    # Retry until a round adds nothing, as each added assertion may be another's prerequisite.
+    while rejected:
+        retried = _add_one_by_one([assertion for assertion, _ in rejected], result)
+        if len(retried) == len(rejected):
+            break
+        rejected = retried
+
+    result.failures = rejected
+    return result
+
+
+def _rejected(exception: http.SnapdHttpException) -> bool:
+    """Whether snapd rejected the request itself, rather than failing to answer it."""
+    if not exception.result:
+        return False
+
+    status = (exception.json or {}).get("status-code", 400)
+    return 400 <= status < 500
+
+
+def _add_one_by_one(
+    batch: List[bytes], result: AddAssertionsResult
+) -> List[Tuple[bytes, Exception]]:
+    """Add each assertion in `batch` separately, returning those snapd rejected."""
+    rejected: List[Tuple[bytes, Exception]] = []
+    for assertion in batch:
+        try:
+            http.post("/assertions", AssertionData(assertion))
+            result.added += 1
+        except http.SnapdHttpException as e:
+            if not _rejected(e):
+                raise
+            rejected.append((assertion, e))
+
+    return rejected
@@ -1,3 +1,5 @@
+from typing import Any, Dict, Iterator, Literal, Optional
+
 from .. import http
 from ..types import  SnapdResponse
 
@@ -7,6 +9,47 @@ def check_change(cid: str) -> SnapdResponse:
     return http.get("/changes/" + cid)
 
 
-def check_changes() -> SnapdResponse:
-    """Checks the status of all snapd changes."""
-    return http.get("/changes?select=all")
+def check_changes(
+    select: Literal["all", "in-progress", "ready"] = "all",
+    *,
+    for_snap: Optional[str] = None,
+) -> SnapdResponse:
+    """Checks the status of snapd changes.
+
+    :param select: which changes to return; "in-progress" for changes that are not yet ready,
+        "ready" for those that are.
+    :param for_snap: if given, return only changes affecting the snap with this name.
+    """
+    query_params: Dict[str, str] = {"select": select}
+    if for_snap is not None:
+        query_params["for"] = for_snap
+
+    return http.get("/changes", query_params=query_params)
+
+
+def iter_changes(
+    select: Literal["all", "in-progress", "ready"] = "all",
+    *,
+    for_snap: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Like `check_changes`, but yields a summary of each change, without its tasks.
+
+    Changes are yielded as they are received, see `http.iter_result`. Each change's tasks are
+    still decoded before being dropped, but only one change's are held in memory at a time.
+    """
+    query_params: Dict[str, str] = {"select": select}
+    if for_snap is not None:
+        query_params["for"] = for_snap
+
+    for change in http.iter_result("/changes", query_params=query_params):
+        change.pop("tasks", None)
+        yield change
+
+
+def abort_change(cid: str) -> SnapdResponse:
+    """Aborts the snapd change with id `cid`.
+
+    Tasks of the change that have not yet run are put on hold, and those in progress are
+    undone where possible.
+    """
+    return http.post("/changes/" + cid, {"action": "abort"})
@@ -1,17 +1,23 @@
-from typing import Optional
+from typing import Optional, Sequence
 
 from .. import http
-from ..types import SnapdResponse
+from ..types import SnapdResponse, projector
 
 
 def get_connections(
-    snap: Optional[str] = None, select: Optional[str] = None, interface: Optional[str] = None
+    snap: Optional[str] = None,
+    select: Optional[str] = None,
+    interface: Optional[str] = None,
+    *,
+    fields: Optional[Sequence[str]] = None,
 ) -> SnapdResponse:
     """Retrieve connections from snapd.
 
     :param snap: Optional; The name of the snap to filter connections.
     :param select: Optional; When set to all, unconnected slots and plugs are included in the results.
     :param interface: Optional; Limit results to the selected interface.
+    :param fields: Optional; Return each connection, plug and slot as a named tuple of just these
+        fields, see `types.record_type`. Fields that only some of them have are `None` on others.
     :return: A SnapdResponse containing the snapd response for the connections query.
     """
     query_params = {
@@ -24,7 +30,15 @@ def get_connections(
         if v
     }
 
-    return http.get("/connections", query_params=query_params)
+    response = http.get("/connections", query_params=query_params)
+    if fields is not None:
+        project = projector(fields)
+        response.result = {
+            kind: [project(obj) for obj in objs]
+            for kind, objs in response.result.items()  # type: ignore[union-attr]
+        }
+
+    return response
 
 
 def get_interfaces(
@@ -1,4 +1,6 @@
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 from .. import http
 from ..types import SnapdResponse
@@ -18,6 +20,32 @@ def get_conf(name: str, *, keys: Optional[List[str]] = None) -> SnapdResponse:
     return http.get(f"/snaps/{name}/conf", query_params=query_params)
 
 
+def get_conf_many(
+    names: Iterable[str], *, keys: Optional[List[str]] = None, max_workers: int = 8
+) -> Dict[str, Union[Dict[str, Any], Exception]]:
+    """Get the configuration details for each snap in `names`, concurrently.
+
+    :param names: the names of the snaps.
+    :param keys: retrieve the configuration for these specific `keys` of each snap.
+    :param max_workers: the most requests to make at once.
+    :return: each snap's configuration by name, or the exception getting it raised.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name: executor.submit(copy_context().run, get_conf, name, keys=keys)
+            for name in dict.fromkeys(names)
+        }
+
+    configs: Dict[str, Union[Dict[str, Any], Exception]] = {}
+    for name, future in futures.items():
+        try:
+            configs[name] = future.result().result  # type: ignore[assignment]
+        except Exception as e:
+            configs[name] = e
+
+    return configs
+
+
 def set_conf(name: str, config: Dict[str, Any]) -> SnapdResponse:
     """Set the configuration details for the snap `name`.
 
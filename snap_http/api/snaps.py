@@ -1,7 +1,7 @@
-from typing import Dict, List, Literal, Optional, Union, Iterable
+from typing import Any, Dict, Iterator, List, Literal, Optional, Sequence, Union, Iterable
 
 from .. import http
-from ..types import FileUpload, FormData, SnapdResponse
+from ..types import FileUpload, FormData, SnapdResponse, projector
 
 
 def enable(name: str) -> SnapdResponse:
@@ -244,25 +244,42 @@ def unhold_all(names: List[str]) -> SnapdResponse:
     return http.post("/snaps", {"action": "unhold", "snaps": names})
 
 
-def list(*, snaps: Optional[Iterable[str]] = None) -> SnapdResponse:
+def list(
+    *, snaps: Optional[Iterable[str]] = None, fields: Optional[Sequence[str]] = None
+) -> SnapdResponse:
     """GETs a list of installed snaps.
 
     This stomps on builtins.list, so please import it namespaced.
 
     :param snaps: An optional iterable of snap names by which to filter.
+    :param fields: if given, each snap is returned as a named tuple of just these fields,
+        see `types.record_type`, decoded one snap at a time.
     """
     query_params = {}
     if snaps is not None:
         query_params["snaps"] = ",".join(snaps)
+    if fields is not None:
+        return http.get_mapped("/snaps", projector(fields), query_params=query_params)
     return http.get("/snaps", query_params=query_params)
 
 
-def list_all() -> SnapdResponse:
+def list_all(*, fields: Optional[Sequence[str]] = None) -> SnapdResponse:
     """GETs a list of all installed snaps including disabled ones.
+
+    :param fields: if given, each snap is returned as a named tuple of just these fields,
+        see `types.record_type`, decoded one snap at a time.
     """
+    if fields is not None:
+        return http.get_mapped("/snaps", projector(fields), query_params={"select": "all"})
     return http.get("/snaps?select=all")
 
 
+def iter_list_all() -> Iterator[Dict[str, Any]]:
+    """Like `list_all`, but yields each snap as soon as it is received.
+    """
+    return http.iter_result("/snaps", query_params={"select": "all"})
+
+
 def logs(names: List[str], entries: int = 10) -> SnapdResponse:
     """GETs snap logs.
     """
@@ -0,0 +1,295 @@
+"""Helpers for working with snapd assertions on the client side.
+
+Assertions are a line-oriented text format: a block of headers, an optional body (whose length
+is given by the `body-length` header), and a signature, each separated by a blank line. Streams
+of assertions, as returned by `/v2/assertions/{type}`, are separated by blank lines too.
+
+`AssertionCache` keeps a persistent SQLite-backed store of assertions, indexed by assertion type
+and primary key, so that repeat lookups don't need a round-trip to snapd.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import sqlite3
+import threading
+import time
+from io import BytesIO
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from . import api
+from .types import SnapdResponse
+
+# The headers that uniquely identify an assertion of a given type, in snapd's order.
+# See https://github.com/canonical/snapd/tree/master/asserts
+PRIMARY_KEYS: Dict[str, Tuple[str, ...]] = {
+    "account": ("account-id",),
+    "account-key": ("public-key-sha3-384",),
+    "base-declaration": ("series",),
+    "confdb-schema": ("account-id", "name"),
+    "model": ("series", "brand-id", "model"),
+    "preseed": ("series", "brand-id", "model", "system-label"),
+    "repair": ("brand-id", "repair-id"),
+    "serial": ("brand-id", "model", "serial"),
+    "snap-declaration": ("series", "snap-id"),
+    "snap-revision": ("snap-sha3-384",),
+    "store": ("store",),
+    "system-user": ("brand-id", "email"),
+    "validation": ("series", "snap-id", "approved-snap-id", "approved-snap-revision"),
+    "validation-set": ("series", "account-id", "name", "sequence"),
+}
+
+ASSERTION_SEPARATOR = b"\n\n"
+
+
+def iter_assertions(stream: IO[bytes]) -> Iterator[bytes]:
+    """Yield each encoded assertion from a binary `stream` of concatenated assertions.
+
+    The stream is consumed line by line, so only one assertion is held in memory at a time.
+    """
+    while True:
+        line = stream.readline()
+        while line in (b"\n", b"\r\n"):
+            line = stream.readline()
+
+        if not line:
+            return
+
+        headers = []
+        body_length = 0
+        while line and line not in (b"\n", b"\r\n"):
+            if line.startswith(b"body-length:"):
+                body_length = int(line.split(b":", 1)[1])
+            headers.append(line)
+            line = stream.readline()
+
+        parts = [b"".join(headers).rstrip(b"\n")]
+        if body_length:
+            parts.append(stream.read(body_length))
+            stream.read(len(ASSERTION_SEPARATOR))
+
+        signature = []
+        line = stream.readline()
+        while line and line not in (b"\n", b"\r\n"):
+            signature.append(line)
+            line = stream.readline()
+
+        parts.append(b"".join(signature).rstrip(b"\n"))
+        yield ASSERTION_SEPARATOR.join(parts)
+
+
+def split_assertions(data: bytes) -> List[bytes]:
+    """Split `data`, a stream of concatenated assertions, into the individual assertions.
+
+    A spooled `data` is read through its mapping from the start, rather than copied.
+    """
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+        return [*iter_assertions(data)]  # type: ignore[arg-type]
+
+    return [*iter_assertions(BytesIO(data))]
+
+
+def parse_headers(assertion: bytes) -> Dict[str, str]:
+    """Parse the top-level, single-line headers of an encoded `assertion`.
+
+    Multi-line (list or map) headers are not needed to identify an assertion and are skipped.
+    """
+    headers_block = assertion.split(ASSERTION_SEPARATOR, 1)[0].decode()
+    headers = {}
+    for line in headers_block.splitlines():
+        if line.startswith(" ") or ": " not in line:
+            continue
+
+        key, value = line.split(": ", 1)
+        headers[key] = value
+
+    return headers
+
+
+def primary_key(assertion_type: str, headers: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    """Get the primary key of an assertion of `assertion_type` from its `headers`.
+
+    Returns `None` if the type is unknown or `headers` doesn't contain the full primary key.
+    """
+    key_headers = PRIMARY_KEYS.get(assertion_type)
+    if key_headers is None or not all(k in headers for k in key_headers):
+        return None
+
+    return tuple(str(headers[k]) for k in key_headers)
+
+
+class AssertionCache:
+    """A persistent, local store of assertions fetched from snapd.
+
+    Assertions are indexed by type and primary key, along with their revision. Lookups are
+    answered locally until they are older than `max_age` seconds, after which snapd is asked
+    again in case a newer revision has been added. Assertions added through the cache are
+    stored immediately, so they never need revalidating.
+
+    Types without a known primary key (see `PRIMARY_KEYS`) are always fetched from snapd.
+    """
+
+    def __init__(self, path: str, *, max_age: Optional[float] = 3600.0) -> None:
+        """Open (or create) the cache database at `path`.
+
+        :param path: path to the SQLite database. ":memory:" gives a non-persistent cache.
+        :param max_age: seconds before a cached lookup is revalidated against snapd. `None`
+            means lookups are never revalidated.
+        """
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS assertions ("
+                " type TEXT NOT NULL,"
+                " primary_key TEXT NOT NULL,"
+                " revision INTEGER NOT NULL,"
+                " content BLOB NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (type, primary_key))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                " type TEXT NOT NULL,"
+                " filters TEXT NOT NULL,"
+                " primary_keys TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (type, filters))"
+            )
+
+    def close(self) -> None:
+        """Close the underlying database."""
+        self._db.close()
+
+    def get_assertions(
+        self, assertion_type: str, filters: Optional[Dict[str, Any]] = None
+    ) -> SnapdResponse:
+        """Like `api.get_assertions`, but answered from the cache where possible."""
+        if assertion_type not in PRIMARY_KEYS:
+            return api.get_assertions(assertion_type, filters=filters)
+
+        filters = filters or {}
+        cached = self._lookup(assertion_type, filters)
+        if cached is not None:
+            return _assertions_response(cached)
+
+        response = api.get_assertions(assertion_type, filters=filters)
+        assertions = split_assertions(response.result)  # type: ignore[arg-type]
+        self._store(assertion_type, filters, assertions)
+
+        return response
+
+    def add_assertion(self, assertion: str) -> SnapdResponse:
+        """Like `api.add_assertion`, additionally storing `assertion` in the cache."""
+        response = api.add_assertion(assertion)
+
+        encoded = assertion.encode()
+        headers = parse_headers(encoded)
+        assertion_type = headers.get("type", "")
+        if primary_key(assertion_type, headers) is not None:
+            with self._lock, self._db:
+                self._upsert(assertion_type, encoded, time.time())
+                # A new assertion may match previously-empty or partial queries.
+                self._db.execute("DELETE FROM queries WHERE type = ?", (assertion_type,))
+
+        return response
+
+    def invalidate(self, assertion_type: Optional[str] = None) -> None:
+        """Forget cached lookups, for `assertion_type` only if given, so they are revalidated."""
+        with self._lock, self._db:
+            if assertion_type is None:
+                self._db.execute("DELETE FROM queries")
+                self._db.execute("UPDATE assertions SET fetched_at = 0")
+            else:
+                self._db.execute("DELETE FROM queries WHERE type = ?", (assertion_type,))
+                self._db.execute(
+                    "UPDATE assertions SET fetched_at = 0 WHERE type = ?", (assertion_type,)
+                )
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return self.max_age is None or time.time() - fetched_at < self.max_age
+
+    def _lookup(self, assertion_type: str, filters: Dict[str, Any]) -> Optional[List[bytes]]:
+        """Find the assertions matching `filters` in the cache, if they are fresh."""
+        key = primary_key(assertion_type, filters)
+
+        with self._lock:
+            if key is not None:
+                row = self._db.execute(
+                    "SELECT content, fetched_at FROM assertions"
+                    " WHERE type = ? AND primary_key = ?",
+                    (assertion_type, json.dumps(key)),
+                ).fetchone()
+                if row is not None and self._is_fresh(row[1]):
+                    content = bytes(row[0])
+                    headers = parse_headers(content)
+                    if all(headers.get(k) == str(v) for k, v in filters.items()):
+                        return [content]
+
+            row = self._db.execute(
+                "SELECT primary_keys, fetched_at FROM queries WHERE type = ? AND filters = ?",
+                (assertion_type, _canonical(filters)),
+            ).fetchone()
+            if row is None or not self._is_fresh(row[1]):
+                return None
+
+            assertions = []
+            for key_json in json.loads(row[0]):
+                found = self._db.execute(
+                    "SELECT content FROM assertions WHERE type = ? AND primary_key = ?",
+                    (assertion_type, key_json),
+                ).fetchone()
+                if found is None:
+                    return None
+                assertions.append(bytes(found[0]))
+
+        return assertions
+
+    def _store(
+        self, assertion_type: str, filters: Dict[str, Any], assertions: List[bytes]
+    ) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            keys = [self._upsert(assertion_type, a, now) for a in assertions]
+            self._db.execute(
+                "INSERT OR REPLACE INTO queries (type, filters, primary_keys, fetched_at)"
+                " VALUES (?, ?, ?, ?)",
+                (assertion_type, _canonical(filters), json.dumps(keys), now),
+            )
+
+    def _upsert(self, assertion_type: str, assertion: bytes, fetched_at: float) -> str:
+        """Store `assertion` unless a newer revision is already cached, returning its key."""
+        headers = parse_headers(assertion)
+        key_json = json.dumps(primary_key(assertion_type, headers))
+        revision = int(headers.get("revision", 0))
+
+        self._db.execute(
+            "INSERT INTO assertions (type, primary_key, revision, content, fetched_at)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (type, primary_key) DO UPDATE SET"
+            "  content = CASE WHEN excluded.revision >= revision"
+            "   THEN excluded.content ELSE content END,"
+            "  revision = MAX(revision, excluded.revision),"
+            "  fetched_at = excluded.fetched_at",
+            (assertion_type, key_json, revision, assertion, fetched_at),
+        )
+
+        return key_json
+
+
+def _canonical(filters: Dict[str, Any]) -> str:
+    return json.dumps({k: str(v) for k, v in filters.items()}, sort_keys=True)
+
+
+def _assertions_response(assertions: List[bytes]) -> SnapdResponse:
+    """Build a response shaped like snapd's for a stream of `assertions`."""
+    return SnapdResponse(
+        type="sync",
+        status_code=200,
+        status="OK",
+        result=ASSERTION_SEPARATOR.join(assertions),  # type: ignore[arg-type]
+    )
+
@@ -0,0 +1,348 @@
+"""Helpers for following snapd changes to completion.
+
+Most mutating snapd operations are asynchronous: they return a change ID straight away, and the
+change's status has to be polled with `check_change` until it is complete.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from contextvars import copy_context
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from . import api, http
+from .types import COMPLETE_STATUSES, ChangeUpdate, SnapdResponse
+
+logger = logging.getLogger(__name__)
+
+# Errors that say nothing about the change being polled, only that this poll failed.
+_TRANSIENT_ERRORS = (OSError, http.HTTPProtocolError)
+
+T = TypeVar("T")
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_MAX_INTERVAL = 2.0
+
+
+class _ChangeDiffer:
+    """Tracks the last seen state of a change, to compute the delta of each new poll."""
+
+    def __init__(self) -> None:
+        self.status: Optional[str] = None
+        self.tasks: Dict[str, Tuple[str, int, int]] = {}
+
+    def update(self, response: SnapdResponse) -> Optional[ChangeUpdate]:
+        """Return a `ChangeUpdate` for `response`, or `None` if nothing changed."""
+        change: Dict[str, Any] = response.result  # type: ignore[assignment]
+        changed_tasks = []
+        done = total = 0
+
+        for task in change.get("tasks", []):
+            progress = task.get("progress", {})
+            state = (task["status"], progress.get("done", 0), progress.get("total", 0))
+            done += state[1]
+            total += state[2]
+
+            if self.tasks.get(task["id"]) != state:
+                self.tasks[task["id"]] = state
+                changed_tasks.append(task)
+
+        if not changed_tasks and change["status"] == self.status:
+            return None
+
+        self.status = change["status"]
+        return ChangeUpdate(
+            id=change["id"],
+            status=change["status"],
+            tasks=changed_tasks,
+            done=done,
+            total=total,
+            err=change.get("err"),
+        )
+
+
+async def _run_in_executor(func: Callable[..., T], *args: Any) -> T:
+    """Run `func(*args)` in the default executor, with the caller's `SnapdClient` active."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, copy_context().run, func, *args)
+
+
+def _next_interval(interval: float, changed: bool, base: float, maximum: float) -> float:
+    """Back off polling while a change is quiet, returning to `base` as soon as it moves."""
+    return base if changed else min(interval * 2, maximum)
+
+
+def watch_change(
+    cid: str,
+    *,
+    interval: float = DEFAULT_INTERVAL,
+    max_interval: float = DEFAULT_MAX_INTERVAL,
+) -> Iterator[ChangeUpdate]:
+    """Poll the change with id `cid`, yielding an update each time it progresses.
+
+    Each `ChangeUpdate` carries only the tasks that changed status or progress since the
+    previous one. Iteration stops after the update in which the change becomes ready.
+
+    :param interval: seconds to wait between polls while the change is progressing.
+    :param max_interval: polling backs off up to this many seconds while the change is quiet.
+    """
+    differ = _ChangeDiffer()
+    delay = interval
+
+    while True:
+        update = differ.update(api.check_change(cid))
+        if update is not None:
+            yield update
+            if update.ready:
+                return
+
+        delay = _next_interval(delay, update is not None, interval, max_interval)
+        time.sleep(delay)
+
+
+async def awatch_change(
+    cid: str,
+    *,
+    interval: float = DEFAULT_INTERVAL,
+    max_interval: float = DEFAULT_MAX_INTERVAL,
+) -> AsyncIterator[ChangeUpdate]:
+    """Like `watch_change`, but for use with asyncio.
+
+    Requests to snapd are made in the event loop's default executor.
+    """
+    differ = _ChangeDiffer()
+    delay = interval
+
+    while True:
+        response = await _run_in_executor(api.check_change, cid)
+        update = differ.update(response)
+        if update is not None:
+            yield update
+            if update.ready:
+                return
+
+        delay = _next_interval(delay, update is not None, interval, max_interval)
+        await asyncio.sleep(delay)
+
+
+def wait_change(
+    cid: str,
+    *,
+    timeout: Optional[float] = None,
+    abort: bool = False,
+    interval: float = DEFAULT_INTERVAL,
+    max_interval: float = DEFAULT_MAX_INTERVAL,
+) -> SnapdResponse:
+    """Wait for the change with id `cid` to complete, returning its final `check_change`.
+
+    :param timeout: seconds to wait before giving up with a `TimeoutError`.
+    :param abort: if `True`, abort the change in snapd when giving up on it, so that it stops
+        holding its snaps.
+    :param interval: seconds to wait before the first re-poll.
+    :param max_interval: polling backs off up to this many seconds.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = interval
+
+    while True:
+        response = api.check_change(cid)
+        if response.result["status"] in COMPLETE_STATUSES:  # type: ignore[call-overload]
+            return response
+
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if abort:
+                    _abort_quietly(cid)
+                raise TimeoutError(f"change {cid} did not complete within {timeout}s")
+            delay = min(delay, remaining)
+
+        time.sleep(delay)
+        delay = _next_interval(delay, False, interval, max_interval)
+
+
+async def await_change(
+    cid: str,
+    *,
+    timeout: Optional[float] = None,
+    abort: bool = False,
+    interval: float = DEFAULT_INTERVAL,
+    max_interval: float = DEFAULT_MAX_INTERVAL,
+) -> SnapdResponse:
+    """Like `wait_change`, but for use with asyncio.
+
+    With `abort`, the change is also aborted if the awaiting task is cancelled, e.g. by
+    `asyncio.wait_for`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    delay = interval
+
+    try:
+        while True:
+            response = await _run_in_executor(api.check_change, cid)
+            if response.result["status"] in COMPLETE_STATUSES:  # type: ignore[call-overload]
+                return response
+
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"change {cid} did not complete within {timeout}s")
+                delay = min(delay, remaining)
+
+            await asyncio.sleep(delay)
+            delay = _next_interval(delay, False, interval, max_interval)
+    except (TimeoutError, asyncio.CancelledError):
+        if abort:
+            await _run_in_executor(_abort_quietly, cid)
+        raise
+
+
+def _abort_quietly(cid: str) -> None:
+    """Abort change `cid`, ignoring failures; it may have become ready in the meantime."""
+    try:
+        api.abort_change(cid)
+    except http.SnapdHttpException:
+        pass
+
+
+class ChangeTracker:
+    """Follows many snapd changes to completion with a single shared poll.
+
+    Rather than each waiter polling `/changes/{id}`, the tracker periodically fetches the list
+    of in-progress changes once, and only fetches a change individually once it has dropped out
+    of that list. A background thread does the polling while any change is being tracked,
+    using the `SnapdClient` that was active when the tracker was created.
+
+    A poll that fails, e.g. because snapd is restarting, is logged and retried on the next
+    tick. Only errors about a change itself, such as it not being found, fail its waiters.
+    """
+
+    def __init__(self, *, interval: float = 0.5, max_failures: Optional[int] = 10) -> None:
+        """Initialize the tracker.
+
+        :param interval: seconds between polls of the in-progress changes.
+        :param max_failures: how many polls of the in-progress changes may fail in a row
+            before every tracked change is failed with the last error, or `None` to retry
+            forever. Fetching a single change is retried as many times.
+        """
+        self.interval = interval
+        self.max_failures = max_failures
+        self._failures = 0
+        self._change_failures: Dict[str, int] = {}
+        self._waiters: Dict[str, List["Future[SnapdResponse]"]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._context = copy_context()
+
+    def track(self, cid: str) -> "Future[SnapdResponse]":
+        """Track the change with id `cid`.
+
+        :return: a future resolving to the `check_change` response of the change once its
+            status is one of the `COMPLETE_STATUSES`.
+        """
+        future: "Future[SnapdResponse]" = Future()
+        with self._lock:
+            self._waiters.setdefault(cid, []).append(future)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._context.copy().run, args=(self._run,), daemon=True
+                )
+                self._thread.start()
+
+        return future
+
+    def atrack(self, cid: str) -> "asyncio.Future[SnapdResponse]":
+        """Like `track`, but returns an awaitable asyncio future."""
+        return asyncio.wrap_future(self.track(cid))
+
+    def poll(self) -> None:
+        """Check once on all tracked changes, resolving the futures of completed ones."""
+        with self._lock:
+            tracked = [*self._waiters]
+
+        if not tracked:
+            return
+
+        try:
+            response = api.check_changes("in-progress")
+        except Exception as e:
+            self._failures += 1
+            if self.max_failures is None or self._failures < self.max_failures:
+                logger.warning("polling in-progress changes failed, retrying: %s", e)
+                return
+
+            for cid in tracked:
+                self._resolve(cid, exception=e)
+            return
+
+        self._failures = 0
+        listed: List[Dict[str, Any]] = response.result  # type: ignore[assignment]
+        in_progress = {
+            change["id"] for change in listed if change["status"] not in COMPLETE_STATUSES
+        }
+
+        for cid in tracked:
+            if cid not in in_progress:
+                self._poll_change(cid)
+
+    def _poll_change(self, cid: str) -> None:
+        """Check on the change `cid`, which snapd no longer lists as in progress."""
+        try:
+            change = api.check_change(cid)
+        except _TRANSIENT_ERRORS as e:
+            failures = self._change_failures[cid] = self._change_failures.get(cid, 0) + 1
+            if self.max_failures is None or failures < self.max_failures:
+                logger.warning("polling change %s failed, retrying: %s", cid, e)
+            else:
+                self._resolve(cid, exception=e)
+            return
+        except Exception as e:
+            self._resolve(cid, exception=e)
+            return
+
+        self._change_failures.pop(cid, None)
+
+        if change.result["status"] in COMPLETE_STATUSES:  # type: ignore[call-overload]
+            self._resolve(cid, result=change)
+
+    def _resolve(
+        self,
+        cid: str,
+        *,
+        result: Optional[SnapdResponse] = None,
+        exception: Optional[BaseException] = None,
+    ) -> None:
+        with self._lock:
+            futures = self._waiters.pop(cid, [])
+        self._change_failures.pop(cid, None)
+
+        for future in futures:
+            try:
+                if exception is not None:
+                    future.set_exception(exception)
+                else:
+                    future.set_result(result)  # type: ignore[arg-type]
+            except InvalidStateError:
+                pass  # The waiter cancelled it.
+
+    def _run(self) -> None:
+        try:
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.poll()
+                except Exception:
+                    logger.exception("polling changes failed, retrying")
+
+                with self._lock:
+                    if not self._waiters:
+                        self._thread = None
+                        return
+        finally:
+            # Let the next `track` start a new poller, even if this one died.
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
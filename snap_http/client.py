@@ -0,0 +1,160 @@
+"""A client for one snapd, with its own connection settings and state.
+
+The module-level functions in `snap_http` talk to the system's snapd, configured by the globals
+in `snap_http.http`. A `SnapdClient` instead talks to the snapd behind any socket, with its own
+timeout, request limits, assertion cache, and maintenance state, so that several snapds or
+components with different needs can be served from one process.
+"""
+
+import functools
+import inspect
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generator, Iterator, Optional
+
+from . import api, http
+from .assertions import AssertionCache
+from .limits import Limiter
+from .types import SnapdResponse
+
+# The default of arguments for which `None` means no limit, standing for the matching `http`
+# global's value when the client is created.
+_GLOBAL: Any = object()
+
+
+class SnapdClient:
+    """Talks to the snapd listening on `socket_path`.
+
+    Every operation in `snap_http.api` is available as a method:
+
+        client = SnapdClient("/var/snap/lxd/common/ns/c1/snapd.socket", timeout=10)
+        client.list()
+        client.install("hello")
+
+    Other snap_http code, like `wait_change` or `OperationScheduler`, talks to this client's
+    snapd when run inside `client.activate()`.
+    """
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        *,
+        timeout: Optional[float] = None,
+        limiter: Optional[Limiter] = None,
+        cache: Optional[AssertionCache] = None,
+        coalesce_gets: Optional[bool] = None,
+        restart_timeout: Optional[float] = None,
+        max_response_memory: Optional[int] = _GLOBAL,
+        max_response_size: Optional[int] = _GLOBAL,
+    ) -> None:
+        """Initialize the client.
+
+        Defaults are read from the `http` globals when the client is created.
+
+        :param socket_path: path to snapd's socket. Defaults to `http.SNAPD_SOCKET`.
+        :param timeout: seconds to wait on each socket operation before giving up with a
+            `TimeoutError`, or `None` to wait indefinitely.
+        :param limiter: limits how many requests are made to snapd at once.
+        :param cache: if given, assertions are looked up through this cache.
+        :param coalesce_gets: whether identical concurrent GETs share a single request, see
+            `http.get`. Defaults to `http.COALESCE_GETS`.
+        :param restart_timeout: how long to wait for snapd to come back while it restarts.
+            Defaults to `http.RESTART_TIMEOUT`.
+        :param max_response_memory: non-JSON response bodies larger than this many bytes
+            are spooled to a temporary file, see `types.SpooledBody`. `None` holds every body
+            in memory. Defaults to `http.MAX_RESPONSE_MEMORY`.
+        :param max_response_size: responses with bodies larger than this many bytes fail
+            with `SnapdResponseTooLarge`, or `None` for no limit. Defaults to
+            `http.MAX_RESPONSE_SIZE`.
+        """
+        self.socket_path = http.SNAPD_SOCKET if socket_path is None else socket_path
+        self.timeout = timeout
+        self.limiter = limiter
+        self.cache = cache
+        self.coalesce_gets = http.COALESCE_GETS if coalesce_gets is None else coalesce_gets
+        self.restart_timeout = (
+            http.RESTART_TIMEOUT if restart_timeout is None else restart_timeout
+        )
+        self.max_response_memory = (
+            http.MAX_RESPONSE_MEMORY if max_response_memory is _GLOBAL else max_response_memory
+        )
+        self.max_response_size = (
+            http.MAX_RESPONSE_SIZE if max_response_size is _GLOBAL else max_response_size
+        )
+        self.state = http.ClientState()
+        self._operations: Dict[str, Callable[..., Any]] = {}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.socket_path!r})"
+
+    @contextmanager
+    def activate(self) -> Iterator["SnapdClient"]:
+        """Make requests in this context, including from snap_http helpers, to this client."""
+        token = http._active_client.set(self)
+        try:
+            yield self
+        finally:
+            http._active_client.reset(token)
+
+    @property
+    def maintenance(self) -> Optional[Dict[str, Any]]:
+        """The maintenance notice of snapd's latest response, or `None` if there was none."""
+        return self.state.maintenance
+
+    def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call `func(*args, **kwargs)`, with any requests it makes going to this client.
+
+        If `func` returns a generator, such as `iter_list_all` does, the generator is also
+        run with this client active each time it is advanced.
+        """
+        with self.activate():
+            result = func(*args, **kwargs)
+
+        if inspect.isgenerator(result):
+            return self._activated(result)
+
+        return result
+
+    def _activated(self, generator: Generator[Any, Any, Any]) -> Generator[Any, None, Any]:
+        """Advance `generator`, and close it, with this client active."""
+        try:
+            while True:
+                with self.activate():
+                    try:
+                        item = next(generator)
+                    except StopIteration as e:
+                        return e.value
+                yield item
+        finally:
+            with self.activate():
+                generator.close()
+
+    def get_assertions(
+        self, assertion_type: str, filters: Optional[Dict[str, Any]] = None
+    ) -> SnapdResponse:
+        """Like `api.get_assertions`, answered from the client's `cache` if it has one."""
+        lookup = api.get_assertions if self.cache is None else self.cache.get_assertions
+        return self.run(lookup, assertion_type, filters)
+
+    def add_assertion(self, assertion: str) -> SnapdResponse:
+        """Like `api.add_assertion`, also storing the assertion in the client's `cache`."""
+        add = api.add_assertion if self.cache is None else self.cache.add_assertion
+        return self.run(add, assertion)
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        operation = getattr(api, name, None)
+        if name.startswith("_") or not inspect.isfunction(operation):
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+        if name not in self._operations:
+
+            @functools.wraps(operation)
+            def method(*args: Any, **kwargs: Any) -> Any:
+                return self.run(operation, *args, **kwargs)  # type: ignore[arg-type]
+
+            self._operations[name] = method
+
+        return self._operations[name]
+
+    def __dir__(self) -> Any:
+        functions = [n for n, v in vars(api).items() if inspect.isfunction(v)]
+        return sorted({*super().__dir__(), *functions})
@@ -0,0 +1,200 @@
+"""Coalescing configuration writes to snapd.
+
+Every `set_conf` creates a snapd change and runs the snap's configure hook, even when several
+parts of a program write to the same snap within milliseconds of each other. A
+`ConfWriteBuffer` holds writes back for a short window, merges the dotted-key updates made to
+each snap, or confdb view, in that window, and sends them as a single request.
+"""
+
+import copy
+import threading
+from concurrent.futures import Future
+from contextvars import Context, copy_context
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from . import api, http
+from .scheduler import OperationScheduler
+from .types import SnapdResponse
+
+
+@dataclass
+class _PendingWrite:
+    func: Callable[..., SnapdResponse]
+    args: Tuple[Any, ...]
+    config: Dict[str, Any]
+    futures: List["Future[SnapdResponse]"] = field(default_factory=list)
+    context: Context = field(default_factory=copy_context)
+    timer: Optional[threading.Timer] = None
+
+
+class ConfWriteBuffer:
+    """Merges configuration writes made within `delay` seconds into one request per target.
+
+    The requests go through an `OperationScheduler`, so a flush waits for the previous
+    flush's change to the same snap to complete rather than conflicting with it. Each write
+    returns a future resolving, once the change it was merged into completes, to the final
+    `check_change` response of that change, shared with the other writes merged into it.
+
+    A write is merged with the pending ones as if they were applied in order: a key replaces
+    pending writes to keys below it, and a key below a pending dict value is set within that
+    value. If that isn't possible, e.g. when a key is set below a pending non-dict value, the
+    pending writes are sent first.
+
+    Example:
+
+        with ConfWriteBuffer(delay=0.05) as buffer:
+            a = buffer.set_conf("hello", {"server.port": 8080})
+            b = buffer.set_conf("hello", {"server.host": "0.0.0.0"})
+
+        assert a.result() == b.result()
+    """
+
+    def __init__(
+        self,
+        *,
+        delay: float = 0.05,
+        max_workers: int = 8,
+        change_timeout: Optional[float] = None,
+    ) -> None:
+        """Initialize the buffer.
+
+        :param delay: seconds to hold the first write to a target back for, collecting
+            further writes to merge with it.
+        :param max_workers: the most requests to have in flight at once.
+        :param change_timeout: seconds to wait for each request's change to complete.
+        """
+        self.delay = delay
+        self._scheduler = OperationScheduler(
+            max_workers=max_workers, change_timeout=change_timeout
+        )
+        self._lock = threading.Lock()
+        # Keyed by the client the writes are made with as well, as different clients'
+        # writes to the same target go to different snapds.
+        self._pending: Dict[Tuple[Any, str], _PendingWrite] = {}
+        self._closed = False
+
+    def __enter__(self) -> "ConfWriteBuffer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def set_conf(self, name: str, config: Mapping[str, Any]) -> "Future[SnapdResponse]":
+        """Like `api.set_conf`, but merged with other writes to the snap `name`."""
+        return self._write(name, api.set_conf, (name,), config)
+
+    def set_confdb(
+        self, account: str, confdb_schema: str, view: str, config: Mapping[str, Any]
+    ) -> "Future[SnapdResponse]":
+        """Like `api.set_confdb`, but merged with other writes to the same view."""
+        target = f"confdb:{account}/{confdb_schema}/{view}"
+        return self._write(target, api.set_confdb, (account, confdb_schema, view), config)
+
+    def flush(self) -> None:
+        """Send all pending writes now."""
+        with self._lock:
+            for key in [*self._pending]:
+                self._flush(key)
+
+    def close(self) -> None:
+        """Send all pending writes, and wait for their changes to complete."""
+        with self._lock:
+            self._closed = True
+        self.flush()
+        self._scheduler.shutdown()
+
+    def _write(
+        self,
+        target: str,
+        func: Callable[..., SnapdResponse],
+        args: Tuple[Any, ...],
+        config: Mapping[str, Any],
+    ) -> "Future[SnapdResponse]":
+        future: "Future[SnapdResponse]" = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot write to a closed ConfWriteBuffer")
+
+            key = (http._client(), target)
+            pending = self._pending.get(key)
+            merged = None if pending is None else merge_conf(pending.config, config)
+            if pending is not None and merged is not None:
+                pending.config = merged
+            else:
+                self._flush(key)
+                pending = self._pending[key] = _PendingWrite(
+                    func, args, merge_conf({}, config) or dict(config)
+                )
+                pending.timer = threading.Timer(self.delay, self._expire, (key, pending))
+                pending.timer.daemon = True
+                pending.timer.start()
+
+            pending.futures.append(future)
+
+        return future
+
+    def _expire(self, key: Tuple[Any, str], pending: _PendingWrite) -> None:
+        with self._lock:
+            if self._pending.get(key) is pending:
+                self._flush(key)
+
+    def _flush(self, key: Tuple[Any, str]) -> None:
+        """Send the pending writes for `key`, a client and target. Must hold `_lock`."""
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+
+        _, target = key
+
+        if pending.timer is not None:
+            pending.timer.cancel()
+
+        # Submit in the context of the writes, so that their `SnapdClient` is used.
+        submitted = pending.context.run(
+            self._scheduler.submit, target, pending.func, *pending.args, pending.config
+        )
+        submitted.add_done_callback(lambda done: _resolve(done, pending.futures))
+
+
+def merge_conf(
+    pending: Mapping[str, Any], update: Mapping[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """Merge the dotted-key configuration `update` into `pending`, as if applied after it.
+
+    :return: the merged configuration, or `None` if `update` can't be merged, because it sets
+        a key below a pending value that isn't a dict, or unsets a key within a pending dict.
+    """
+    merged = dict(pending)
+    for key, value in update.items():
+        for below in [k for k in merged if k.startswith(key + ".")]:
+            del merged[below]
+
+        parts = key.split(".")
+        ancestors = [".".join(parts[:i]) for i in range(1, len(parts))]
+        ancestor = next((a for a in ancestors if a in merged), None)
+        if ancestor is None:
+            merged[key] = value
+            continue
+
+        if value is None or not isinstance(merged[ancestor], dict):
+            return None
+
+        node = merged[ancestor] = copy.deepcopy(merged[ancestor])
+        *parents, leaf = parts[len(ancestor.split(".")) :]
+        for parent in parents:
+            node = node.setdefault(parent, {})
+            if not isinstance(node, dict):
+                return None
+        node[leaf] = value
+
+    return merged
+
+
+def _resolve(done: "Future[SnapdResponse]", futures: List["Future[SnapdResponse]"]) -> None:
+    exception = done.exception()
+    for future in futures:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(done.result())
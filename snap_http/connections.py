@@ -0,0 +1,203 @@
+"""An in-memory index of the interface connections between snaps.
+
+Answering "what does this snap depend on" from `get_connections` means scanning its lists on
+every query. A `ConnectionGraph` indexes one `get_connections(select="all")` response by snap,
+interface, plug and slot instead, and keeps the index current from the changes that connect
+and disconnect snaps, or by re-reading the connections of single snaps.
+"""
+
+import re
+from collections import defaultdict
+from typing import Any, DefaultDict, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+from . import api, http
+from .reconcilers import Connection
+from .types import SUCCESS_STATUSES
+
+# A plug or a slot: the name of its snap, and its own name.
+Ref = Tuple[str, str]
+
+# The summaries snapd gives "connect" and "disconnect" tasks.
+_TASK_SUMMARY = re.compile(r"^(?:Connect|Disconnect) (\S+?):(\S+) (?:to|from) (\S+?):(\S+)$")
+
+
+class ConnectionGraph:
+    """Snaps' plugs, slots and the connections between them, indexed for lookups.
+
+    Example:
+
+        graph = ConnectionGraph.from_snapd()
+        graph.depends_on("hello")
+        graph.plugged_into("snapd", "network")
+        graph.unconnected_plugs()
+    """
+
+    def __init__(self, connections: Optional[Mapping[str, Any]] = None) -> None:
+        """Initialize the graph.
+
+        :param connections: the result of `get_connections(select="all")` to index.
+        """
+        self.plugs: Dict[Ref, Dict[str, Any]] = {}
+        self.slots: Dict[Ref, Dict[str, Any]] = {}
+        self._plugs_of: DefaultDict[str, Set[Ref]] = defaultdict(set)
+        self._slots_of: DefaultDict[str, Set[Ref]] = defaultdict(set)
+        self._by_plug: DefaultDict[Ref, Set[Connection]] = defaultdict(set)
+        self._by_slot: DefaultDict[Ref, Set[Connection]] = defaultdict(set)
+        self._by_snap: DefaultDict[str, Set[Connection]] = defaultdict(set)
+        self._by_interface: DefaultDict[str, Set[Connection]] = defaultdict(set)
+        self._interfaces: Dict[Connection, str] = {}
+
+        if connections is not None:
+            self.update(connections)
+
+    @classmethod
+    def from_snapd(cls) -> "ConnectionGraph":
+        """Build the graph from snapd's current connections."""
+        return cls(api.get_connections(select="all").result)  # type: ignore[arg-type]
+
+    def __contains__(self, connection: object) -> bool:
+        return connection in self._interfaces
+
+    def __iter__(self) -> Iterator[Connection]:
+        return iter(self._interfaces)
+
+    def __len__(self) -> int:
+        return len(self._interfaces)
+
+    def update(self, connections: Mapping[str, Any]) -> None:
+        """Add the plugs, slots and established connections of a `get_connections` result."""
+        for plug in connections.get("plugs") or []:
+            self.plugs[plug["snap"], plug["plug"]] = plug
+            self._plugs_of[plug["snap"]].add((plug["snap"], plug["plug"]))
+        for slot in connections.get("slots") or []:
+            self.slots[slot["snap"], slot["slot"]] = slot
+            self._slots_of[slot["snap"]].add((slot["snap"], slot["slot"]))
+        for connection in connections.get("established") or []:
+            self.add(Connection.from_snapd(connection), connection.get("interface"))
+
+    def add(self, connection: Connection, interface: Optional[str] = None) -> None:
+        """Record `connection`, of `interface` if known, as established."""
+        plug, slot = _plug(connection), _slot(connection)
+        if interface is None:
+            interface = (self.plugs.get(plug) or self.slots.get(slot) or {}).get("interface", "")
+
+        self.discard(connection)
+        self._interfaces[connection] = interface
+        self._by_plug[plug].add(connection)
+        self._by_slot[slot].add(connection)
+        self._by_snap[connection.plug_snap].add(connection)
+        self._by_snap[connection.slot_snap].add(connection)
+        self._by_interface[interface].add(connection)
+
+    def discard(self, connection: Connection) -> None:
+        """Forget `connection`, if it was recorded."""
+        interface = self._interfaces.pop(connection, None)
+        if interface is None:
+            return
+
+        _remove(self._by_plug, _plug(connection), connection)
+        _remove(self._by_slot, _slot(connection), connection)
+        _remove(self._by_snap, connection.plug_snap, connection)
+        _remove(self._by_snap, connection.slot_snap, connection)
+        _remove(self._by_interface, interface, connection)
+
+    def forget_snap(self, name: str) -> None:
+        """Forget the plugs, slots and connections of the snap `name`."""
+        for connection in [*self._by_snap.get(name, ())]:
+            self.discard(connection)
+        for ref in self._plugs_of.pop(name, ()):
+            del self.plugs[ref]
+        for ref in self._slots_of.pop(name, ()):
+            del self.slots[ref]
+
+    def refresh_snap(self, name: str) -> None:
+        """Re-read the plugs, slots and connections of the snap `name` from snapd."""
+        try:
+            response = api.get_connections(snap=name, select="all")
+        except http.SnapNotFound:
+            self.forget_snap(name)
+            return
+
+        self.forget_snap(name)
+        self.update(response.result)  # type: ignore[arg-type]
+
+    def apply_change(self, change: Mapping[str, Any]) -> None:
+        """Bring the graph up to date with a completed change, as returned by `check_change`.
+
+        Connects and disconnects are applied from the change's tasks. Other changes to snaps,
+        such as installs, refreshes and removals, can add or remove plugs and slots, so the
+        snaps they affected are also re-read with `refresh_snap`, even if they included
+        connects or disconnects, as installs and removals do.
+        """
+        tasks = change.get("tasks") or []
+        for task in tasks:
+            if task.get("kind") not in ("connect", "disconnect"):
+                continue
+            if task.get("status") not in SUCCESS_STATUSES:
+                continue
+
+            match = _TASK_SUMMARY.match(task.get("summary", ""))
+            if match is None:
+                continue
+
+            connection = Connection(*match.groups())
+            if task["kind"] == "connect":
+                self.add(connection)
+            else:
+                self.discard(connection)
+
+        if not tasks or any(task.get("kind") not in ("connect", "disconnect") for task in tasks):
+            for name in (change.get("data") or {}).get("snap-names") or []:
+                self.refresh_snap(name)
+
+    def connections_of(self, snap: str) -> Set[Connection]:
+        """The connections of the snap's plugs and slots."""
+        return set(self._by_snap.get(snap, ()))
+
+    def connections_of_interface(self, interface: str) -> Set[Connection]:
+        """The connections of `interface`."""
+        return set(self._by_interface.get(interface, ()))
+
+    def depends_on(self, snap: str) -> Set[str]:
+        """The snaps whose slots the plugs of `snap` are connected to."""
+        return {c.slot_snap for c in self._by_snap.get(snap, ()) if c.plug_snap == snap}
+
+    def dependents(self, snap: str) -> Set[str]:
+        """The snaps whose plugs are connected to the slots of `snap`."""
+        return {c.plug_snap for c in self._by_snap.get(snap, ()) if c.slot_snap == snap}
+
+    def plugged_into(self, snap: str, slot: str) -> Set[Ref]:
+        """The plugs connected to the slot `snap:slot`."""
+        return {_plug(c) for c in self._by_slot.get((snap, slot), ())}
+
+    def slots_of_plug(self, snap: str, plug: str) -> Set[Ref]:
+        """The slots the plug `snap:plug` is connected to."""
+        return {_slot(c) for c in self._by_plug.get((snap, plug), ())}
+
+    def unconnected_plugs(self, snap: Optional[str] = None) -> List[Ref]:
+        """The plugs, of `snap` or of any snap, that aren't connected to any slot."""
+        refs = self.plugs if snap is None else self._plugs_of.get(snap, ())
+        return [ref for ref in refs if ref not in self._by_plug]
+
+    def unconnected_slots(self, snap: Optional[str] = None) -> List[Ref]:
+        """The slots, of `snap` or of any snap, that no plug is connected to."""
+        refs = self.slots if snap is None else self._slots_of.get(snap, ())
+        return [ref for ref in refs if ref not in self._by_slot]
+
+
+def _plug(connection: Connection) -> Ref:
+    return connection.plug_snap, connection.plug
+
+
+def _slot(connection: Connection) -> Ref:
+    return connection.slot_snap, connection.slot
+
+
+def _remove(index: Dict[Any, Set[Connection]], key: Any, connection: Connection) -> None:
+    connections = index.get(key)
+    if connections is None:
+        return
+
+    connections.discard(connection)
+    if not connections:
+        del index[key]
@@ -0,0 +1,162 @@
+"""Running snapd operations against many snapds at once.
+
+Hosts running containers or VMs can often reach each guest's snapd through a separate socket.
+A `Fleet` runs the same operation against all of them concurrently, with bounded parallelism
+and a deadline per target, streaming back results as they complete.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from .client import SnapdClient
+
+
+@dataclass
+class FleetResult:
+    """The outcome of running an operation against one target of a `Fleet`.
+
+    `index` is the target's position in the fleet's `clients`, telling apart targets with the
+    same socket path.
+    """
+
+    target: str
+    response: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+    index: int = 0
+
+    @property
+    def ok(self) -> bool:
+        """Whether the operation succeeded for this target."""
+        return self.error is None
+
+
+class Fleet:
+    """Runs snapd operations against many snapds concurrently.
+
+    Example:
+
+        fleet = Fleet(glob.glob("/var/snap/lxd/common/ns/*/snapd.socket"), timeout=30)
+        for result in fleet.run(snap_http.refresh, "hello"):
+            print(result.target, result.response if result.ok else result.error)
+    """
+
+    def __init__(
+        self,
+        targets: Iterable[Union[str, SnapdClient]],
+        *,
+        max_workers: int = 16,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Initialize the fleet.
+
+        :param targets: snapd socket paths, or `SnapdClient`s, to run operations against.
+        :param max_workers: the most targets to run an operation against at once.
+        :param timeout: seconds an operation may take on one target, from when it starts
+            there, before that target's result is a `TimeoutError`. Clients created from
+            socket paths also use it as their socket timeout, which bounds how long an
+            abandoned operation can keep its worker busy.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.clients: List[SnapdClient] = [
+            t if isinstance(t, SnapdClient) else self._client(t) for t in targets
+        ]
+
+    def _client(self, socket_path: str) -> SnapdClient:
+        client = SnapdClient(socket_path, timeout=self.timeout)
+        if self.timeout is not None:
+            client.restart_timeout = min(client.restart_timeout, self.timeout)
+        return client
+
+    def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Iterator[FleetResult]:
+        """Run `func(*args, **kwargs)` against every target, yielding results as they complete.
+
+        `func` is any `snap_http` operation, or function making requests with snap_http.
+        """
+        started: Dict[int, float] = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures: Dict["Future[FleetResult]", int] = {
+            executor.submit(self._call, index, client, started, func, args, kwargs): index
+            for index, client in enumerate(self.clients)
+        }
+        pending: Set["Future[FleetResult]"] = set(futures)
+
+        try:
+            while pending:
+                timeout = self._wait_timeout(pending, futures, started)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+                for future in self._overdue(pending, futures, started):
+                    pending.discard(future)
+                    index = futures[future]
+                    target = self.clients[index].socket_path
+                    yield FleetResult(
+                        target=target,
+                        error=TimeoutError(f"{target} did not respond within {self.timeout}s"),
+                        elapsed=time.monotonic() - started[index],
+                        index=index,
+                    )
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def run_all(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> List[FleetResult]:
+        """Like `run`, but waits for every target, returning the results in target order."""
+        return sorted(self.run(func, *args, **kwargs), key=lambda result: result.index)
+
+    @staticmethod
+    def _call(
+        index: int,
+        client: SnapdClient,
+        started: Dict[int, float],
+        func: Callable[..., Any],
+        args: Any,
+        kwargs: Dict[str, Any],
+    ) -> FleetResult:
+        start = started[index] = time.monotonic()
+        try:
+            response = client.run(func, *args, **kwargs)
+        except Exception as e:
+            elapsed = time.monotonic() - start
+            return FleetResult(client.socket_path, error=e, elapsed=elapsed, index=index)
+
+        elapsed = time.monotonic() - start
+        return FleetResult(client.socket_path, response=response, elapsed=elapsed, index=index)
+
+    def _wait_timeout(
+        self,
+        pending: Set["Future[FleetResult]"],
+        futures: Dict["Future[FleetResult]", int],
+        started: Dict[int, float],
+    ) -> Optional[float]:
+        """How long to wait for a result before checking for targets past their deadline."""
+        if self.timeout is None:
+            return None
+
+        deadlines = [started[futures[f]] + self.timeout for f in pending if futures[f] in started]
+        if not deadlines:
+            return self.timeout
+
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _overdue(
+        self,
+        pending: Set["Future[FleetResult]"],
+        futures: Dict["Future[FleetResult]", int],
+        started: Dict[int, float],
+    ) -> List["Future[FleetResult]"]:
+        if self.timeout is None:
+            return []
+
+        now = time.monotonic()
+        return [
+            f
+            for f in pending
+            if futures[f] in started and now - started[futures[f]] >= self.timeout
+        ]
@@ -1,21 +1,70 @@
 """Lower-level functions for making actual HTTP requests to snapd's REST API."""
 
+import codecs
+import copy
 import json
+import os
+import random
+import re
 import socket
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from functools import cached_property
-from http.client import HTTPResponse, responses
-from io import BytesIO
-from typing import Any, Dict, Optional, Union
+from http.client import responses
+from itertools import islice
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 from urllib.parse import urlencode
 
-from .types import JsonData, SnapdRequestBody, SnapdResponse
+from .limits import Limiter
+from .types import Buffer, JsonData, SnapdRequestBody, SnapdResponse, SpooledBody
 
 BASE_URL = "http://localhost/v2"
 SNAPD_SOCKET = "/run/snapd.socket"
 
+# How long to keep retrying to connect while snapd is restarting, in seconds.
+RESTART_TIMEOUT = 30.0
+RESTART_KINDS = {"daemon-restart", "system-restart"}
+
+# Whether identical concurrent GETs share a single request to snapd. A GET may then get the
+# response to a request sent before the caller's own previous mutation completed.
+COALESCE_GETS = False
+
+# Limits how many requests are made to snapd at once; see `limits.Limiter`.
+LIMITER: Optional[Limiter] = None
+
+# Non-JSON response bodies, like assertions and logs, larger than this many bytes are spooled
+# to a temporary file, and returned memory-mapped as a `types.SpooledBody`; `None` holds every
+# body in memory.
+MAX_RESPONSE_MEMORY: Optional[int] = None
+
+# Responses with bodies larger than this many bytes fail with `SnapdResponseTooLarge`.
+MAX_RESPONSE_SIZE: Optional[int] = None
+
 
 class SnapdHttpException(Exception):
-    """An exception raised during HTTP communication with snapd."""
+    """An exception raised during HTTP communication with snapd.
+
+    Errors that snapd classifies with a `result.kind` are raised as the matching subclass, see
+    `EXCEPTIONS_BY_KIND`.
+    """
 
     @cached_property
     def json(self) -> Union[Dict[str, Any], None]:
@@ -27,10 +76,236 @@ class SnapdHttpException(Exception):
 
         return result
 
+    @cached_property
+    def result(self) -> Dict[str, Any]:
+        """The `result` of snapd's error response, or an empty dict if there isn't one."""
+        try:
+            body = self.json
+        except (TypeError, ValueError):
+            return {}
+
+        result = body.get("result") if isinstance(body, dict) else None
+        return result if isinstance(result, dict) else {}
+
+    @property
+    def kind(self) -> Optional[str]:
+        """The kind of error, as classified by snapd, e.g. "snap-not-found"."""
+        return self.result.get("kind")
+
+    @property
+    def message(self) -> Optional[str]:
+        """snapd's human-readable error message."""
+        return self.result.get("message")
+
+    @property
+    def value(self) -> Any:
+        """Additional, kind-specific details of the error."""
+        return self.result.get("value")
+
+    @property
+    def maintenance(self) -> Optional[Dict[str, Any]]:
+        """snapd's maintenance notice, present while snapd or the system is restarting."""
+        try:
+            body = self.json
+        except (TypeError, ValueError):
+            return None
+
+        return body.get("maintenance") if isinstance(body, dict) else None
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "SnapdHttpException":
+        """Create the exception for the error response `body`, typed by its kind."""
+        exception = cls(body)
+        exception_cls = EXCEPTIONS_BY_KIND.get(exception.kind or "", cls)
+        return exception_cls(body) if exception_cls is not cls else exception
+
+
+class SnapdUnavailable(SnapdHttpException, ConnectionError):
+    """snapd's socket could not be reached, even after waiting out a restart."""
+
+
+class SnapNotFound(SnapdHttpException):
+    """The snap is not installed, or not available in the store."""
+
+
+class SnapNotInstalled(SnapdHttpException):
+    """The operation requires the snap to be installed."""
+
+
+class SnapAlreadyInstalled(SnapdHttpException):
+    """The snap is already installed."""
+
+
+class SnapNoUpdateAvailable(SnapdHttpException):
+    """There is no update available for the snap."""
+
+
+class SnapChangeConflict(SnapdHttpException):
+    """Another change is already in progress for the snap."""
+
+    @property
+    def change_id(self) -> Optional[str]:
+        """The id of the conflicting change, if snapd said which change it was."""
+        return (self.value or {}).get("change-id")
+
+
+class AuthCancelled(SnapdHttpException):
+    """The user cancelled authorization of the operation."""
+
+
+class LoginRequired(SnapdHttpException):
+    """The operation requires a logged-in user."""
+
+
+class NetworkTimeout(SnapdHttpException):
+    """snapd timed out talking to the network, e.g. to the store."""
+
+
+class DNSFailure(SnapdHttpException):
+    """snapd failed to resolve a host name, e.g. of the store."""
+
+
+class InsufficientDiskSpace(SnapdHttpException):
+    """There isn't enough disk space to perform the operation."""
+
+
+# See https://snapcraft.io/docs/snapd-rest-api#heading--errors
+EXCEPTIONS_BY_KIND: Dict[str, Type[SnapdHttpException]] = {
+    "snap-not-found": SnapNotFound,
+    "snap-not-installed": SnapNotInstalled,
+    "snap-already-installed": SnapAlreadyInstalled,
+    "snap-no-update-available": SnapNoUpdateAvailable,
+    "snap-change-conflict": SnapChangeConflict,
+    "auth-cancelled": AuthCancelled,
+    "login-required": LoginRequired,
+    "network-timeout": NetworkTimeout,
+    "dns-failure": DNSFailure,
+    "insufficient-disk-space": InsufficientDiskSpace,
+}
+
+
+class _Call:
+    """A request in flight, which callers making the identical request can wait on."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.followers = 0
+        self.result: Any = None
+        self.exception: Optional[BaseException] = None
+
+
+class _Singleflight:
+    """Coalesces identical concurrent calls, so that only one of them does the work.
+
+    The first caller for a key runs the function; callers arriving while it is in flight wait
+    for it and get their own deep copy of its result, or its exception.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func()
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.exception is not None:
+                call.done.set()
+
+        # Followers copy from a pristine copy, since the leader's caller may mutate its result.
+        call.result = copy.deepcopy(result) if call.followers else result
+        call.done.set()
+
+        return result
+
+
+class ClientState:
+    """The state a client builds up while talking to snapd."""
+
+    def __init__(self) -> None:
+        self.maintenance: Optional[Dict[str, Any]] = None
+        self.restart_announced_at: Optional[float] = None
+        self.singleflight = _Singleflight()
+
+
+class _ModuleClient:
+    """The client used outside of any `SnapdClient`, configured by this module's globals."""
+
+    timeout = None
+
+    def __init__(self) -> None:
+        self.state = ClientState()
+
+    @property
+    def socket_path(self) -> str:
+        return SNAPD_SOCKET
+
+    @property
+    def limiter(self) -> Optional[Limiter]:
+        return LIMITER
+
+    @property
+    def coalesce_gets(self) -> bool:
+        return COALESCE_GETS
+
+    @property
+    def restart_timeout(self) -> float:
+        return RESTART_TIMEOUT
+
+    @property
+    def max_response_memory(self) -> Optional[int]:
+        return MAX_RESPONSE_MEMORY
+
+    @property
+    def max_response_size(self) -> Optional[int]:
+        return MAX_RESPONSE_SIZE
+
+
+_default_client = _ModuleClient()
+
+# The `SnapdClient` that requests are made with; see `SnapdClient.activate`.
+_active_client: ContextVar[Any] = ContextVar("snap_http_client", default=None)
+
+
+def _client() -> Any:
+    """The client to make requests with: the active `SnapdClient`, or the module's default."""
+    client = _active_client.get()
+    return _default_client if client is None else client
+
 
 def get(path: str, **kwargs: Any) -> SnapdResponse:
-    """Peform a GET request of `path`."""
-    response = _make_request(path, "GET", **kwargs)
+    """Peform a GET request of `path`.
+
+    If `COALESCE_GETS` is set, identical GETs made concurrently, e.g. from several threads,
+    share a single request to snapd. Each caller still gets an independent result.
+    """
+    client = _client()
+    if client.coalesce_gets:
+        key = (path, json.dumps(kwargs, sort_keys=True, default=str))
+        response = client.state.singleflight.do(
+            key, lambda: _make_request(path, "GET", **kwargs)
+        )
+    else:
+        response = _make_request(path, "GET", **kwargs)
 
     return SnapdResponse.from_http_response(response)
 
@@ -59,64 +334,620 @@ def _make_request(
     """Performs a request to `path` using `method`, including `body`, if provided.
 
     urllib doesn't support HTTP requests to UNIX sockets, so we create out own socket, start the
-    connection, then hand it off to `HTTPResponse` to read from and parse.
+    connection, then read and parse the response with `_read_response`.
+    """
+    buffers = _build_request(path, method, body=body, query_params=query_params)
+    with _exchange(path, method, buffers) as (client, sock, _):
+        response = _read_response(
+            sock,
+            method,
+            max_memory=client.max_response_memory,
+            max_size=client.max_response_size,
+        )
+
+    response_body = response.body
+
+    if response.status >= 400:
+        exception = SnapdHttpException.from_body(bytes(response_body))
+        _note_maintenance(exception.maintenance)
+        raise exception
+
+    content_type = response.headers.get("content-type")
+    if content_type == "application/json":
+        # JSON bodies are never spooled, see `_read_response`.
+        envelope = json.loads(response_body)  # type: ignore[arg-type]
+        _note_maintenance(envelope.get("maintenance"))
+        return envelope
+    elif content_type in ("application/json-seq", "application/x-ndjson"):
+        records = [json.loads(record) for record in _split_records(response_body)]
+        return _build_envelope(response.status, records)
+    else:  # other types like application/x.ubuntu.assertion
+        return _build_envelope(response.status, response_body)
+
+
+def get_mapped(
+    path: str, func: Callable[[Any], Any], *, query_params: Optional[Dict[str, Any]] = None
+) -> SnapdResponse:
+    """Perform a GET request of `path`, mapping each item of its `result` array with `func`.
+
+    Items are mapped as they are received, see `iter_result`, so the unmapped result is never
+    held in memory whole.
+    """
+    items = iter_result(path, query_params=query_params)
+    result = []
+    while True:
+        try:
+            result.append(func(next(items)))
+        except StopIteration as stop:
+            envelope = stop.value
+            break
+
+    return SnapdResponse.from_http_response({**envelope, "result": result})
+
+
+def iter_result(
+    path: str, *, query_params: Optional[Dict[str, Any]] = None
+) -> Generator[Any, None, Dict[str, Any]]:
+    """Perform a GET request of `path`, yielding each item of its `result` array as it arrives.
+
+    The response is decoded incrementally, so the first items can be worked on while later
+    ones are still being received, and only about one item is held in memory at a time.
+    Unlike `get`, streamed requests are never coalesced, and only hold a slot of the client's
+    limiter until snapd starts to respond, so that items can be worked on with more requests.
+
+    The generator returns the rest of the response's envelope.
     """
-    sock = socket.socket(family=socket.AF_UNIX)
-    sock.connect(SNAPD_SOCKET)
+    buffers = _build_request(path, "GET", query_params=query_params)
+    with _exchange(path, "GET", buffers) as (client, sock, slot):
+        reader = _ResponseReader(sock)
+        status, headers = _read_head(reader)
+
+        # Give up the limiter slot now snapd has answered: consumers of the items often make
+        # requests of their own, which would otherwise wait for this one to be consumed.
+        slot.close()
+
+        if status >= 400:
+            body = _read_body(
+                reader,
+                "GET",
+                status,
+                headers,
+                max_size=client.max_response_size,
+            )
+            exception = SnapdHttpException.from_body(bytes(body))
+            _note_maintenance(exception.maintenance)
+            raise exception
+
+        if headers.get("content-type") != "application/json":
+            raise HTTPProtocolError(f"cannot stream a {headers.get('content-type')} response")
 
+        items = _ResultItems()
+        for piece in _iter_body(reader, headers):
+            yield from items.feed(piece)
+        items.close()
+
+    _note_maintenance(items.envelope.get("maintenance"))
+    return items.envelope
+
+
+def _build_request(
+    path: str,
+    method: str,
+    *,
+    body: Optional[SnapdRequestBody] = None,
+    query_params: Optional[Dict[str, Any]] = None,
+) -> List[Buffer]:
+    """Build the buffers making up a request to `path` using `method`, including `body`."""
     url = BASE_URL + path
     if query_params:
         url += "?" + urlencode(query_params)
 
-    response = HTTPResponse(sock, method=method, url=url)
-
-    request = BytesIO()
-    request.write(f"{method} {url} HTTP/1.1\r\nHost: localhost\r\n".encode())
+    head = f"{method} {url} HTTP/1.1\r\nHost: localhost\r\n"
+    buffers: List[Buffer] = []
 
     if body:
         if isinstance(body, dict):
             body = JsonData(body)
 
-        request.write(
-            (
-                f"Content-Type: {body.content_type_header}\r\n"
-                f"Content-Length: {body.content_length}\r\n\r\n"
-            ).encode()
+        head += (
+            f"Content-Type: {body.content_type_header}\r\n"
+            f"Content-Length: {body.content_length}\r\n"
         )
-        request.write(body.serialized)
-    else:
-        request.write(b"\r\n")
+        buffers = body.buffers
 
-    sock.sendall(request.getvalue())
+    buffers.insert(0, (head + "\r\n").encode())
+    return buffers
 
-    response.begin()
-    response_body = response.read()
 
-    response.close()
-    sock.close()
+@contextmanager
+def _exchange(
+    path: str, method: str, buffers: List[Buffer]
+) -> Iterator[Tuple[Any, socket.socket, ExitStack]]:
+    """Send the request made of `buffers` with the current client, yielding the connection.
 
-    if response.status >= 400:
-        raise SnapdHttpException(response_body)
+    The connection is kept open for the whole context. The client's limiter slot is held
+    until the context exits, or the yielded `ExitStack` is closed.
+    """
+    client = _client()
+    with ExitStack() as slot:
+        if client.limiter is not None:
+            slot.enter_context(client.limiter.slot(method, path))
 
-    content_type = response.getheader("Content-Type")
-    if content_type == "application/json":
-        return json.loads(response_body)
-    elif content_type in ("application/json-seq", "application/x-ndjson"):
-        records = [
-            json.loads(record)
-            for record in response_body.split(b"\x1e")
-            if record.strip()
-        ]
-        return _build_envelope(response, records)
-    else:  # other types like application/x.ubuntu.assertion
-        return _build_envelope(response, response_body)
+        sock = _connect(client.socket_path)
+        sock.settimeout(client.timeout)
+        try:
+            _send_all(sock, buffers)
+            yield client, sock, slot
+        finally:
+            sock.close()
+
+
+def maintenance() -> Optional[Dict[str, Any]]:
+    """The maintenance notice of snapd's latest response, or `None` if there was none.
+
+    snapd sets it, with a kind of "daemon-restart" or "system-restart", when it is about to go
+    away for a restart.
+    """
+    return _client().state.maintenance
+
+
+def _note_maintenance(notice: Optional[Dict[str, Any]]) -> None:
+    """Remember snapd's latest maintenance `notice`, in order to ride out restarts."""
+    state = _client().state
+    state.maintenance = notice
+    if notice is not None and notice.get("kind") in RESTART_KINDS:
+        state.restart_announced_at = time.monotonic()
+
+
+def _restart_expected() -> bool:
+    """Whether snapd recently announced that it is restarting."""
+    client = _client()
+    announced_at = client.state.restart_announced_at
+    return announced_at is not None and time.monotonic() - announced_at < client.restart_timeout
+
+
+def _connect(path: str) -> socket.socket:
+    """Connect to snapd's socket at `path`, waiting for snapd to come back if it is restarting.
+
+    A refused connection or a missing socket is only waited on if snapd announced a restart
+    beforehand. Otherwise snapd's socket is most likely stopped: while snapd restarts normally,
+    systemd's socket activation holds on to new connections until it is back.
+    Retries back off with jitter, so that many waiting clients don't reconnect in lockstep.
+    """
+    deadline = time.monotonic() + _client().restart_timeout
+    delay = 0.1
+
+    while True:
+        sock = socket.socket(family=socket.AF_UNIX)
+        try:
+            sock.connect(path)
+            return sock
+        except (ConnectionRefusedError, FileNotFoundError) as e:
+            sock.close()
+            if not _restart_expected() or time.monotonic() >= deadline:
+                raise SnapdUnavailable(f"cannot connect to snapd at {path}: {e}") from e
 
+        time.sleep(random.uniform(delay / 2, delay))
+        delay = min(delay * 2, 2.0)
 
-def _build_envelope(response: HTTPResponse, result: Any) -> Dict[str, Any]:
-    response_code = response.getcode()
+
+def _send_all(sock: socket.socket, buffers: List[Buffer]) -> None:
+    """Send all of `buffers` with scatter/gather writes, without concatenating them."""
+    views = deque(memoryview(b).cast("B") for b in buffers if len(b))
+    while views:
+        sent = sock.sendmsg([*islice(views, IOV_MAX)])
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views.popleft())
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
+def _split_records(body: Buffer) -> Iterator[bytes]:
+    """Yield the non-blank records of a json-seq or ndjson `body`, one at a time."""
+    start = 0
+    while start < len(body):
+        end = body.find(b"\x1e", start)  # type: ignore[union-attr]
+        if end == -1:
+            end = len(body)
+
+        record = body[start:end]
+        if record.strip():  # type: ignore[union-attr]
+            yield bytes(record)
+        start = end + 1
+
+
+def _build_envelope(response_code: int, result: Any) -> Dict[str, Any]:
     return {
         "type": "async" if response_code == 202 else "sync",
         "status_code": response_code,
         "status": responses[response_code],
         "result": result,
     }
+
+
+# The most buffers that can be passed to a single `sendmsg` call.
+IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+
+# Responses are received through a per-thread buffer of this size, reused across requests.
+RECV_BUFFER_SIZE = 64 * 1024
+
+_recv_buffers = threading.local()
+
+
+class HTTPProtocolError(SnapdHttpException):
+    """snapd's response could not be parsed as HTTP."""
+
+
+class SnapdResponseTooLarge(SnapdHttpException):
+    """snapd's response body is larger than the client's `max_response_size`."""
+
+
+@dataclass
+class _Response:
+    status: int
+    headers: Dict[str, str]
+    body: Buffer
+
+
+class _BodySink:
+    """Collects a response body in memory, spooling it to a temporary file past `max_memory`."""
+
+    def __init__(self, max_memory: Optional[int], max_size: Optional[int]) -> None:
+        self.max_memory = max_memory
+        self.max_size = max_size
+        self.size = 0
+        self.data = bytearray()
+        self.file: Optional[IO[bytes]] = None
+
+    def expect(self, size: int) -> None:
+        """Fail early if the body is announced to be `size` bytes, more than `max_size`."""
+        if self.max_size is not None and size > self.max_size:
+            raise SnapdResponseTooLarge(
+                f"response body of {size} bytes exceeds the limit of {self.max_size} bytes"
+            )
+
+    def write(self, data: Buffer) -> None:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise SnapdResponseTooLarge(
+                f"response body exceeds the limit of {self.max_size} bytes"
+            )
+
+        if self.file is None and self.max_memory is not None and self.size > self.max_memory:
+            self.file = tempfile.TemporaryFile()
+            self.file.write(self.data)
+            self.data = bytearray()
+
+        if self.file is not None:
+            self.file.write(data)
+        else:
+            self.data += data
+
+    def getvalue(self) -> Buffer:
+        if self.file is None:
+            return bytes(self.data)
+
+        self.file.flush()
+        return SpooledBody.map(self.file)
+
+
+class _ResponseReader:
+    """Reads an HTTP/1.1 response from a socket.
+
+    `http.client.HTTPResponse` handles every corner of the protocol, parsing headers with the
+    `email` package through several layers of buffering. snapd's responses are simple: a
+    status line, a handful of headers, and a body delimited by Content-Length or chunked
+    encoding. This reader handles just that, receiving into a reusable buffer.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.data = bytearray()
+        self.pos = 0
+
+        buffer = getattr(_recv_buffers, "buffer", None)
+        if buffer is None:
+            buffer = _recv_buffers.buffer = memoryview(bytearray(RECV_BUFFER_SIZE))
+        self.buffer: memoryview = buffer
+
+    def _fill(self) -> bool:
+        """Receive more data, returning `False` at the end of the stream."""
+        received = self.sock.recv_into(self.buffer)
+        self.data += self.buffer[:received]
+        return received > 0
+
+    def _compact(self) -> None:
+        """Drop the data already consumed, so that `data` only holds what is yet to be read."""
+        if self.pos:
+            del self.data[: self.pos]
+            self.pos = 0
+
+    def read_until(self, delimiter: bytes) -> bytes:
+        """Read up to and excluding `delimiter`, consuming the delimiter."""
+        self._compact()
+        start = self.pos
+        while True:
+            end = self.data.find(delimiter, start)
+            if end != -1:
+                line = bytes(self.data[self.pos : end])
+                self.pos = end + len(delimiter)
+                return line
+
+            start = max(self.pos, len(self.data) - len(delimiter) + 1)
+            if not self._fill():
+                raise HTTPProtocolError("connection closed before end of response")
+
+    def read_exactly(self, size: int) -> bytes:
+        """Read exactly `size` bytes."""
+        buffered = len(self.data) - self.pos
+        if buffered >= size:
+            chunk = bytes(self.data[self.pos : self.pos + size])
+            self.pos += size
+            return chunk
+
+        # Receive the rest straight into the result, rather than through `data`.
+        result = bytearray(size)
+        view = memoryview(result)
+        view[:buffered] = self.data[self.pos :]
+        self.data.clear()
+        self.pos = 0
+
+        while buffered < size:
+            received = self.sock.recv_into(view[buffered:])
+            if not received:
+                raise HTTPProtocolError("connection closed before end of response")
+            buffered += received
+
+        return bytes(result)
+
+    def iter_pieces(self, size: Optional[int] = None) -> Iterator[Buffer]:
+        """Read `size` bytes, or until the connection is closed, a piece at a time.
+
+        Pieces may be views of the shared receive buffer, only valid until the next one.
+        """
+        end = len(self.data) if size is None else min(len(self.data), self.pos + size)
+        if end > self.pos:
+            yield bytes(self.data[self.pos : end])
+        remaining = None if size is None else size - (end - self.pos)
+        self.pos = end
+        self._compact()
+
+        # Receive the rest straight into the buffer, never past the end of the body.
+        while remaining is None or remaining > 0:
+            view = self.buffer if remaining is None else self.buffer[:remaining]
+            received = self.sock.recv_into(view)
+            if not received:
+                if remaining is None:
+                    return
+                raise HTTPProtocolError("connection closed before end of response")
+
+            if remaining is not None:
+                remaining -= received
+            yield view[:received]
+
+
+def _read_response(
+    sock: socket.socket,
+    method: str,
+    *,
+    max_memory: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> _Response:
+    """Read snapd's HTTP/1.1 response to a `method` request from `sock`.
+
+    Bodies larger than `max_memory` bytes are spooled to a temporary file, and bodies larger
+    than `max_size` bytes raise `SnapdResponseTooLarge`.
+    """
+    reader = _ResponseReader(sock)
+    status, headers = _read_head(reader)
+
+    # JSON envelopes and errors can only be decoded whole, so spooling them saves no memory.
+    if status >= 400 or headers.get("content-type") == "application/json":
+        max_memory = None
+
+    body = _read_body(
+        reader, method, status, headers, max_memory=max_memory, max_size=max_size
+    )
+    return _Response(status, headers, body)
+
+
+def _read_head(reader: _ResponseReader) -> Tuple[int, Dict[str, str]]:
+    """Read the status and headers of a response, skipping any interim responses."""
+    while True:
+        head = reader.read_until(b"\r\n\r\n").decode("latin-1").split("\r\n")
+        try:
+            status = int(head[0].split(" ", 2)[1])
+        except (IndexError, ValueError):
+            raise HTTPProtocolError(f"invalid status line: {head[0]!r}") from None
+
+        # Skip interim responses, like 100 Continue.
+        if status >= 200:
+            break
+
+    headers = {}
+    for line in head[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    return status, headers
+
+
+def _read_body(
+    reader: _ResponseReader,
+    method: str,
+    status: int,
+    headers: Dict[str, str],
+    *,
+    max_memory: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> Buffer:
+    if method == "HEAD" or status in (204, 304):
+        return b""
+
+    sink = _BodySink(max_memory, max_size)
+    chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+    if "content-length" in headers and not chunked:
+        length = _content_length(headers)
+        sink.expect(length)
+        if max_memory is None or length <= max_memory:
+            return reader.read_exactly(length)
+
+    for piece in _iter_body(reader, headers):
+        sink.write(piece)
+
+    return sink.getvalue()
+
+
+def _iter_body(reader: _ResponseReader, headers: Dict[str, str]) -> Iterator[Buffer]:
+    """Read the body of a response a piece at a time, see `_ResponseReader.iter_pieces`."""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        yield from _iter_chunked(reader)
+    elif "content-length" in headers:
+        yield from reader.iter_pieces(_content_length(headers))
+    else:
+        yield from reader.iter_pieces()
+
+
+def _content_length(headers: Dict[str, str]) -> int:
+    try:
+        length = int(headers["content-length"])
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HTTPProtocolError(f"invalid Content-Length: {headers['content-length']!r}")
+
+    return length
+
+
+def _iter_chunked(reader: _ResponseReader) -> Iterator[Buffer]:
+    while True:
+        line = reader.read_until(b"\r\n")
+        try:
+            size = int(line.split(b";", 1)[0], 16)
+        except ValueError:
+            size = -1
+        if size < 0:
+            raise HTTPProtocolError(f"invalid chunk size: {line!r}")
+
+        if size == 0:
+            break
+        yield from reader.iter_pieces(size)
+        reader.read_until(b"\r\n")
+
+    # Skip any trailers, up to the final blank line.
+    while reader.read_until(b"\r\n"):
+        pass
+
+
+class _ResultItems:
+    """Incrementally decodes a JSON envelope, yielding the items of its `result` array.
+
+    Other members of the envelope are collected into `envelope`. Values are decoded with
+    `json`'s own decoder once complete; a value at the end of the received data is only
+    taken to be complete once the character following it has arrived, so that e.g. a number
+    split across pieces isn't cut short.
+    """
+
+    def __init__(self) -> None:
+        self.envelope: Dict[str, Any] = {}
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = ""
+
+    def feed(self, data: Buffer) -> Iterator[Any]:
+        """Add the next piece of the body, yielding the result items it completes."""
+        self._buffer = self._buffer[self._pos :] + self._text.decode(data)
+        self._pos = 0
+
+        while True:
+            pos = _WHITESPACE.match(self._buffer, self._pos).end()  # type: ignore[union-attr]
+            if pos == len(self._buffer):
+                return
+            char = self._buffer[pos]
+
+            handler = getattr(self, f"_on_{self._state}", None)
+            if handler is None:
+                raise HTTPProtocolError(f"unexpected data after JSON response: {char!r}")
+
+            item = handler(pos, char)
+            if item is _INCOMPLETE:
+                return
+            if item is not _NO_ITEM:
+                yield item
+
+    def _on_start(self, pos: int, char: str) -> Any:
+        self._expect(char, "{")
+        self._pos, self._state = pos + 1, "key"
+        return _NO_ITEM
+
+    def _on_key(self, pos: int, char: str) -> Any:
+        if char in ",}":
+            self._pos, self._state = pos + 1, "done" if char == "}" else "key"
+            return _NO_ITEM
+
+        decoded = self._decode(pos)
+        if decoded is None:
+            return _INCOMPLETE
+        self._key, self._pos = decoded
+        self._expect(self._buffer[self._pos], ":")
+        self._pos += 1
+        self._state = "value"
+        return _NO_ITEM
+
+    def _on_value(self, pos: int, char: str) -> Any:
+        if self._key == "result" and char == "[":
+            self._pos, self._state = pos + 1, "items"
+            return _NO_ITEM
+
+        decoded = self._decode(pos)
+        if decoded is None:
+            return _INCOMPLETE
+        self.envelope[self._key], self._pos = decoded
+        self._state = "key"
+        return _NO_ITEM
+
+    def _on_items(self, pos: int, char: str) -> Any:
+        if char in ",]":
+            self._pos, self._state = pos + 1, "key" if char == "]" else "items"
+            return _NO_ITEM
+
+        decoded = self._decode(pos)
+        if decoded is None:
+            return _INCOMPLETE
+        item, self._pos = decoded
+        return item
+
+    def close(self) -> None:
+        """Check that the whole envelope was received."""
+        if self._state != "done":
+            raise HTTPProtocolError("JSON response ended unexpectedly")
+
+    def _decode(self, pos: int) -> Optional[Tuple[Any, int]]:
+        """Decode the value at `pos`, or return `None` if it hasn't been fully received."""
+        try:
+            value, end = _DECODER.raw_decode(self._buffer, pos)
+        except json.JSONDecodeError:
+            return None
+
+        end = _WHITESPACE.match(self._buffer, end).end()  # type: ignore[union-attr]
+        if end == len(self._buffer):
+            return None
+
+        return value, end
+
+    @staticmethod
+    def _expect(char: str, expected: str) -> None:
+        if char != expected:
+            raise HTTPProtocolError(f"expected {expected!r} in JSON response, got {char!r}")
+
+
+_DECODER = json.JSONDecoder()
+
+# Returned by `_ResultItems` state handlers that need more data, or that completed no item.
+_INCOMPLETE = object()
+_NO_ITEM = object()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
@@ -0,0 +1,134 @@
+"""Limiting how many requests are made to snapd at once.
+
+snapd's responsiveness degrades when it is sent many requests at the same time. A `Limiter`
+gives reads (GETs) and mutations (everything else) separate concurrency budgets. Requests
+waiting for a slot are served in priority order, so that interactive requests can jump ahead of
+background ones; see `priority`.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+
+_priority: ContextVar[int] = ContextVar("snap_http_priority", default=NORMAL)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Make the requests made in this context wait for a slot with priority `level`.
+
+    Lower levels are served first: `INTERACTIVE`, then `NORMAL` (the default), then
+    `BACKGROUND`.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass
+class RequestTiming:
+    """How long a request spent waiting for a slot, and then being served by snapd."""
+
+    method: str
+    path: str
+    priority: int
+    queue_time: float
+    service_time: float
+
+
+class _PrioritySemaphore:
+    """A semaphore whose waiters are woken lowest priority level first, then first come."""
+
+    def __init__(self, limit: int) -> None:
+        self._condition = threading.Condition()
+        self._available = limit
+        self._waiting: List[Tuple[int, int]] = []
+        self._counter = itertools.count()
+
+    def acquire(self, level: int) -> None:
+        with self._condition:
+            if self._available > 0 and not self._waiting:
+                self._available -= 1
+                return
+
+            entry = (level, next(self._counter))
+            heapq.heappush(self._waiting, entry)
+            self._condition.wait_for(
+                lambda: self._available > 0 and self._waiting[0] == entry
+            )
+            heapq.heappop(self._waiting)
+            self._available -= 1
+            self._condition.notify_all()
+
+    def release(self) -> None:
+        with self._condition:
+            self._available += 1
+            self._condition.notify_all()
+
+
+class Limiter:
+    """Limits concurrent requests to snapd, with separate budgets for reads and mutations.
+
+    Example:
+
+        http.LIMITER = Limiter(reads=4, mutations=1, on_timing=print)
+        with priority(INTERACTIVE):
+            snap_http.list()
+    """
+
+    def __init__(
+        self,
+        *,
+        reads: Optional[int] = None,
+        mutations: Optional[int] = None,
+        on_timing: Optional[Callable[[RequestTiming], None]] = None,
+    ) -> None:
+        """Initialize the limiter.
+
+        :param reads: the most GET requests to have in flight at once, or `None` for no limit.
+        :param mutations: the most other requests to have in flight at once, or `None` for no
+            limit.
+        :param on_timing: called with the `RequestTiming` of each request once it is done.
+        """
+        self.on_timing = on_timing
+        self._reads = None if reads is None else _PrioritySemaphore(reads)
+        self._mutations = None if mutations is None else _PrioritySemaphore(mutations)
+
+    @contextmanager
+    def slot(self, method: str, path: str) -> Iterator[None]:
+        """Wait for a slot for a `method` request of `path`, holding it for this context."""
+        semaphore = self._reads if method == "GET" else self._mutations
+        level = _priority.get()
+
+        queued_at = time.monotonic()
+        if semaphore is not None:
+            semaphore.acquire(level)
+        started_at = time.monotonic()
+
+        try:
+            yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+            if self.on_timing is not None:
+                self.on_timing(
+                    RequestTiming(
+                        method=method,
+                        path=path,
+                        priority=level,
+                        queue_time=started_at - queued_at,
+                        service_time=time.monotonic() - started_at,
+                    )
+                )
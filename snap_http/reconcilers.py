@@ -0,0 +1,590 @@
+"""Converging snapd on a declared state with as few requests as possible.
+
+Rather than issuing one call per snap per attribute, a reconciler reads the current state
+once, works out which snaps differ from the desired state, and groups the operations needed
+into the fewest requests snapd accepts. Operations that snapd can't apply to several snaps in
+one request are made concurrently instead, and the resulting changes are waited on together.
+Reconciling an already converged device costs a single GET.
+"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextvars import copy_context
+from dataclasses import dataclass, field, replace
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from . import api
+from .changes import ChangeTracker
+from .scheduler import OperationScheduler
+from .types import SUCCESS_STATUSES, SnapdResponse
+
+RISKS = ("stable", "candidate", "beta", "edge")
+
+# Actions snapd can apply to several snaps in one request, through `api.<action>_all`.
+MULTI_SNAP_ACTIONS = {"install", "refresh", "remove", "hold", "unhold"}
+
+
+@dataclass
+class SnapState:
+    """The desired state of a snap. Attributes left as `None` are not managed."""
+
+    present: bool = True
+    channel: Optional[str] = None
+    revision: Optional[str] = None
+    held: Optional[bool] = None
+    enabled: Optional[bool] = None
+
+
+@dataclass
+class Operation:
+    """A request planned by a reconciler: `action` applied to `snaps`, with `options`.
+
+    Actions in `MULTI_SNAP_ACTIONS` are made with `api.<action>_all(snaps, **options)`, others
+    with `api.<action>(snap, **options)` for their single snap.
+    """
+
+    action: str
+    snaps: List[str]
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    def run(self) -> SnapdResponse:
+        """Make the request."""
+        if self.action in MULTI_SNAP_ACTIONS and not self.options:
+            return getattr(api, f"{self.action}_all")(self.snaps)
+
+        (name,) = self.snaps
+        return getattr(api, self.action)(name, **self.options)
+
+
+@dataclass
+class OperationOutcome:
+    """What became of an `Operation`: its final change, or sync response, or its error."""
+
+    operation: Operation
+    response: Optional[SnapdResponse] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether the operation succeeded, including its change, if it made one."""
+        return self.error is None and _succeeded(self.response)
+
+
+@dataclass
+class ReconcileResult:
+    """The operations a reconciler planned, in phases, and their outcomes."""
+
+    phases: List[List[Operation]]
+    outcomes: List[OperationOutcome] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        """Whether any operation was needed."""
+        return any(self.phases)
+
+    @property
+    def ok(self) -> bool:
+        """Whether every operation succeeded."""
+        return all(outcome.ok for outcome in self.outcomes)
+
+
+def _succeeded(response: Optional[SnapdResponse]) -> bool:
+    """Whether `response`, if it is the final state of a change, is of a successful one."""
+    result = response.result if response is not None else None
+    return not isinstance(result, dict) or result.get("status", "Done") in SUCCESS_STATUSES
+
+
+def normalize_channel(channel: str) -> str:
+    """Spell out the track and risk of `channel`, e.g. "stable" is "latest/stable"."""
+    parts = channel.split("/")
+    if parts[0] in RISKS:
+        return "/".join(["latest", *parts])
+    if len(parts) == 1:
+        return f"{channel}/stable"
+    return channel
+
+
+def plan_snaps(
+    desired: Mapping[str, Union[SnapState, Dict[str, Any]]],
+    installed: Iterable[Mapping[str, Any]],
+) -> List[List[Operation]]:
+    """Plan the operations bringing the `installed` snaps, as listed by `list_all`, to `desired`.
+
+    The operations are grouped in phases, each of which must complete before the next starts:
+    installs, refreshes and removals, then enabling and disabling snaps, then holds. Within a
+    phase, operations touch different snaps and can be made at once.
+
+    :param desired: the desired state by snap name, as `SnapState`s or dicts of its fields.
+    """
+    current = current_revisions(installed)
+    installs: List[Operation] = []
+    install_names: List[str] = []
+    remove: List[str] = []
+    enable: List[str] = []
+    disable: List[str] = []
+    hold: List[str] = []
+    unhold: List[str] = []
+
+    for name, state in desired.items():
+        if isinstance(state, dict):
+            state = SnapState(**state)
+
+        snap = current.get(name)
+        if not state.present:
+            if snap is not None:
+                remove.append(name)
+            continue
+
+        options = {
+            k: v for k, v in (("channel", state.channel), ("revision", state.revision)) if v
+        }
+        if snap is None:
+            if options:
+                installs.append(Operation("install", [name], options))
+            else:
+                install_names.append(name)
+            enabled, held = True, False
+        else:
+            if _needs_refresh(state, snap):
+                installs.append(Operation("refresh", [name], options))
+            enabled, held = snap.get("status") == "active", bool(snap.get("hold"))
+
+        if state.enabled is not None and state.enabled != enabled:
+            (enable if state.enabled else disable).append(name)
+        if state.held is not None and state.held != held:
+            (hold if state.held else unhold).append(name)
+
+    phases = [
+        [
+            *([Operation("remove", remove)] if remove else []),
+            *([Operation("install", install_names)] if install_names else []),
+            *installs,
+        ],
+        [Operation("enable", [name]) for name in enable]
+        + [Operation("disable", [name]) for name in disable],
+        [
+            *([Operation("hold", hold)] if hold else []),
+            *([Operation("unhold", unhold)] if unhold else []),
+        ],
+    ]
+    return [phase for phase in phases if phase]
+
+
+def current_revisions(installed: Iterable[Mapping[str, Any]]) -> Dict[str, Mapping[str, Any]]:
+    """Pick the current revision of each snap from `installed`, as listed by `list_all`.
+
+    `list_all` lists every installed revision of a snap, of which only the current one is
+    "active". A disabled snap has no active revision: if it has several, the most recently
+    installed one is taken to be current.
+    """
+    current: Dict[str, Mapping[str, Any]] = {}
+    for snap in installed:
+        seen = current.get(snap["name"])
+        if seen is None or _more_current(snap, seen):
+            current[snap["name"]] = snap
+
+    return current
+
+
+def _more_current(snap: Mapping[str, Any], other: Mapping[str, Any]) -> bool:
+    if (snap.get("status") == "active") != (other.get("status") == "active"):
+        return snap.get("status") == "active"
+
+    return (snap.get("install-date") or "") > (other.get("install-date") or "")
+
+
+def _needs_refresh(state: SnapState, snap: Mapping[str, Any]) -> bool:
+    if state.revision and state.revision != str(snap.get("revision")):
+        return True
+
+    if not state.channel:
+        return False
+
+    tracking = snap.get("tracking-channel") or snap.get("channel") or ""
+    return normalize_channel(state.channel) != normalize_channel(tracking)
+
+
+def reconcile(
+    desired: Mapping[str, Union[SnapState, Dict[str, Any]]],
+    *,
+    max_workers: int = 8,
+    change_timeout: Optional[float] = None,
+    poll_interval: float = 0.5,
+) -> ReconcileResult:
+    """Bring the installed snaps to the `desired` state, see `plan_snaps`.
+
+    If an operation fails, later phases skip the snaps it touched.
+
+    :param desired: the desired state by snap name, as `SnapState`s or dicts of its fields.
+        Snaps not in `desired` are left alone.
+    :param max_workers: the most requests to make at once.
+    :param change_timeout: seconds to wait for each phase's changes to complete before
+        recording a `TimeoutError` for those that haven't.
+    :param poll_interval: seconds between polls of the changes being waited on.
+    """
+    installed: List[Dict[str, Any]] = api.list_all().result  # type: ignore[assignment]
+    result = ReconcileResult(plan_snaps(desired, installed))
+    result.outcomes = run_phases(
+        result.phases,
+        max_workers=max_workers,
+        change_timeout=change_timeout,
+        poll_interval=poll_interval,
+    )
+    return result
+
+
+def run_phases(
+    phases: List[List[Operation]],
+    *,
+    max_workers: int = 8,
+    change_timeout: Optional[float] = None,
+    poll_interval: float = 0.5,
+) -> List[OperationOutcome]:
+    """Make each phase's operations at once, waiting on their changes before the next phase.
+
+    Operations on snaps that an earlier operation failed on are skipped.
+    """
+    tracker = ChangeTracker(interval=poll_interval)
+    outcomes: List[OperationOutcome] = []
+    failed: Set[str] = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for phase in phases:
+            operations = [
+                replace(op, snaps=[s for s in op.snaps if s not in failed]) for op in phase
+            ]
+            for outcome in _run_phase(
+                executor, tracker, [op for op in operations if op.snaps], change_timeout
+            ):
+                if not outcome.ok:
+                    failed.update(outcome.operation.snaps)
+                outcomes.append(outcome)
+
+    return outcomes
+
+
+def _run_phase(
+    executor: ThreadPoolExecutor,
+    tracker: ChangeTracker,
+    operations: List[Operation],
+    change_timeout: Optional[float],
+) -> List[OperationOutcome]:
+    submitted = [(op, executor.submit(copy_context().run, op.run)) for op in operations]
+
+    outcomes: List[OperationOutcome] = []
+    changes: List[Tuple[Operation, str, "Future[SnapdResponse]"]] = []
+    for op, future in submitted:
+        try:
+            response = future.result()
+        except Exception as e:
+            outcomes.append(OperationOutcome(op, error=e))
+            continue
+
+        if response.type == "async" and response.change:
+            changes.append((op, response.change, tracker.track(response.change)))
+        else:
+            outcomes.append(OperationOutcome(op, response=response))
+
+    deadline = None if change_timeout is None else time.monotonic() + change_timeout
+    for op, cid, change in changes:
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            outcomes.append(OperationOutcome(op, response=change.result(timeout)))
+        except FutureTimeoutError:
+            error = TimeoutError(f"change {cid} did not complete within {change_timeout}s")
+            outcomes.append(OperationOutcome(op, error=error))
+        except Exception as e:
+            outcomes.append(OperationOutcome(op, error=e))
+
+    return outcomes
+
+
+class Connection(NamedTuple):
+    """A connection of the plug `plug_snap:plug` to the slot `slot_snap:slot`."""
+
+    plug_snap: str
+    plug: str
+    slot_snap: str
+    slot: str
+
+    @classmethod
+    def from_snapd(cls, connection: Mapping[str, Any]) -> "Connection":
+        """Get the connection described by an item of `get_connections`' "established"."""
+        plug, slot = connection["plug"], connection["slot"]
+        return cls(plug["snap"], plug["plug"], slot["snap"], slot["slot"])
+
+    def __str__(self) -> str:
+        return f"{self.plug_snap}:{self.plug} {self.slot_snap}:{self.slot}"
+
+
+@dataclass
+class ConnectionsResult:
+    """The connections a reconciler made and removed, and how each went."""
+
+    connect: List[Connection]
+    disconnect: List[Connection]
+    responses: Dict[Connection, SnapdResponse] = field(default_factory=dict)
+    errors: Dict[Connection, BaseException] = field(default_factory=dict)
+
+    @property
+    def changed(self) -> bool:
+        """Whether any connection needed to be made or removed."""
+        return bool(self.connect or self.disconnect)
+
+    @property
+    def ok(self) -> bool:
+        """Whether every connection was made or removed, and its change succeeded."""
+        return not self.errors and all(map(_succeeded, self.responses.values()))
+
+
+def plan_connections(
+    desired: Iterable[Connection],
+    connections: Mapping[str, Any],
+    *,
+    managed_snaps: Optional[Iterable[str]] = None,
+) -> Tuple[List[Connection], List[Connection]]:
+    """Plan which connections to make and which to remove to get from `connections` to `desired`.
+
+    :param connections: the result of `get_connections`.
+    :param managed_snaps: the snaps whose plugs are managed: their connections that aren't
+        desired are removed. Defaults to the plug snaps of `desired`.
+    :return: the connections to make, and the connections to remove.
+    """
+    desired = [Connection(*c) for c in desired]
+    managed = {c.plug_snap for c in desired} if managed_snaps is None else set(managed_snaps)
+    current = [Connection.from_snapd(c) for c in connections.get("established", [])]
+
+    wanted = set(desired)
+    established = set(current)
+    connect = [c for c in dict.fromkeys(desired) if c not in established]
+    disconnect = [c for c in current if c not in wanted and c.plug_snap in managed]
+    return connect, disconnect
+
+
+def reconcile_connections(
+    desired: Iterable[Connection],
+    *,
+    managed_snaps: Optional[Iterable[str]] = None,
+    max_workers: int = 8,
+    change_timeout: Optional[float] = None,
+) -> ConnectionsResult:
+    """Make and remove interface connections so that the managed snaps have just `desired`.
+
+    Connections are read once, with `get_connections(select="all")`, and only the differences
+    are acted on. Connects and disconnects run through an `OperationScheduler`: concurrently
+    where they touch different snaps, one after the other where they share a plug or slot
+    snap, which snapd would otherwise reject as a change conflict.
+
+    :param desired: the connections to have, as `Connection`s or tuples of their fields.
+    :param managed_snaps: the snaps whose plugs are managed: their connections that aren't
+        desired are removed. Defaults to the plug snaps of `desired`.
+    :param max_workers: the most operations to run at once.
+    :param change_timeout: seconds to wait for each operation's change to complete.
+    """
+    connections: Dict[str, Any] = api.get_connections(select="all").result  # type: ignore
+    connect, disconnect = plan_connections(desired, connections, managed_snaps=managed_snaps)
+    return _apply_connections(
+        connect, disconnect, max_workers=max_workers, change_timeout=change_timeout
+    )
+
+
+def connect_interfaces(
+    connections: Iterable[Connection],
+    *,
+    max_workers: int = 8,
+    change_timeout: Optional[float] = None,
+) -> ConnectionsResult:
+    """Make all of `connections`, waiting for their changes together.
+
+    snapd connects one plug to one slot per request, so each connection is its own request,
+    made through an `OperationScheduler`: concurrently where connections touch different
+    snaps, one after the other where they share a plug or slot snap.
+
+    :param connections: the connections to make, as `Connection`s or tuples of their fields.
+    :param max_workers: the most requests to make at once.
+    :param change_timeout: seconds to wait for each connection's change to complete.
+    """
+    return _apply_connections(
+        [Connection(*c) for c in connections],
+        [],
+        max_workers=max_workers,
+        change_timeout=change_timeout,
+    )
+
+
+def disconnect_interfaces(
+    connections: Iterable[Connection],
+    *,
+    max_workers: int = 8,
+    change_timeout: Optional[float] = None,
+) -> ConnectionsResult:
+    """Remove all of `connections`, waiting for their changes together, see `connect_interfaces`.
+
+    :param connections: the connections to remove, as `Connection`s or tuples of their fields.
+    :param max_workers: the most requests to make at once.
+    :param change_timeout: seconds to wait for each connection's change to complete.
+    """
+    return _apply_connections(
+        [],
+        [Connection(*c) for c in connections],
+        max_workers=max_workers,
+        change_timeout=change_timeout,
+    )
+
+
+def _apply_connections(
+    connect: List[Connection],
+    disconnect: List[Connection],
+    *,
+    max_workers: int,
+    change_timeout: Optional[float],
+) -> ConnectionsResult:
+    """Remove the `disconnect` connections and make the `connect` ones."""
+    result = ConnectionsResult(connect, disconnect)
+    if not result.changed:
+        return result
+
+    with OperationScheduler(max_workers=max_workers, change_timeout=change_timeout) as scheduler:
+        futures = {
+            c: scheduler.submit(
+                {c.plug_snap, c.slot_snap}, func, c.slot_snap, c.slot, c.plug_snap, c.plug
+            )
+            for func, planned in (
+                (api.disconnect_interface, disconnect),
+                (api.connect_interface, connect),
+            )
+            for c in planned
+        }
+
+    for c, future in futures.items():
+        try:
+            result.responses[c] = future.result()
+        except Exception as e:
+            result.errors[c] = e
+
+    return result
+
+
+@dataclass
+class ConfResult:
+    """The configuration changes a reconciler made to each snap, and how each went."""
+
+    patches: Dict[str, Dict[str, Any]]
+    responses: Dict[str, SnapdResponse] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+
+    @property
+    def changed(self) -> bool:
+        """Whether any snap's configuration needed changing."""
+        return any(self.patches.values())
+
+    @property
+    def ok(self) -> bool:
+        """Whether every snap's configuration was read, and changed if needed, successfully."""
+        return not self.errors and all(map(_succeeded, self.responses.values()))
+
+
+def diff_conf(
+    current: Mapping[str, Any], desired: Mapping[str, Any], *, prune: bool = False
+) -> Dict[str, Any]:
+    """Get the dotted-key patch turning the configuration `current` into `desired`.
+
+    Only keys whose values differ are included; a `None` value unsets its key.
+
+    :param desired: the desired configuration, with nested or dotted keys. `None` values
+        unset their keys.
+    :param prune: whether to also unset keys that are in `current` but not in `desired`.
+    """
+    return _diff_conf(current, _nest_conf(desired), prune, "")
+
+
+def _diff_conf(
+    current: Mapping[str, Any], desired: Mapping[str, Any], prune: bool, prefix: str
+) -> Dict[str, Any]:
+    patch: Dict[str, Any] = {}
+    for key, want in desired.items():
+        path = prefix + key
+        if key not in current:
+            if want is not None:
+                patch[path] = want
+            continue
+
+        have = current[key]
+        if isinstance(want, dict) and want and isinstance(have, dict):
+            patch.update(_diff_conf(have, want, prune, path + "."))
+        elif want != have:
+            patch[path] = want
+
+    if prune:
+        patch.update((prefix + key, None) for key in current if key not in desired)
+
+    return patch
+
+
+def _nest_conf(conf: Mapping[str, Any]) -> Dict[str, Any]:
+    """Expand the dotted keys of `conf`, e.g. {"a.b": 1} is {"a": {"b": 1}}."""
+    nested: Dict[str, Any] = {}
+    for key, value in conf.items():
+        *parents, leaf = key.split(".")
+        node = nested
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = _nest_conf(value) if isinstance(value, dict) else value
+
+    return nested
+
+
+def reconcile_conf(
+    desired: Mapping[str, Mapping[str, Any]],
+    *,
+    prune: bool = False,
+    max_workers: int = 8,
+    change_timeout: Optional[float] = None,
+) -> ConfResult:
+    """Change the configuration of the snaps in `desired` where, and only where, it differs.
+
+    The snaps' configurations are read concurrently, and each snap whose configuration
+    differs gets one `set_conf` with just the differing keys, see `diff_conf`. Snaps whose
+    configuration already matches aren't written to, so their configure hooks don't run.
+
+    :param desired: the desired configuration by snap name.
+    :param prune: whether to also unset the keys of those snaps that aren't in `desired`.
+    :param max_workers: the most requests to make at once.
+    :param change_timeout: seconds to wait for each snap's configure change to complete.
+    """
+    result = ConfResult(patches={})
+    for name, current in api.get_conf_many(desired, max_workers=max_workers).items():
+        if isinstance(current, Exception):
+            result.errors[name] = current
+        else:
+            result.patches[name] = diff_conf(current, desired[name], prune=prune)
+
+    if not result.changed:
+        return result
+
+    with OperationScheduler(max_workers=max_workers, change_timeout=change_timeout) as scheduler:
+        writes = {
+            name: scheduler.submit(name, api.set_conf, name, patch)
+            for name, patch in result.patches.items()
+            if patch
+        }
+
+    for name, write in writes.items():
+        try:
+            result.responses[name] = write.result()
+        except Exception as e:
+            result.errors[name] = e
+
+    return result
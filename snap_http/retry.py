@@ -0,0 +1,66 @@
+"""Retrying snapd requests that failed with transient errors."""
+
+import functools
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, FrozenSet, TypeVar
+
+from . import http
+
+T = TypeVar("T")
+
+# Error kinds that are expected to go away if the request is retried a little later.
+RETRYABLE_KINDS = frozenset({"snap-change-conflict", "network-timeout", "dns-failure"})
+
+
+@dataclass
+class RetryPolicy:
+    """Retries calls that fail with a transient snapd error, backing off with full jitter.
+
+    Errors whose kind is not in `retryable_kinds`, and any other exceptions, are raised
+    immediately.
+
+    Example:
+
+        policy = RetryPolicy(max_attempts=3)
+        response = policy.call(snap_http.refresh, "hello")
+    """
+
+    max_attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    retryable_kinds: FrozenSet[str] = RETRYABLE_KINDS
+
+    def is_retryable(self, exception: BaseException) -> bool:
+        """Whether `exception` is worth retrying."""
+        return (
+            isinstance(exception, http.SnapdHttpException)
+            and exception.kind in self.retryable_kinds
+        )
+
+    def delay(self, attempt: int) -> float:
+        """The seconds to wait after the failure of the `attempt`th (zero-based) attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call `func(*args, **kwargs)`, retrying it according to the policy."""
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts or not self.is_retryable(e):
+                    raise
+
+            time.sleep(self.delay(attempt))
+            attempt += 1
+
+    def __call__(self, func: Callable[..., T]) -> Callable[..., T]:
+        """Decorate `func` so that calls to it are retried according to the policy."""
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            return self.call(func, *args, **kwargs)
+
+        return wrapper
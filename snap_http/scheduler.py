@@ -0,0 +1,165 @@
+"""A scheduler for mutating snapd operations that avoids change conflicts.
+
+snapd rejects an operation on a snap while another change on that snap is in progress, with a
+`snap-change-conflict` error. `OperationScheduler` runs operations on the same snap one after
+the other, waiting for each one's change to complete, and runs operations on different snaps in
+parallel.
+"""
+
+import threading
+import time
+from collections import deque
+from contextvars import Context, copy_context
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterable, Optional, Set, Union
+
+from . import http
+from .changes import wait_change
+from .types import SnapdResponse
+
+
+@dataclass
+class _Operation:
+    snaps: FrozenSet[str]
+    func: Callable[..., SnapdResponse]
+    args: Any
+    kwargs: Dict[str, Any]
+    context: Context = field(default_factory=copy_context)
+    future: "Future[SnapdResponse]" = field(default_factory=Future)
+
+
+def conflicting_change(exception: http.SnapdHttpException) -> Optional[str]:
+    """Get the id of the change `exception` conflicted with, if it was a change conflict.
+
+    Returns an empty string for a conflict where snapd didn't say which change it was.
+    """
+    if exception.kind != "snap-change-conflict":
+        return None
+
+    return (exception.value or {}).get("change-id", "")
+
+
+class OperationScheduler:
+    """Queues mutating operations per snap, and runs operations on different snaps in parallel.
+
+    An operation holds its snaps until its snapd change completes, so a later operation on the
+    same snap doesn't conflict with it. If an operation conflicts with a change started outside
+    the scheduler, the scheduler waits for that change to complete and tries again.
+
+    Example:
+
+        with OperationScheduler() as scheduler:
+            install = scheduler.submit("hello", snap_http.install, "hello")
+            conf = scheduler.submit("hello", snap_http.set_conf, "hello", {"greeting": "hi"})
+            conf.result()
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int = 8,
+        conflict_retries: int = 5,
+        conflict_delay: float = 1.0,
+        change_timeout: Optional[float] = None,
+    ) -> None:
+        """Initialize the scheduler.
+
+        :param max_workers: the most operations to run at once.
+        :param conflict_retries: how many times to retry an operation after a change conflict.
+        :param conflict_delay: seconds to wait before retrying a conflict when snapd doesn't
+            say which change the operation conflicted with.
+        :param change_timeout: seconds to wait for an operation's change to complete before
+            failing it with a `TimeoutError`.
+        """
+        self.conflict_retries = conflict_retries
+        self.conflict_delay = conflict_delay
+        self.change_timeout = change_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Condition()
+        self._pending: Deque[_Operation] = deque()
+        self._busy: Set[str] = set()
+
+    def __enter__(self) -> "OperationScheduler":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def submit(
+        self,
+        snaps: Union[str, Iterable[str]],
+        func: Callable[..., SnapdResponse],
+        *args: Any,
+        **kwargs: Any,
+    ) -> "Future[SnapdResponse]":
+        """Schedule `func(*args, **kwargs)`, an operation on `snaps`.
+
+        The operation runs with the same `SnapdClient` active as the caller.
+
+        :param snaps: the name, or names, of the snaps the operation acts on.
+        :return: a future resolving, once the operation's change has completed, to the final
+            `check_change` response of the change, or to the operation's own response if
+            snapd handled it synchronously.
+        """
+        names = frozenset([snaps] if isinstance(snaps, str) else snaps)
+        operation = _Operation(names, func, args, kwargs)
+
+        with self._lock:
+            self._pending.append(operation)
+            self._dispatch()
+
+        return operation.future
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting operations, waiting for scheduled ones to finish if `wait`."""
+        if wait:
+            with self._lock:
+                self._lock.wait_for(lambda: not self._pending and not self._busy)
+
+        self._executor.shutdown(wait=wait)
+
+    def _dispatch(self) -> None:
+        """Start every pending operation whose snaps are free. Must hold `_lock`."""
+        claimed: Set[str] = set()
+        for operation in [*self._pending]:
+            # Snaps claimed by an earlier pending operation stay claimed, preserving the order
+            # in which operations on the same snap were submitted.
+            if not operation.snaps & (self._busy | claimed):
+                self._pending.remove(operation)
+                self._busy |= operation.snaps
+                self._executor.submit(operation.context.run, self._run, operation)
+            claimed |= operation.snaps
+
+    def _run(self, operation: _Operation) -> None:
+        try:
+            operation.future.set_result(self._execute(operation))
+        except BaseException as e:
+            operation.future.set_exception(e)
+        finally:
+            with self._lock:
+                self._busy -= operation.snaps
+                self._dispatch()
+                self._lock.notify_all()
+
+    def _execute(self, operation: _Operation) -> SnapdResponse:
+        attempts = 0
+        while True:
+            try:
+                response = operation.func(*operation.args, **operation.kwargs)
+                break
+            except http.SnapdHttpException as e:
+                change_id = conflicting_change(e)
+                if change_id is None or attempts >= self.conflict_retries:
+                    raise
+
+            attempts += 1
+            if change_id:
+                wait_change(change_id, timeout=self.change_timeout)
+            else:
+                time.sleep(self.conflict_delay)
+
+        if response.type == "async" and response.change:
+            return wait_change(response.change, timeout=self.change_timeout)
+
+        return response
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import json
+import mmap
+import os
 from abc import ABC, abstractproperty
-from dataclasses import dataclass, fields
-from functools import cached_property
-from io import BytesIO
+from collections import namedtuple
+from dataclasses import dataclass, field, fields
+from functools import cached_property, lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Type, Union
+from typing import IO, Any, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
 from uuid import uuid4
 
 # For the below, refer to https://snapcraft.io/docs/snapd-api#heading--changes
@@ -15,6 +17,30 @@ INCOMPLETE_STATUSES = {"Do", "Doing", "Undo", "Undoing"}
 SUCCESS_STATUSES = {"Done"}
 ERROR_STATUSES = {"Error", "Hold", "Unknown"}
 
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+class SpooledBody(mmap.mmap):
+    """A response body too large to hold in memory, spooled to a temporary file.
+
+    The file is mapped read-only, so the body can be sliced and searched like `bytes`, or read
+    like a file, and is only paged in as it is accessed.
+    """
+
+    file: IO[bytes]
+
+    @classmethod
+    def map(cls, file: IO[bytes]) -> "SpooledBody":
+        """Map the whole of `file`, which the body keeps open for as long as it is mapped."""
+        body = cls(file.fileno(), 0, access=mmap.ACCESS_READ)
+        body.file = file
+        return body
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "SpooledBody":
+        # The mapping is read-only, but has a file position: give copies their own.
+        return type(self).map(self.file)
+
+
 SnapdRequestBody = Union[
     Dict[str, Any],
     "JsonData",
@@ -39,6 +65,7 @@ class SnapdResponse:
     warning_timestamp: Union[str, None] = None
     warning_count: Union[int, None] = None
     suggested_currency: Union[str, None] = None
+    maintenance: Union[Dict[str, Any], None] = None
 
     @classmethod
     def from_http_response(
@@ -67,10 +94,18 @@ class AbstractRequestBody(ABC):
     def serialized(self) -> bytes:
         """Serialize the request body based on the `content_type`."""
 
+    @property
+    def buffers(self) -> List[Buffer]:
+        """Get the buffers that, concatenated, make up the serialized request body.
+
+        Sending these with a scatter/gather write avoids building the serialized body in memory.
+        """
+        return [self.serialized]
+
     @cached_property
     def content_length(self) -> int:
         """Get the length of the serialized request body."""
-        return len(self.serialized)
+        return sum(len(buffer) for buffer in self.buffers)
 
     @cached_property
     def content_type_header(self) -> str:
@@ -109,29 +144,32 @@ class FormData(AbstractRequestBody):
     @cached_property
     def serialized(self) -> bytes:
         """Serialize the request data & files to the multipart/form-data format."""
-        content = BytesIO()
-        for key, value in self.data.items():
-            content.write(
-                (
-                    f"--{self.boundary}\r\n"
-                    f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
-                    f"{value}\r\n"
-                ).encode()
-            )
+        return b"".join(self.buffers)
+
+    @property
+    def buffers(self) -> List[Buffer]:
+        """Get the parts of the multipart/form-data body, with files memory-mapped."""
+        fields = "".join(
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+            f"{value}\r\n"
+            for key, value in self.data.items()
+        )
+        buffers: List[Buffer] = [fields.encode()]
 
         for file in self.files:
-            content.write(
+            buffers.append(
                 (
                     f"--{self.boundary}\r\n"
                     f'Content-Disposition: form-data; name="{file.name}"; '
                     f'filename="{file.filename}"\r\n\r\n'
                 ).encode()
             )
-            content.write(file.content)
-            content.write(b"\r\n")
+            buffers.append(file.buffer)
+            buffers.append(b"\r\n")
 
-        content.write(f"--{self.boundary}--\r\n".encode())
-        return content.getvalue()
+        buffers.append(f"--{self.boundary}--\r\n".encode())
+        return buffers
 
     @cached_property
     def content_type_header(self) -> str:
@@ -144,16 +182,61 @@ class AssertionData(AbstractRequestBody):
 
     content_type = "application/x.ubuntu.assertion"
 
-    def __init__(self, assertion: str):
+    def __init__(self, assertion: Union[str, bytes]):
         """Initialize the class with `data`."""
         self.assertion = assertion
 
     @cached_property
     def serialized(self) -> bytes:
         """Serialize the assertion to bytes."""
+        if isinstance(self.assertion, bytes):
+            return self.assertion
         return self.assertion.encode()
 
 
+@dataclass
+class ChangeUpdate:
+    """An update on the progress of a snapd change, as yielded by `watch_change`.
+
+    Only the tasks whose status or progress changed since the previous update are included.
+    """
+
+    id: str
+    status: str
+    tasks: List[Dict[str, Any]]
+    done: int = 0
+    total: int = 0
+    err: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the change has reached one of the `COMPLETE_STATUSES`."""
+        return self.status in COMPLETE_STATUSES
+
+    @property
+    def succeeded(self) -> bool:
+        """Whether the change completed with one of the `SUCCESS_STATUSES`."""
+        return self.status in SUCCESS_STATUSES
+
+    @property
+    def failed(self) -> bool:
+        """Whether the change completed with one of the `ERROR_STATUSES`."""
+        return self.status in ERROR_STATUSES
+
+
+@dataclass
+class AddAssertionsResult:
+    """The outcome of adding many assertions with `add_assertions`."""
+
+    added: int
+    failures: List[Tuple[bytes, Exception]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        """Whether every assertion was added."""
+        return not self.failures
+
+
 @dataclass
 class FileUpload:
     """A file to upload to snapd's REST API."""
@@ -171,3 +254,32 @@ class FileUpload:
         """Read and return the file's binary content."""
         with open(self.path, "rb") as f:
             return f.read()
+
+    @cached_property
+    def buffer(self) -> Buffer:
+        """Return the file's content memory-mapped, so it is paged in as it is sent."""
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@lru_cache(maxsize=None)
+def record_type(fields: Tuple[str, ...]) -> Type[Tuple[Any, ...]]:
+    """Get the named tuple type for records of snapd objects' `fields`.
+
+    Hyphens in field names become underscores, e.g. "tracking-channel" is `tracking_channel`.
+    """
+    return namedtuple(  # type: ignore[return-value]
+        "Record", [f.replace("-", "_") for f in fields], rename=True
+    )
+
+
+def projector(fields: Sequence[str]) -> Callable[[Dict[str, Any]], Tuple[Any, ...]]:
+    """Get a function turning a snapd object into a record of just its `fields`.
+
+    Fields the object doesn't have are `None` in its record.
+    """
+    fields = tuple(fields)
+    make = record_type(fields)._make  # type: ignore[attr-defined]
+    return lambda obj: make(map(obj.get, fields))
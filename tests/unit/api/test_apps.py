@@ -587,3 +587,19 @@ def test_restart_all_exception(monkeypatch):
 
     with pytest.raises(http.SnapdHttpException):
         api.restart_all(["idonotexist", "lxd"])
+
+
+def test_get_apps_fields(monkeypatch):
+    """`api.get_apps` returns records of just the requested fields."""
+    def mock_iter_result(path, query_params):
+        assert path == "/apps"
+        assert query_params == {"select": "service"}
+
+        yield {"snap": "lxd", "name": "daemon", "daemon": "simple", "active": True}
+        return {"type": "sync", "status-code": 200, "status": "OK"}
+
+    monkeypatch.setattr(http, "iter_result", mock_iter_result)
+
+    result = api.get_apps(services_only=True, fields=["snap", "name", "active"])
+
+    assert result.result == [("lxd", "daemon", True)]
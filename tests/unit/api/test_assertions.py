@@ -1,3 +1,5 @@
+import io
+
 import pytest
 
 from snap_http import api, http, types
@@ -105,3 +107,121 @@ def test_add_assertion_exception(monkeypatch):
 
     with pytest.raises(http.SnapdHttpException):
         api.add_assertion("not an assertion")
+
+
+ASSERTION_A = b"type: account\naccount-id: a\n\nsignature-a"
+ASSERTION_B = b"type: account\naccount-id: b\n\nsignature-b"
+ASSERTION_C = b"type: account\naccount-id: c\n\nsignature-c"
+
+
+def test_add_assertions_batches(monkeypatch):
+    """`api.add_assertions` sends assertions in batches of `batch_size`."""
+    bodies = []
+
+    def mock_post(path, body):
+        assert path == "/assertions"
+        bodies.append(body.serialized)
+
+        return types.SnapdResponse(type="sync", status_code=200, status="OK", result=None)
+
+    monkeypatch.setattr(http, "post", mock_post)
+
+    result = api.add_assertions(
+        [ASSERTION_A.decode(), ASSERTION_B, ASSERTION_C], batch_size=2
+    )
+
+    assert result == types.AddAssertionsResult(added=3)
+    assert result.ok
+    assert bodies == [ASSERTION_A + b"\n\n" + ASSERTION_B, ASSERTION_C]
+
+
+def test_add_assertions_from_file(monkeypatch, tmp_path):
+    """`api.add_assertions` reads concatenated assertions from a file path."""
+    bodies = []
+
+    def mock_post(path, body):
+        bodies.append(body.serialized)
+
+        return types.SnapdResponse(type="sync", status_code=200, status="OK", result=None)
+
+    monkeypatch.setattr(http, "post", mock_post)
+    path = tmp_path / "seed.assert"
+    path.write_bytes(b"\n\n".join([ASSERTION_A, ASSERTION_B, ASSERTION_C]) + b"\n")
+
+    result = api.add_assertions(str(path))
+
+    assert result.added == 3
+    assert bodies == [b"\n\n".join([ASSERTION_A, ASSERTION_B, ASSERTION_C])]
+
+
+def test_add_assertions_reports_failures(monkeypatch):
+    """`api.add_assertions` retries a rejected batch one by one to report failures."""
+    bodies = []
+
+    def mock_post(path, body):
+        bodies.append(body.serialized)
+        if ASSERTION_B in body.serialized:
+            raise http.SnapdHttpException(b'{"result": {"message": "bad"}}')
+
+        return types.SnapdResponse(type="sync", status_code=200, status="OK", result=None)
+
+    monkeypatch.setattr(http, "post", mock_post)
+
+    stream = io.BytesIO(b"\n\n".join([ASSERTION_A, ASSERTION_B, ASSERTION_C]))
+
+    result = api.add_assertions(stream, batch_size=2)
+
+    assert result.added == 2
+    assert not result.ok
+    assert [a for a, _ in result.failures] == [ASSERTION_B]
+    assert bodies == [
+        ASSERTION_A + b"\n\n" + ASSERTION_B,
+        ASSERTION_A,
+        ASSERTION_B,
+        ASSERTION_C,
+        ASSERTION_B,
+    ]
+
+
+def test_add_assertions_retries_prerequisites(monkeypatch):
+    """Assertions whose prerequisites come later in the stream are added once they are."""
+    added = []
+
+    def mock_post(path, body):
+        if ASSERTION_A in body.serialized and ASSERTION_C not in added:
+            raise http.SnapdHttpException(
+                b'{"status-code": 400, "result": {"message": "cannot find prerequisite"}}'
+            )
+        added.append(body.serialized)
+
+        return types.SnapdResponse(type="sync", status_code=200, status="OK", result=None)
+
+    monkeypatch.setattr(http, "post", mock_post)
+
+    result = api.add_assertions([ASSERTION_A, ASSERTION_B, ASSERTION_C], batch_size=2)
+
+    assert result == types.AddAssertionsResult(added=3)
+    assert added == [ASSERTION_B, ASSERTION_C, ASSERTION_A]
+
+
+@pytest.mark.parametrize(
+    "exception",
+    [
+        http.SnapdUnavailable(),
+        http.HTTPProtocolError("connection closed before end of response"),
+        http.SnapdHttpException(b'{"status-code": 500, "result": {"message": "internal"}}'),
+    ],
+)
+def test_add_assertions_raises_other_errors(monkeypatch, exception):
+    """Errors other than snapd rejecting the assertions are raised, not retried."""
+    bodies = []
+
+    def mock_post(path, body):
+        bodies.append(body.serialized)
+        raise exception
+
+    monkeypatch.setattr(http, "post", mock_post)
+
+    with pytest.raises(type(exception)):
+        api.add_assertions([ASSERTION_A, ASSERTION_B], batch_size=2)
+    assert len(bodies) == 1
@@ -57,8 +57,9 @@ def test_check_changes(monkeypatch):
         },
     )
 
-    def mock_get(path):
-        assert path == "/changes?select=all"
+    def mock_get(path, query_params):
+        assert path == "/changes"
+        assert query_params == {"select": "all"}
 
         return mock_response
 
@@ -72,8 +73,9 @@ def test_check_changes(monkeypatch):
 def test_check_changes_exception(monkeypatch):
     """`api.check_changes` raises a `http.SnapdHttpException`."""
 
-    def mock_get(path):
-        assert path == "/changes?select=all"
+    def mock_get(path, query_params):
+        assert path == "/changes"
+        assert query_params == {"select": "all"}
 
         raise http.SnapdHttpException()
 
@@ -81,3 +83,77 @@ def test_check_changes_exception(monkeypatch):
 
     with pytest.raises(http.SnapdHttpException):
         _ = api.check_changes()
+
+
+def test_check_changes_filtered(monkeypatch):
+    """`api.check_changes` passes the `select` and `for` filters on to snapd."""
+    mock_response = types.SnapdResponse(
+        type="sync",
+        status_code=200,
+        status="OK",
+        result=[],
+    )
+
+    def mock_get(path, query_params):
+        assert path == "/changes"
+        assert query_params == {"select": "in-progress", "for": "placeholder"}
+
+        return mock_response
+
+    monkeypatch.setattr(http, "get", mock_get)
+
+    result = api.check_changes("in-progress", for_snap="placeholder")
+
+    assert result == mock_response
+
+
+def test_iter_changes(monkeypatch):
+    """`api.iter_changes` yields change summaries without their tasks."""
+    def mock_iter_result(path, query_params):
+        assert path == "/changes"
+        assert query_params == {"select": "ready", "for": "placeholder"}
+
+        yield {"id": "1", "status": "Done", "tasks": [{"id": "1"}]}
+        yield {"id": "2", "status": "Doing", "tasks": [{"id": "2"}]}
+
+    monkeypatch.setattr(http, "iter_result", mock_iter_result)
+
+    result = list(api.iter_changes("ready", for_snap="placeholder"))
+
+    assert result == [{"id": "1", "status": "Done"}, {"id": "2", "status": "Doing"}]
+
+
+def test_abort_change(monkeypatch):
+    """`api.abort_change` returns a `types.SnapdResponse`."""
+    mock_response = types.SnapdResponse(
+        type="sync",
+        status_code=200,
+        status="OK",
+        result={"id": "1", "status": "Doing", "ready": False},
+    )
+
+    def mock_post(path, body):
+        assert path == "/changes/1"
+        assert body == {"action": "abort"}
+
+        return mock_response
+
+    monkeypatch.setattr(http, "post", mock_post)
+
+    result = api.abort_change("1")
+
+    assert result == mock_response
+
+
+def test_abort_change_exception(monkeypatch):
+    """`api.abort_change` raises a `http.SnapdHttpException`."""
+
+    def mock_post(path, body):
+        assert path == "/changes/1"
+
+        raise http.SnapdHttpException()
+
+    monkeypatch.setattr(http, "post", mock_post)
+
+    with pytest.raises(http.SnapdHttpException):
+        _ = api.abort_change("1")
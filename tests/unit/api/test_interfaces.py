@@ -23,6 +23,32 @@ def test_get_connections(monkeypatch):
     assert result == mock_response
 
 
+def test_get_connections_fields(monkeypatch):
+    """`api.get_connections` projects connections, plugs and slots to the requested fields."""
+    mock_response = types.SnapdResponse(
+        type="sync",
+        status_code=200,
+        status="OK",
+        result={
+            "established": [
+                {"interface": "network", "plug": {"snap": "a"}, "slot": {"snap": "snapd"}}
+            ],
+            "plugs": [{"snap": "a", "plug": "network", "interface": "network"}],
+        },
+    )
+
+    def mock_get(path, query_params):
+        return mock_response
+
+    monkeypatch.setattr(http, "get", mock_get)
+
+    result = api.get_connections(fields=["interface", "plug"])
+
+    established, = result.result["established"]
+    assert (established.interface, established.plug) == ("network", {"snap": "a"})
+    assert tuple(result.result["plugs"][0]) == ("network", "network")
+
+
 def test_get_interfaces(monkeypatch):
     """`api.get_interfaces` returns a `types.SnapdResponse`."""
     mock_response = types.SnapdResponse(
@@ -63,3 +63,25 @@ def test_set_conf(monkeypatch):
     result = api.set_conf("placeholder", {"foo": "bar"})
 
     assert result == mock_response
+
+
+def test_get_conf_many(monkeypatch):
+    """`api.get_conf_many` maps each snap to its configuration, or to its error."""
+    def mock_get(path, query_params):
+        assert query_params == {"keys": "port"}
+        name = path.split("/")[2]
+        if name == "missing":
+            raise http.SnapNotFound(b'{"result": {"kind": "snap-not-found"}}')
+
+        return types.SnapdResponse(
+            type="sync", status_code=200, status="OK", result={"port": len(name)}
+        )
+
+    monkeypatch.setattr(http, "get", mock_get)
+
+    result = api.get_conf_many(["a", "bb", "missing", "a"], keys=["port"])
+
+    assert list(result) == ["a", "bb", "missing"]
+    assert result["a"] == {"port": 1}
+    assert result["bb"] == {"port": 2}
+    assert isinstance(result["missing"], http.SnapNotFound)
@@ -927,6 +927,43 @@ def test_list_all(monkeypatch):
 
     assert result == mock_response
 
+
+def test_list_all_fields(monkeypatch):
+    """`api.list_all` returns records of just the requested fields, mapped as they stream."""
+    def mock_iter_result(path, query_params):
+        assert path == "/snaps"
+        assert query_params == {"select": "all"}
+
+        yield {"name": "hello", "revision": "42", "tracking-channel": "latest/stable"}
+        yield {"name": "core22", "revision": "7"}
+        return {"type": "sync", "status-code": 200, "status": "OK"}
+
+    monkeypatch.setattr(http, "iter_result", mock_iter_result)
+
+    result = api.list_all(fields=["name", "tracking-channel"])
+
+    assert result.status_code == 200
+    assert [tuple(snap) for snap in result.result] == [
+        ("hello", "latest/stable"),
+        ("core22", None),
+    ]
+    assert result.result[0].tracking_channel == "latest/stable"
+
+
+def test_iter_list_all(monkeypatch):
+    """`api.iter_list_all` streams the result of `/snaps?select=all`."""
+    def mock_iter_result(path, query_params):
+        assert path == "/snaps"
+        assert query_params == {"select": "all"}
+
+        yield from [{"title": "placeholder1"}, {"title": "placeholder2"}]
+
+    monkeypatch.setattr(http, "iter_result", mock_iter_result)
+
+    result = [*api.iter_list_all()]
+
+    assert result == [{"title": "placeholder1"}, {"title": "placeholder2"}]
+
 @pytest.mark.parametrize(
     ("names", "entries", "expected_params"),
     [
@@ -0,0 +1,199 @@
+"""Tests for `snap_http.assertions`, client-side assertion helpers and caching."""
+
+import tempfile
+
+import pytest
+
+from snap_http import assertions, http, types
+
+DECLARATION_R1 = (
+    b"type: snap-declaration\n"
+    b"authority-id: canonical\n"
+    b"revision: 1\n"
+    b"series: 16\n"
+    b"snap-id: abc123\n"
+    b"publisher-id: pub\n"
+    b"snap-name: hello\n"
+    b"sign-key-sha3-384: key\n\n"
+    b"AcLBXAQAAQoABgUCXXXX\nSIGNATURE1"
+)
+DECLARATION_R2 = DECLARATION_R1.replace(b"revision: 1", b"revision: 2").replace(
+    b"SIGNATURE1", b"SIGNATURE2"
+)
+ACCOUNT = (
+    b"type: account\n"
+    b"authority-id: canonical\n"
+    b"account-id: pub\n"
+    b"display-name: Publisher\n"
+    b"body-length: 11\n"
+    b"sign-key-sha3-384: key\n\n"
+    b"hello\n\nbody\n\n"
+    b"SIGNATURE3"
+)
+
+
+def assertions_response(*items):
+    return types.SnapdResponse(
+        type="sync",
+        status_code=200,
+        status="OK",
+        result=b"\n\n".join(items),
+    )
+
+
+@pytest.fixture
+def counting_get(monkeypatch):
+    """Patch `http.get` to serve `responses` in order, counting the calls made."""
+    calls = []
+    responses = []
+
+    def mock_get(path, query_params=None):
+        calls.append((path, query_params))
+        return responses.pop(0)
+
+    monkeypatch.setattr(http, "get", mock_get)
+
+    return calls, responses
+
+
+def test_split_assertions():
+    """`split_assertions` splits a stream, respecting `body-length`."""
+    stream = b"\n\n".join([DECLARATION_R1, ACCOUNT, DECLARATION_R2]) + b"\n"
+
+    assert assertions.split_assertions(stream) == [DECLARATION_R1, ACCOUNT, DECLARATION_R2]
+
+
+def test_split_assertions_spooled():
+    """`split_assertions` reads spooled bodies through their mapping, from the start."""
+    stream = b"\n\n".join([DECLARATION_R1, ACCOUNT, DECLARATION_R2]) + b"\n"
+    with tempfile.TemporaryFile() as f:
+        f.write(stream)
+        f.flush()
+        body = types.SpooledBody.map(f)
+        body.read(10)
+
+        assert assertions.split_assertions(body) == [DECLARATION_R1, ACCOUNT, DECLARATION_R2]
+        body.close()
+
+
+def test_split_assertions_empty():
+    """`split_assertions` returns nothing for an empty stream."""
+    assert assertions.split_assertions(b"") == []
+
+
+def test_parse_headers():
+    """`parse_headers` returns the single-line headers of an assertion."""
+    headers = assertions.parse_headers(
+        b"type: model\nseries: 16\nsnaps:\n  -\n    name: pc\nmodel: x\n\nsig"
+    )
+
+    assert headers == {"type": "model", "series": "16", "model": "x"}
+
+
+def test_primary_key():
+    """`primary_key` returns `None` for unknown types or missing headers."""
+    assert assertions.primary_key("snap-declaration", {"series": 16, "snap-id": "a"}) == (
+        "16",
+        "a",
+    )
+    assert assertions.primary_key("snap-declaration", {"series": 16}) is None
+    assert assertions.primary_key("unknown", {"series": 16}) is None
+
+
+def test_cache_answers_repeat_lookups(counting_get):
+    """Repeat lookups are answered without a round-trip to snapd."""
+    calls, responses = counting_get
+    responses.append(assertions_response(DECLARATION_R1))
+    cache = assertions.AssertionCache(":memory:")
+
+    first = cache.get_assertions("snap-declaration", {"snap-name": "hello"})
+    second = cache.get_assertions("snap-declaration", {"snap-name": "hello"})
+
+    assert len(calls) == 1
+    assert first.result == second.result == DECLARATION_R1
+
+
+def test_cache_answers_primary_key_lookups(counting_get):
+    """A lookup by full primary key reuses assertions fetched by other queries."""
+    calls, responses = counting_get
+    responses.append(assertions_response(DECLARATION_R1))
+    cache = assertions.AssertionCache(":memory:")
+
+    cache.get_assertions("snap-declaration", {"snap-name": "hello"})
+    result = cache.get_assertions(
+        "snap-declaration", {"series": "16", "snap-id": "abc123", "publisher-id": "pub"}
+    )
+
+    assert len(calls) == 1
+    assert result.result == DECLARATION_R1
+
+
+def test_cache_revalidates_stale_lookups(counting_get):
+    """Lookups older than `max_age` are revalidated, keeping the newest revision."""
+    calls, responses = counting_get
+    responses.extend([assertions_response(DECLARATION_R2), assertions_response(DECLARATION_R1)])
+    cache = assertions.AssertionCache(":memory:", max_age=0)
+
+    cache.get_assertions("snap-declaration", {"snap-name": "hello"})
+    cache.get_assertions("snap-declaration", {"snap-name": "hello"})
+    cache.max_age = None
+    result = cache.get_assertions("snap-declaration", {"series": "16", "snap-id": "abc123"})
+
+    assert len(calls) == 2
+    assert result.result == DECLARATION_R2
+
+
+def test_cache_persists(counting_get, tmp_path):
+    """Cached assertions survive reopening the cache."""
+    calls, responses = counting_get
+    responses.append(assertions_response(ACCOUNT))
+    path = str(tmp_path / "assertions.db")
+
+    cache = assertions.AssertionCache(path)
+    cache.get_assertions("account", {"account-id": "pub"})
+    cache.close()
+
+    result = assertions.AssertionCache(path).get_assertions("account", {"account-id": "pub"})
+
+    assert len(calls) == 1
+    assert result.result == ACCOUNT
+
+
+def test_cache_invalidate(counting_get):
+    """`invalidate` causes the next lookup to go to snapd."""
+    calls, responses = counting_get
+    responses.extend([assertions_response(ACCOUNT), assertions_response(ACCOUNT)])
+    cache = assertions.AssertionCache(":memory:")
+
+    cache.get_assertions("account", {"account-id": "pub"})
+    cache.invalidate("account")
+    cache.get_assertions("account", {"account-id": "pub"})
+    cache.invalidate()
+
+    assert len(calls) == 2
+
+
+def test_cache_unknown_type(counting_get):
+    """Assertion types without a known primary key are never cached."""
+    calls, responses = counting_get
+    responses.extend([assertions_response(b"type: other\n\nsig")] * 2)
+    cache = assertions.AssertionCache(":memory:")
+
+    cache.get_assertions("other")
+    cache.get_assertions("other")
+
+    assert len(calls) == 2
+
+
+def test_cache_add_assertion(counting_get, monkeypatch):
+    """Assertions added through the cache are served without a round-trip."""
+    calls, _ = counting_get
+    mock_response = types.SnapdResponse(type="sync", status_code=200, status="OK", result=None)
+    monkeypatch.setattr(http, "post", lambda path, body: mock_response)
+    cache = assertions.AssertionCache(":memory:")
+
+    assert cache.add_assertion(DECLARATION_R2.decode()) == mock_response
+    result = cache.get_assertions("snap-declaration", {"series": "16", "snap-id": "abc123"})
+
+    assert calls == []
+    assert result.result == DECLARATION_R2
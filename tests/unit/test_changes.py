@@ -0,0 +1,287 @@
+"""Tests for `snap_http.changes`, helpers for following snapd changes to completion."""
+
+import asyncio
+
+import pytest
+
+from snap_http import changes, http, types
+
+
+def change_response(status, tasks):
+    return types.SnapdResponse(
+        type="sync",
+        status_code=200,
+        status="OK",
+        result={"id": "1", "status": status, "tasks": tasks},
+    )
+
+
+def task(tid, status, done=0, total=1):
+    return {"id": tid, "status": status, "progress": {"done": done, "total": total}}
+
+
+POLLS = [
+    change_response("Doing", [task("1", "Doing"), task("2", "Do")]),
+    change_response("Doing", [task("1", "Doing"), task("2", "Do")]),
+    change_response("Doing", [task("1", "Done", 1), task("2", "Doing")]),
+    change_response("Done", [task("1", "Done", 1), task("2", "Done", 1)]),
+]
+
+
+@pytest.fixture
+def polls(monkeypatch):
+    """Patch `http.get` to return each of `POLLS` in turn, and make sleeping instant."""
+    responses = iter(POLLS)
+
+    def mock_get(path):
+        assert path == "/changes/1"
+        return next(responses)
+
+    async def mock_async_sleep(delay):
+        pass
+
+    monkeypatch.setattr(http, "get", mock_get)
+    monkeypatch.setattr(changes.time, "sleep", lambda delay: None)
+    monkeypatch.setattr(changes.asyncio, "sleep", mock_async_sleep)
+
+
+EXPECTED = [
+    types.ChangeUpdate(
+        id="1", status="Doing", tasks=[task("1", "Doing"), task("2", "Do")], done=0, total=2
+    ),
+    types.ChangeUpdate(
+        id="1", status="Doing", tasks=[task("1", "Done", 1), task("2", "Doing")], done=1, total=2
+    ),
+    types.ChangeUpdate(id="1", status="Done", tasks=[task("2", "Done", 1)], done=2, total=2),
+]
+
+
+def test_watch_change(polls):
+    """`watch_change` yields only the deltas between polls, stopping once ready."""
+    updates = list(changes.watch_change("1"))
+
+    assert updates == EXPECTED
+    assert updates[-1].ready
+    assert updates[-1].succeeded
+    assert not updates[-1].failed
+    assert not updates[0].ready
+
+
+def test_awatch_change(polls):
+    """`awatch_change` yields the same deltas as `watch_change`."""
+
+    async def collect():
+        return [update async for update in changes.awatch_change("1")]
+
+    assert asyncio.run(collect()) == EXPECTED
+
+
+def test_next_interval():
+    """Polling backs off while a change is quiet, and resets when it progresses."""
+    assert changes._next_interval(0.1, False, 0.1, 0.3) == 0.2
+    assert changes._next_interval(0.2, False, 0.1, 0.3) == 0.3
+    assert changes._next_interval(0.3, True, 0.1, 0.3) == 0.1
+
+
+def test_change_tracker(monkeypatch):
+    """`ChangeTracker` polls in-progress changes once, fetching only completed changes."""
+    calls = []
+    in_progress = [{"id": "1", "status": "Doing"}, {"id": "2", "status": "Doing"}]
+
+    def mock_get(path, query_params=None):
+        calls.append(path)
+        if query_params == {"select": "in-progress"}:
+            return types.SnapdResponse(
+                type="sync", status_code=200, status="OK", result=in_progress
+            )
+
+        return change_response("Done", [])
+
+    monkeypatch.setattr(http, "get", mock_get)
+    tracker = changes.ChangeTracker(interval=3600)
+    first = tracker.track("1")
+    second = tracker.track("2")
+
+    tracker.poll()
+    assert not first.done()
+    assert not second.done()
+
+    in_progress.pop(0)
+    tracker.poll()
+
+    assert first.result() == change_response("Done", [])
+    assert not second.done()
+    assert calls == [
+        "/changes",
+        "/changes",
+        "/changes/1",
+    ]
+
+
+def test_change_tracker_background(monkeypatch):
+    """`ChangeTracker` polls in the background until all tracked changes complete."""
+
+    def mock_get(path, query_params=None):
+        if query_params == {"select": "in-progress"}:
+            return types.SnapdResponse(type="sync", status_code=200, status="OK", result=[])
+        return change_response("Error", [])
+
+    monkeypatch.setattr(http, "get", mock_get)
+    tracker = changes.ChangeTracker(interval=0)
+
+    result = tracker.track("1").result(timeout=5)
+
+    assert result.result["status"] == "Error"
+
+    async def track():
+        return await tracker.atrack("1")
+
+    assert asyncio.run(track()) == change_response("Error", [])
+
+
+def test_change_tracker_exception(monkeypatch):
+    """`ChangeTracker` passes on errors about a change to the futures of that change."""
+
+    def mock_get(path, query_params=None):
+        if query_params == {"select": "in-progress"}:
+            return types.SnapdResponse(type="sync", status_code=200, status="OK", result=[])
+        if path == "/changes/1":
+            raise http.SnapdHttpException()
+        raise http.SnapdUnavailable()
+
+    monkeypatch.setattr(http, "get", mock_get)
+    tracker = changes.ChangeTracker(interval=3600)
+    failed = tracker.track("1")
+    unreachable = tracker.track("2")
+
+    tracker.poll()
+
+    with pytest.raises(http.SnapdHttpException):
+        failed.result()
+    assert not unreachable.done()
+
+
+def test_change_tracker_failed_poll(monkeypatch):
+    """`ChangeTracker` retries failed polls, failing every change after `max_failures`."""
+    # The errors to raise from successive requests, `None` for succeeding.
+    failures = [http.SnapdUnavailable(), None, OSError("timed out")]
+
+    def mock_get(path, query_params=None):
+        failure = failures.pop(0) if failures else None
+        if failure is not None:
+            raise failure
+        if query_params == {"select": "in-progress"}:
+            return types.SnapdResponse(type="sync", status_code=200, status="OK", result=[])
+        return change_response("Done", [])
+
+    monkeypatch.setattr(http, "get", mock_get)
+    tracker = changes.ChangeTracker(interval=3600, max_failures=2)
+    future = tracker.track("1")
+
+    tracker.poll()
+    assert not future.done()
+    tracker.poll()
+    assert not future.done()
+    tracker.poll()
+    assert future.result() == change_response("Done", [])
+
+    failures.extend([OSError("timed out"), OSError("timed out")])
+    future = tracker.track("1")
+    tracker.poll()
+    assert not future.done()
+    tracker.poll()
+    with pytest.raises(OSError):
+        future.result()
+
+
+def test_change_tracker_change_failures(monkeypatch):
+    """Fetching a single change is retried, failing it after `max_failures` tries."""
+
+    def mock_get(path, query_params=None):
+        if query_params == {"select": "in-progress"}:
+            return types.SnapdResponse(type="sync", status_code=200, status="OK", result=[])
+        raise http.SnapdUnavailable()
+
+    monkeypatch.setattr(http, "get", mock_get)
+    tracker = changes.ChangeTracker(interval=3600, max_failures=2)
+    future = tracker.track("1")
+    cancelled = tracker.track("1")
+    cancelled.cancel()
+
+    tracker.poll()
+    assert not future.done()
+    tracker.poll()
+    with pytest.raises(http.SnapdUnavailable):
+        future.result()
+
+
+def test_change_tracker_survives_errors(monkeypatch):
+    """The background poller keeps going after unexpected errors."""
+    listings = [[{"id": "1"}], []]
+
+    def mock_get(path, query_params=None):
+        if query_params == {"select": "in-progress"}:
+            listed = listings.pop(0) if listings else []
+            return types.SnapdResponse(type="sync", status_code=200, status="OK", result=listed)
+        return change_response("Done", [])
+
+    monkeypatch.setattr(http, "get", mock_get)
+    tracker = changes.ChangeTracker(interval=0)
+
+    assert tracker.track("1").result(timeout=5) == change_response("Done", [])
+    assert not listings
+
+
+@pytest.fixture
+def stuck_change(monkeypatch):
+    """Patch `http` with a change that never completes, recording abort requests."""
+    aborted = []
+
+    def mock_post(path, body):
+        assert body == {"action": "abort"}
+        aborted.append(path)
+        raise http.SnapdHttpException()
+
+    monkeypatch.setattr(http, "get", lambda path: change_response("Doing", []))
+    monkeypatch.setattr(http, "post", mock_post)
+
+    return aborted
+
+
+def test_wait_change(polls):
+    """`wait_change` returns the final state of the change."""
+    assert changes.wait_change("1") == POLLS[-1]
+
+
+@pytest.mark.parametrize("abort", [True, False])
+def test_wait_change_timeout(stuck_change, abort):
+    """`wait_change` raises a `TimeoutError`, optionally aborting the change."""
+    with pytest.raises(TimeoutError):
+        changes.wait_change("1", timeout=0.05, abort=abort, interval=0.01)
+
+    assert stuck_change == (["/changes/1"] if abort else [])
+
+
+def test_await_change_timeout(stuck_change):
+    """`await_change` raises a `TimeoutError`, aborting the change."""
+    with pytest.raises(TimeoutError):
+        asyncio.run(changes.await_change("1", timeout=0.05, abort=True, interval=0.01))
+
+    assert stuck_change == ["/changes/1"]
+
+
+def test_await_change_cancelled(stuck_change):
+    """`await_change` aborts the change when the awaiting task is cancelled."""
+
+    async def wait():
+        await asyncio.wait_for(changes.await_change("1", abort=True, interval=0.01), 0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(wait())
+
+    assert stuck_change == ["/changes/1"]
+
+
+def test_await_change(polls):
+    """`await_change` returns the final state of the change."""
+    assert asyncio.run(changes.await_change("1")) == POLLS[-1]
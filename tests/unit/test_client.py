@@ -0,0 +1,169 @@
+"""Tests for `snap_http.client`, clients for talking to a particular snapd."""
+
+import pytest
+
+from snap_http import assertions, client, http, scheduler, types
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """Patch `http._make_request`, recording the client each request was made with."""
+    made = []
+
+    def mock_make_request(path, method, **kwargs):
+        active = http._client()
+        made.append((active.socket_path, method, path))
+        return {
+            "type": "sync",
+            "status-code": 200,
+            "status": "OK",
+            "result": b"type: account\naccount-id: a\n\nsig" if "assertions" in path else [],
+        }
+
+    monkeypatch.setattr(http, "_make_request", mock_make_request)
+    monkeypatch.setattr(http, "SNAPD_SOCKET", "/default")
+
+    return made
+
+
+def test_operations_use_client_socket(requests):
+    """`SnapdClient` methods make requests to the client's snapd."""
+    a = client.SnapdClient("/a")
+    b = client.SnapdClient("/b")
+
+    a.list()
+    b.install("placeholder")
+    http.get("/snaps")
+
+    assert requests == [
+        ("/a", "GET", "/snaps"),
+        ("/b", "POST", "/snaps/placeholder"),
+        ("/default", "GET", "/snaps"),
+    ]
+
+
+def test_maintenance_is_per_client():
+    """Each client keeps its own maintenance state."""
+    a = client.SnapdClient("/a")
+    b = client.SnapdClient("/b")
+
+    with b.activate():
+        http._note_maintenance({"kind": "daemon-restart"})
+
+    assert a.maintenance is None
+    assert b.maintenance == {"kind": "daemon-restart"}
+    assert http.maintenance() is None
+
+
+def test_activate(requests):
+    """Other snap_http code talks to the client's snapd inside `activate`."""
+    a = client.SnapdClient("/a")
+
+    with a.activate() as active:
+        assert active is a
+        http.get("/snaps")
+
+    assert requests == [("/a", "GET", "/snaps")]
+
+
+def test_default_socket(requests):
+    """A client without a socket path talks to the default socket."""
+    assert client.SnapdClient().socket_path == "/default"
+
+
+def test_get_assertions_through_cache(requests):
+    """A client with a `cache` looks up assertions through it."""
+    cached = client.SnapdClient("/a", cache=assertions.AssertionCache(":memory:"))
+    uncached = client.SnapdClient("/b")
+
+    cached.get_assertions("account", {"account-id": "a"})
+    cached.get_assertions("account", {"account-id": "a"})
+    uncached.get_assertions("account", {"account-id": "a"})
+
+    assert requests == [
+        ("/a", "GET", "/assertions/account"),
+        ("/b", "GET", "/assertions/account"),
+    ]
+
+
+def test_add_assertion(requests):
+    """`SnapdClient.add_assertion` adds assertions through the client's cache."""
+    cache = assertions.AssertionCache(":memory:")
+    with_cache = client.SnapdClient("/a", cache=cache)
+
+    result = with_cache.add_assertion("type: account\naccount-id: a\n\nsig")
+    client.SnapdClient("/b").add_assertion("type: account\naccount-id: b\n\nsig")
+
+    assert isinstance(result, types.SnapdResponse)
+    assert requests == [("/a", "POST", "/assertions"), ("/b", "POST", "/assertions")]
+    assert with_cache.get_assertions("account", {"account-id": "a"}).result.startswith(
+        b"type: account"
+    )
+
+
+def test_unknown_operation():
+    """Only `snap_http.api` operations are available as methods."""
+    snapd = client.SnapdClient("/a")
+
+    with pytest.raises(AttributeError):
+        snapd.not_an_operation
+    with pytest.raises(AttributeError):
+        snapd.snaps
+
+    assert "install" in dir(snapd)
+    assert snapd.install is snapd.install
+    assert repr(snapd) == "SnapdClient('/a')"
+
+
+def test_helpers_run_with_active_client(requests):
+    """Helpers running on other threads keep using the client that was active."""
+    a = client.SnapdClient("/a")
+
+    with a.activate(), scheduler.OperationScheduler() as ops:
+        ops.submit("placeholder", http.get, "/snaps").result()
+
+    assert requests == [("/a", "GET", "/snaps")]
+
+
+def test_generators_use_client_socket(monkeypatch, requests):
+    """Generators returned by client methods make their requests to the client's snapd."""
+
+    def mock_iter_result(path, *, query_params=None):
+        for item in ({"id": "1"}, {"id": "2"}):
+            http.get("/changes/" + item["id"])
+            yield item
+        return {"type": "sync"}
+
+    monkeypatch.setattr(http, "iter_result", mock_iter_result)
+    a = client.SnapdClient("/a")
+
+    changes = a.iter_changes()
+    http.get("/snaps")
+    assert [change["id"] for change in changes] == ["1", "2"]
+    assert [*a.iter_list_all()] == [{"id": "1"}, {"id": "2"}]
+
+    assert requests == [
+        ("/default", "GET", "/snaps"),
+        ("/a", "GET", "/changes/1"),
+        ("/a", "GET", "/changes/2"),
+        ("/a", "GET", "/changes/1"),
+        ("/a", "GET", "/changes/2"),
+    ]
+
+
+def test_defaults_read_at_creation(monkeypatch):
+    """Clients default to the `http` globals' values when they are created."""
+    monkeypatch.setattr(http, "COALESCE_GETS", True)
+    monkeypatch.setattr(http, "RESTART_TIMEOUT", 5.0)
+    monkeypatch.setattr(http, "MAX_RESPONSE_MEMORY", 1024)
+    monkeypatch.setattr(http, "MAX_RESPONSE_SIZE", 4096)
+
+    snapd = client.SnapdClient("/a")
+    unlimited = client.SnapdClient("/b", max_response_memory=None, max_response_size=None)
+
+    assert snapd.coalesce_gets is True
+    assert snapd.restart_timeout == 5.0
+    assert snapd.max_response_memory == 1024
+    assert snapd.max_response_size == 4096
+    assert unlimited.max_response_memory is None
+    assert unlimited.max_response_size is None
@@ -0,0 +1,146 @@
+"""Tests for `snap_http.confbuffer`, coalescing configuration writes."""
+
+import threading
+
+import pytest
+
+from snap_http import client, confbuffer, http, types
+
+
+@pytest.fixture
+def snapd(monkeypatch):
+    """Patch `http.put` to record writes, and `http.get` so that every change is done."""
+    puts = []
+    lock = threading.Lock()
+
+    def mock_put(path, body):
+        with lock:
+            puts.append((path, body))
+            change = str(len(puts))
+        return types.SnapdResponse(
+            type="async", status_code=202, status="Accepted", result=None, change=change
+        )
+
+    def mock_get(path):
+        cid = path.rsplit("/", 1)[1]
+        return types.SnapdResponse(
+            type="sync", status_code=200, status="OK", result={"id": cid, "status": "Done"}
+        )
+
+    monkeypatch.setattr(http, "put", mock_put)
+    monkeypatch.setattr(http, "get", mock_get)
+
+    return puts
+
+
+@pytest.mark.parametrize(
+    "pending, update, expected",
+    [
+        ({"a": 1}, {"b": 2}, {"a": 1, "b": 2}),
+        ({"a": 1}, {"a": 2}, {"a": 2}),
+        ({"a.b": 1, "a.c": 2, "ab": 3}, {"a": {"d": 4}}, {"ab": 3, "a": {"d": 4}}),
+        ({"a": {"b": {"c": 1}}}, {"a.b.d": 2}, {"a": {"b": {"c": 1, "d": 2}}}),
+        ({"a": {}}, {"a.b.c": 1}, {"a": {"b": {"c": 1}}}),
+        ({"a": 1}, {"a.b": 2}, None),
+        ({"a": {"b": 1}}, {"a.b.c": 2}, None),
+        ({"a": {"b": 1}}, {"a.b": None}, None),
+    ],
+)
+def test_merge_conf(pending, update, expected):
+    """`merge_conf` merges writes as if applied in order, or returns `None` if it can't."""
+    original = repr(pending)
+
+    assert confbuffer.merge_conf(pending, update) == expected
+    assert repr(pending) == original
+
+
+def test_set_conf_coalesces(snapd):
+    """Writes to a snap within the delay are sent as one request, sharing its change."""
+    with confbuffer.ConfWriteBuffer(delay=10) as buffer:
+        first = buffer.set_conf("hello", {"server.port": 8080, "debug": True})
+        second = buffer.set_conf("hello", {"server.host": "0.0.0.0", "debug": None})
+        other = buffer.set_conf("world", {"greeting": "hi"})
+
+    assert sorted(snapd) == [
+        ("/snaps/hello/conf", {"server.port": 8080, "debug": None, "server.host": "0.0.0.0"}),
+        ("/snaps/world/conf", {"greeting": "hi"}),
+    ]
+    assert first.result() is second.result()
+    assert first.result().result["status"] == "Done"
+    assert other.result() is not first.result()
+
+
+def test_set_conf_conflict_flushes(snapd):
+    """A write that can't be merged sends the pending writes first."""
+    with confbuffer.ConfWriteBuffer(delay=10) as buffer:
+        first = buffer.set_conf("hello", {"a": 1})
+        second = buffer.set_conf("hello", {"a.b": 2})
+
+    assert snapd == [("/snaps/hello/conf", {"a": 1}), ("/snaps/hello/conf", {"a.b": 2})]
+    assert first.result().result["id"] == "1"
+    assert second.result().result["id"] == "2"
+
+
+def test_set_confdb(snapd):
+    """Writes to a confdb view are coalesced separately from those to other views."""
+    with confbuffer.ConfWriteBuffer(delay=10) as buffer:
+        buffer.set_confdb("acc", "network", "setup", {"wifi.ssid": "home"})
+        buffer.set_confdb("acc", "network", "setup", {"wifi.psk": "secret"})
+        buffer.set_confdb("acc", "network", "admin", {"wifi.ssid": "work"})
+
+    assert sorted(snapd) == [
+        ("/confdb/acc/network/admin", {"values": {"wifi.ssid": "work"}}),
+        ("/confdb/acc/network/setup", {"values": {"wifi.ssid": "home", "wifi.psk": "secret"}}),
+    ]
+
+
+def test_clients(snapd, monkeypatch):
+    """Writes made with different clients are sent separately, each with its own client."""
+    sockets = []
+
+    def mock_put(path, body):
+        sockets.append(http._client().socket_path)
+        return types.SnapdResponse(
+            type="async", status_code=202, status="Accepted", result=None, change=path
+        )
+
+    monkeypatch.setattr(http, "put", mock_put)
+    a = client.SnapdClient("/a")
+    b = client.SnapdClient("/b")
+
+    with confbuffer.ConfWriteBuffer(delay=10) as buffer:
+        with a.activate():
+            buffer.set_conf("hello", {"a": 1})
+        with b.activate():
+            buffer.set_conf("hello", {"b": 2})
+
+    assert sorted(sockets) == ["/a", "/b"]
+
+
+def test_delay(snapd):
+    """Pending writes are sent once the delay after the first of them passes."""
+    buffer = confbuffer.ConfWriteBuffer(delay=0.01)
+    future = buffer.set_conf("hello", {"a": 1})
+
+    assert future.result(timeout=5).result["status"] == "Done"
+    assert snapd == [("/snaps/hello/conf", {"a": 1})]
+
+    buffer.close()
+    with pytest.raises(RuntimeError):
+        buffer.set_conf("hello", {"a": 2})
+
+
+def test_error(snapd, monkeypatch):
+    """A failed request fails the future of every write merged into it."""
+
+    def mock_put(path, body):
+        raise http.SnapdHttpException(b'{"result": {"message": "bad key"}}')
+
+    monkeypatch.setattr(http, "put", mock_put)
+
+    with confbuffer.ConfWriteBuffer(delay=10) as buffer:
+        futures = [buffer.set_conf("hello", {"a": 1}), buffer.set_conf("hello", {"b": 2})]
+
+    for future in futures:
+        with pytest.raises(http.SnapdHttpException):
+            future.result()
@@ -0,0 +1,172 @@
+"""Tests for `snap_http.connections`, the in-memory connection graph."""
+
+import pytest
+
+from snap_http import http, types
+from snap_http.connections import ConnectionGraph
+from snap_http.reconcilers import Connection
+
+
+def established(plug_snap, plug, slot_snap, slot, interface):
+    return {
+        "plug": {"snap": plug_snap, "plug": plug},
+        "slot": {"snap": slot_snap, "slot": slot},
+        "interface": interface,
+    }
+
+
+def task(kind, summary, status="Done"):
+    return {"kind": kind, "status": status, "summary": summary}
+
+
+CONNECTIONS = {
+    "established": [
+        established("hello", "network", "snapd", "network", "network"),
+        established("hello", "db", "postgres", "db", "content"),
+        established("app", "db", "postgres", "db", "content"),
+    ],
+    "plugs": [
+        {"snap": "hello", "plug": "network", "interface": "network"},
+        {"snap": "hello", "plug": "db", "interface": "content"},
+        {"snap": "hello", "plug": "camera", "interface": "camera"},
+        {"snap": "app", "plug": "db", "interface": "content"},
+    ],
+    "slots": [
+        {"snap": "snapd", "slot": "network", "interface": "network"},
+        {"snap": "snapd", "slot": "camera", "interface": "camera"},
+        {"snap": "postgres", "slot": "db", "interface": "content"},
+    ],
+}
+
+
+@pytest.fixture
+def graph():
+    return ConnectionGraph(CONNECTIONS)
+
+
+def test_queries(graph):
+    """The graph answers dependency queries from its indexes."""
+    assert len(graph) == 3
+    assert graph.depends_on("hello") == {"snapd", "postgres"}
+    assert graph.dependents("postgres") == {"hello", "app"}
+    assert graph.plugged_into("postgres", "db") == {("hello", "db"), ("app", "db")}
+    assert graph.slots_of_plug("hello", "network") == {("snapd", "network")}
+    assert graph.unconnected_plugs() == [("hello", "camera")]
+    assert graph.unconnected_plugs("app") == []
+    assert graph.unconnected_slots("snapd") == [("snapd", "camera")]
+    assert graph.connections_of_interface("content") == {
+        Connection("hello", "db", "postgres", "db"),
+        Connection("app", "db", "postgres", "db"),
+    }
+
+
+def test_add_and_discard(graph):
+    """Connections can be added and removed, keeping every index consistent."""
+    camera = Connection("hello", "camera", "snapd", "camera")
+    graph.add(camera)
+
+    assert camera in graph
+    assert graph.connections_of_interface("camera") == {camera}
+    assert graph.unconnected_plugs() == []
+
+    graph.discard(camera)
+    graph.discard(Connection("app", "db", "postgres", "db"))
+
+    assert camera not in graph
+    assert graph.connections_of_interface("camera") == set()
+    assert graph.dependents("postgres") == {"hello"}
+    assert graph.unconnected_plugs() == [("hello", "camera"), ("app", "db")]
+
+
+def test_apply_change_tasks(graph):
+    """Connect and disconnect tasks of a change are applied without reading snapd."""
+    change = {
+        "id": "5",
+        "status": "Done",
+        "tasks": [
+            task("connect", "Connect hello:camera to snapd:camera"),
+            task("disconnect", "Disconnect app:db from postgres:db"),
+            task("connect", "Connect app:x to snapd:x", "Error"),
+        ],
+    }
+
+    graph.apply_change(change)
+
+    assert Connection("hello", "camera", "snapd", "camera") in graph
+    assert Connection("app", "db", "postgres", "db") not in graph
+    assert len(graph) == 3
+
+
+def test_apply_change_refreshes_snaps(graph, monkeypatch):
+    """Other changes re-read the connections of the snaps they affected."""
+    def mock_get(path, query_params):
+        assert path == "/connections"
+        if query_params["snap"] == "app":
+            raise http.SnapNotFound(b'{"result": {"kind": "snap-not-found"}}')
+        return types.SnapdResponse(
+            type="sync",
+            status_code=200,
+            status="OK",
+            result={
+                "established": [established("hello", "network", "snapd", "network", "network")],
+                "plugs": [{"snap": "hello", "plug": "network", "interface": "network"}],
+                "slots": [{"snap": "snapd", "slot": "network", "interface": "network"}],
+            },
+        )
+
+    monkeypatch.setattr(http, "get", mock_get)
+
+    graph.apply_change({"id": "6", "data": {"snap-names": ["hello", "app"]}, "tasks": []})
+
+    assert set(graph) == {Connection("hello", "network", "snapd", "network")}
+    assert graph.plugs.keys() == {("hello", "network")}
+    assert graph.dependents("postgres") == set()
+
+
+def test_apply_change_install_and_remove(graph, monkeypatch):
+    """Installs and removals re-read their snaps, even with connects or disconnects in them."""
+
+    def mock_get(path, query_params):
+        if query_params["snap"] == "app":
+            raise http.SnapNotFound(b'{"result": {"kind": "snap-not-found"}}')
+        return types.SnapdResponse(
+            type="sync",
+            status_code=200,
+            status="OK",
+            result={
+                "established": [established("new", "network", "snapd", "network", "network")],
+                "plugs": [
+                    {"snap": "new", "plug": "network", "interface": "network"},
+                    {"snap": "new", "plug": "home", "interface": "home"},
+                ],
+                "slots": [{"snap": "snapd", "slot": "network", "interface": "network"}],
+            },
+        )
+
+    monkeypatch.setattr(http, "get", mock_get)
+
+    graph.apply_change(
+        {
+            "id": "7",
+            "data": {"snap-names": ["app"]},
+            "tasks": [
+                task("disconnect", "Disconnect app:db from postgres:db"),
+                task("unlink-snap", "Make snap 'app' unavailable"),
+            ],
+        }
+    )
+    graph.apply_change(
+        {
+            "id": "8",
+            "data": {"snap-names": ["new"]},
+            "tasks": [
+                task("link-snap", "Make snap 'new' available"),
+                task("connect", "Connect new:network to snapd:network"),
+            ],
+        }
+    )
+
+    assert graph.unconnected_plugs("app") == []
+    assert ("app", "db") not in graph.plugs
+    assert graph.unconnected_plugs("new") == [("new", "home")]
+    assert graph.depends_on("new") == {"snapd"}
@@ -0,0 +1,75 @@
+"""Tests for `snap_http.fleet`, running operations against many snapds at once."""
+
+import threading
+
+from snap_http import client, fleet, http
+
+
+def snapd_socket():
+    return http._client().socket_path
+
+
+def test_run_yields_result_per_target():
+    """`Fleet.run` runs the operation against every target, with that target's client."""
+    targets = ["/a", "/b", client.SnapdClient("/c")]
+
+    results = fleet.Fleet(targets, max_workers=2).run_all(snapd_socket)
+
+    assert [r.target for r in results] == ["/a", "/b", "/c"]
+    assert all(r.ok and r.response == r.target for r in results)
+
+
+def test_run_same_socket_twice():
+    """Targets sharing a socket path each get their own result."""
+    targets = ["/a", client.SnapdClient("/a", timeout=1), "/a"]
+
+    results = fleet.Fleet(targets, timeout=5).run_all(snapd_socket)
+
+    assert [(r.index, r.target, r.response) for r in results] == [
+        (0, "/a", "/a"),
+        (1, "/a", "/a"),
+        (2, "/a", "/a"),
+    ]
+
+
+def test_run_reports_errors():
+    """Errors are reported per target, without affecting the other targets."""
+
+    def operation():
+        if http._client().socket_path == "/b":
+            raise http.SnapdHttpException()
+        return "ok"
+
+    a, b = fleet.Fleet(["/a", "/b"]).run_all(operation)
+
+    assert a.response == "ok"
+    assert not b.ok
+    assert isinstance(b.error, http.SnapdHttpException)
+
+
+def test_run_streams_results_as_they_complete():
+    """Results are yielded as soon as they complete, and slow targets time out."""
+    release = threading.Event()
+
+    def operation():
+        if http._client().socket_path == "/slow":
+            release.wait(5)
+        return "ok"
+
+    results = fleet.Fleet(["/slow", "/fast"], timeout=0.2).run(operation)
+
+    first = next(results)
+    second = next(results)
+    release.set()
+
+    assert (first.target, first.response) == ("/fast", "ok")
+    assert (second.target, second.index) == ("/slow", 0)
+    assert isinstance(second.error, TimeoutError)
+
+
+def test_clients_use_timeout():
+    """Clients created for socket paths use the fleet's timeout."""
+    snapds = fleet.Fleet(["/a"], timeout=5)
+
+    assert snapds.clients[0].timeout == 5
+    assert snapds.clients[0].restart_timeout == 5
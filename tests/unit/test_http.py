@@ -1,5 +1,6 @@
 """Tests for `snap_http.http`, lower-level functions for interacting with Snapd via HTTP."""
 
+import copy
 import io
 import json
 import os
@@ -9,7 +10,7 @@ import threading
 
 import pytest
 
-from snap_http import http, types
+from snap_http import http, limits, types
 
 FAKE_SNAPD_SOCKET = "/tmp/testsnapd.socket"
 
@@ -313,3 +314,646 @@ def test_making_multipart_request(use_snapd_response, monkeypatch):
         thread,
         f'Content-Disposition: form-data; name="snap"; filename="{file.filename}"',
     )
+
+
+def test_exception_typed_by_kind(use_snapd_response, monkeypatch):
+    """Error responses are raised as the `SnapdHttpException` subclass for their kind."""
+    monkeypatch.setattr(http, "SNAPD_SOCKET", FAKE_SNAPD_SOCKET)
+    mock_response = {
+        "type": "error",
+        "status-code": 409,
+        "status": "Conflict",
+        "result": {
+            "message": 'snap "placeholder" has "refresh" change in progress',
+            "kind": "snap-change-conflict",
+            "value": {"change-kind": "refresh", "snap-name": "placeholder", "change-id": "7"},
+        },
+    }
+    use_snapd_response(409, mock_response)
+
+    with pytest.raises(http.SnapChangeConflict) as e:
+        http.post("/snaps/placeholder", {"action": "refresh"})
+
+    assert e.value.kind == "snap-change-conflict"
+    assert e.value.message == 'snap "placeholder" has "refresh" change in progress'
+    assert e.value.change_id == "7"
+
+
+@pytest.mark.parametrize(
+    "body, expected_cls",
+    [
+        (b'{"result": {"kind": "snap-not-found"}}', http.SnapNotFound),
+        (b'{"result": {"kind": "network-timeout"}}', http.NetworkTimeout),
+        (b'{"result": {"kind": "unknown-kind"}}', http.SnapdHttpException),
+        (b'{"result": null}', http.SnapdHttpException),
+        (b"not json", http.SnapdHttpException),
+    ],
+)
+def test_exception_from_body(body, expected_cls):
+    """`SnapdHttpException.from_body` picks the subclass for the error kind."""
+    exception = http.SnapdHttpException.from_body(body)
+
+    assert type(exception) is expected_cls
+    assert exception.args == (body,)
+
+
+@pytest.fixture
+def reset_maintenance(monkeypatch):
+    """Start each test without any maintenance notice from snapd."""
+    monkeypatch.setattr(http, "_default_client", http._ModuleClient())
+    monkeypatch.setattr(http.time, "sleep", lambda delay: None)
+
+
+def test_get_maintenance(use_snapd_response, monkeypatch, reset_maintenance):
+    """`http.get` exposes snapd's maintenance notice."""
+    monkeypatch.setattr(http, "SNAPD_SOCKET", FAKE_SNAPD_SOCKET)
+    notice = {"kind": "daemon-restart", "message": "daemon is restarting"}
+    mock_response = {
+        "type": "sync",
+        "status-code": 200,
+        "status": "OK",
+        "result": [],
+        "maintenance": notice,
+    }
+    use_snapd_response(200, mock_response)
+
+    result = http.get("/snaps")
+
+    assert result.maintenance == notice
+    assert http.maintenance() == notice
+    assert http._restart_expected()
+
+
+def test_exception_maintenance():
+    """`SnapdHttpException.maintenance` returns snapd's maintenance notice, if any."""
+    notice = {"kind": "system-restart", "message": "system is restarting"}
+
+    assert http.SnapdHttpException(json.dumps({"maintenance": notice})).maintenance == notice
+    assert http.SnapdHttpException(b"not json").maintenance is None
+
+
+@pytest.fixture
+def refusing_socket(monkeypatch):
+    """Patch `socket.socket` to refuse the first two connections, recording every attempt."""
+    attempts = []
+
+    class FakeSocket:
+        def __init__(self, family):
+            pass
+
+        def connect(self, path):
+            attempts.append(path)
+            if len(attempts) < 3:
+                raise ConnectionRefusedError()
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(http.socket, "socket", FakeSocket)
+
+    return attempts
+
+
+def test_connect_waits_for_restart(refusing_socket, reset_maintenance):
+    """`http._connect` keeps retrying while snapd refuses connections during a restart."""
+    http._note_maintenance({"kind": "daemon-restart"})
+
+    assert http._connect(FAKE_SNAPD_SOCKET) is not None
+    assert len(refusing_socket) == 3
+
+
+def test_connect_refused(refusing_socket, reset_maintenance):
+    """`http._connect` fails straight away if refused with no restart announced."""
+    with pytest.raises(http.SnapdUnavailable):
+        http._connect(FAKE_SNAPD_SOCKET)
+
+    assert len(refusing_socket) == 1
+
+
+def test_connect_missing_socket(reset_maintenance):
+    """`http._connect` fails straight away if the socket is missing with no restart announced."""
+    with pytest.raises(http.SnapdUnavailable) as e:
+        http._connect("/tmp/nonexistent-snapd.socket")
+
+    assert isinstance(e.value, ConnectionError)
+
+
+def test_connect_gives_up(monkeypatch, reset_maintenance):
+    """`http._connect` gives up after `RESTART_TIMEOUT`, even if a restart was announced."""
+    monkeypatch.setattr(http, "RESTART_TIMEOUT", 0.05)
+    http._note_maintenance({"kind": "daemon-restart"})
+
+    with pytest.raises(http.SnapdUnavailable):
+        http._connect("/tmp/nonexistent-snapd.socket")
+
+
+def test_get_coalesces_concurrent_requests(monkeypatch):
+    """Identical concurrent GETs share one request, each getting an independent result."""
+    monkeypatch.setattr(http, "COALESCE_GETS", True)
+    started = threading.Event()
+    release = threading.Event()
+    requests = []
+
+    def mock_make_request(path, method, **kwargs):
+        requests.append((path, method, kwargs))
+        started.set()
+        release.wait(5)
+        return {"type": "sync", "status-code": 200, "status": "OK", "result": [{"name": "a"}]}
+
+    monkeypatch.setattr(http, "_make_request", mock_make_request)
+    results = []
+
+    def call():
+        results.append(http.get("/snaps", query_params={"snaps": "a"}))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=call) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    calls = http._default_client.state.singleflight._calls
+    while calls[next(iter(calls))].followers < 3:
+        pass
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert requests == [("/snaps", "GET", {"query_params": {"snaps": "a"}})]
+    assert len(results) == 4
+    assert all(r.result == [{"name": "a"}] for r in results)
+    assert len({id(r.result) for r in results}) == 4
+
+
+def test_get_coalesces_exceptions():
+    """Callers waiting on a request that fails get its exception."""
+    singleflight = http._Singleflight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise http.SnapdHttpException()
+
+    def call():
+        try:
+            singleflight.do("key", fail)
+        except http.SnapdHttpException as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while singleflight._calls["key"].followers < 1:
+        pass
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert len(errors) == 2
+    assert singleflight._calls == {}
+
+
+def test_get_without_coalescing(monkeypatch):
+    """By default, every GET is sent to snapd."""
+    monkeypatch.setattr(http._Singleflight, "do", lambda *args: pytest.fail("coalesced"))
+    monkeypatch.setattr(
+        http,
+        "_make_request",
+        lambda path, method, **kwargs: {
+            "type": "sync", "status-code": 200, "status": "OK", "result": None
+        },
+    )
+
+    assert http.get("/snaps").result is None
+
+
+def test_get_with_limiter(use_snapd_response, monkeypatch):
+    """Requests go through `http.LIMITER`, if set."""
+    monkeypatch.setattr(http, "SNAPD_SOCKET", FAKE_SNAPD_SOCKET)
+    timings = []
+    monkeypatch.setattr(http, "LIMITER", limits.Limiter(reads=1, on_timing=timings.append))
+    mock_response = {"type": "sync", "status_code": 200, "status": "OK", "result": []}
+    use_snapd_response(200, mock_response)
+
+    http.get("/snaps")
+
+    assert [(t.method, t.path) for t in timings] == [("GET", "/snaps")]
+
+
+def read_response_from(raw, method="GET"):
+    """Parse `raw` as a response with `http._read_response`, as received over a socket."""
+    ours, theirs = socket.socketpair()
+    theirs.sendall(raw)
+    theirs.close()
+    try:
+        return http._read_response(ours, method)
+    finally:
+        ours.close()
+
+
+class _ShortWrites:
+    """A socket stand-in that accepts at most `limit` bytes per `sendmsg`."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.calls = []
+        self.received = bytearray()
+
+    def sendmsg(self, buffers):
+        self.calls.append(len(buffers))
+        data = b"".join(bytes(b) for b in buffers)[: self.limit]
+        self.received += data
+        return len(data)
+
+
+def test_send_all_partial_writes():
+    """`http._send_all` resumes partial writes mid-buffer and skips empty buffers."""
+    sock = _ShortWrites(limit=3)
+    http._send_all(sock, [b"head\r\n", b"", bytearray(b"body"), memoryview(b"!")])
+
+    assert sock.received == b"head\r\nbody!"
+    assert 0 not in sock.calls
+
+
+def test_send_all_iov_max(monkeypatch):
+    """`http._send_all` passes no more than `IOV_MAX` buffers per `sendmsg`."""
+    monkeypatch.setattr(http, "IOV_MAX", 2)
+    sock = _ShortWrites(limit=100)
+    http._send_all(sock, [b"a", b"b", b"c", b"d", b"e"])
+
+    assert sock.received == b"abcde"
+    assert sock.calls == [2, 2, 1]
+
+
+def test_read_response_content_length():
+    """`http._read_response` reads a body delimited by Content-Length."""
+    response = read_response_from(
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}extra"
+    )
+
+    assert response.status == 200
+    assert response.headers == {"content-type": "application/json", "content-length": "2"}
+    assert response.body == b"{}"
+
+
+def test_read_response_large_body(monkeypatch):
+    """`http._read_response` reads bodies larger than its receive buffer."""
+    monkeypatch.setattr(http, "_recv_buffers", threading.local())
+    monkeypatch.setattr(http, "RECV_BUFFER_SIZE", 16)
+    body = bytes(range(256)) * 4
+
+    ours, theirs = socket.socketpair()
+    thread = threading.Thread(
+        target=theirs.sendall,
+        args=(b"HTTP/1.1 200 OK\r\nContent-Length: 1024\r\n\r\n" + body,),
+    )
+    thread.start()
+    response = http._read_response(ours, "GET")
+    thread.join()
+    ours.close()
+    theirs.close()
+
+    assert response.body == body
+
+
+def test_read_response_chunked():
+    """`http._read_response` reads chunked bodies, skipping interim responses and trailers."""
+    response = read_response_from(
+        b"HTTP/1.1 100 Continue\r\n\r\n"
+        b"HTTP/1.1 202 Accepted\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"4;ext=1\r\nsnap\r\n5\r\n-http\r\n0\r\nTrailer: x\r\n\r\n"
+    )
+
+    assert response.status == 202
+    assert response.body == b"snap-http"
+
+
+def test_read_response_until_closed():
+    """`http._read_response` reads until the connection closes without a body length."""
+    response = read_response_from(b"HTTP/1.1 200 OK\r\n\r\nassertion")
+
+    assert response.body == b"assertion"
+
+
+def test_read_response_without_body():
+    """`http._read_response` doesn't read a body for HEAD requests or 204 responses."""
+    assert read_response_from(b"HTTP/1.1 204 No Content\r\n\r\n").body == b""
+    assert read_response_from(b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n", "HEAD").body == b""
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        b"garbage\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nshort",
+        b"HTTP/1.1 200 OK\r\nContent-",
+        b"HTTP/1.1 200 OK\r\nContent-Length: ten\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: -1\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\nhello\r\n0\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n-5\r\nhello\r\n0\r\n\r\n",
+    ],
+)
+def test_read_response_protocol_error(raw):
+    """`http._read_response` raises `HTTPProtocolError` for malformed or truncated responses."""
+    with pytest.raises(http.HTTPProtocolError):
+        read_response_from(raw)
+
+
+def test_read_response_spools_large_bodies():
+    """Bodies larger than `max_memory` are spooled and returned memory-mapped."""
+    body = b"x" * 5000
+    ours, theirs = socket.socketpair()
+    theirs.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 5000\r\n\r\n" + body)
+    theirs.close()
+
+    response = http._read_response(ours, "GET", max_memory=1024)
+    ours.close()
+
+    assert isinstance(response.body, types.SpooledBody)
+    assert response.body[:] == body
+
+    copied = copy.deepcopy(response.body)
+    assert copied.read(10) == b"x" * 10
+    assert response.body.tell() == 0
+
+
+def test_read_response_does_not_spool_json():
+    """JSON and error bodies are held in memory whatever their size, as they're decoded whole."""
+    for head in (
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n",
+        b"HTTP/1.1 404 Not Found\r\n",
+    ):
+        ours, theirs = socket.socketpair()
+        theirs.sendall(head + b"Content-Length: 5000\r\n\r\n" + b"x" * 5000)
+        theirs.close()
+
+        response = http._read_response(ours, "GET", max_memory=1024)
+        ours.close()
+
+        assert response.body == b"x" * 5000
+
+
+def test_read_response_spools_chunked_bodies():
+    """Chunked bodies are spooled once they grow past `max_memory`."""
+    ours, theirs = socket.socketpair()
+    theirs.sendall(
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"4\r\nabcd\r\n4\r\nefgh\r\n0\r\n\r\n"
+    )
+    theirs.close()
+
+    response = http._read_response(ours, "GET", max_memory=6)
+    ours.close()
+
+    assert isinstance(response.body, types.SpooledBody)
+    assert response.body[:] == b"abcdefgh"
+
+
+class PeakReader(http._ResponseReader):
+    """A `_ResponseReader` recording the most data it ever buffered."""
+
+    peak = 0
+
+    def _fill(self):
+        filled = super()._fill()
+        self.peak = max(self.peak, len(self.data))
+        return filled
+
+
+@pytest.fixture
+def chunked_socket():
+    """Send `body` in chunks of `chunk_size` on a socket, from another thread."""
+    threads = []
+    sockets = []
+
+    def send(body, chunk_size, content_type=b"application/octet-stream"):
+        ours, theirs = socket.socketpair()
+        sockets.extend([ours, theirs])
+        chunks = [
+            b"%x\r\n%s\r\n" % (len(body[i : i + chunk_size]), body[i : i + chunk_size])
+            for i in range(0, len(body), chunk_size)
+        ]
+        raw = (
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\nContent-Type: "
+            + content_type
+            + b"\r\n\r\n"
+            + b"".join(chunks)
+            + b"0\r\n\r\n"
+        )
+        threads.append(threading.Thread(target=theirs.sendall, args=(raw,)))
+        threads[-1].start()
+        return ours
+
+    yield send
+
+    for thread in threads:
+        thread.join()
+    for sock in sockets:
+        sock.close()
+
+
+def test_read_response_spooled_chunked_memory(chunked_socket):
+    """Spooling a chunked body doesn't also hold it in the reader's buffer."""
+    body = os.urandom(2 * 1024 * 1024)
+    reader = PeakReader(chunked_socket(body, 100 * 1024))
+
+    status, headers = http._read_head(reader)
+    spooled = http._read_body(reader, "GET", status, headers, max_memory=1000)
+
+    assert isinstance(spooled, types.SpooledBody)
+    assert spooled[:] == body
+    assert reader.peak <= 2 * http.RECV_BUFFER_SIZE
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n40\r\n" + b"x" * 64,
+        b"HTTP/1.1 200 OK\r\n\r\n" + b"x" * 100,
+    ],
+)
+def test_read_response_too_large(raw):
+    """Bodies larger than `max_size` raise `SnapdResponseTooLarge`."""
+    ours, theirs = socket.socketpair()
+    theirs.sendall(raw)
+    theirs.close()
+
+    with pytest.raises(http.SnapdResponseTooLarge):
+        http._read_response(ours, "GET", max_memory=10, max_size=50)
+    ours.close()
+
+
+def test_get_spooled_responses(use_snapd_response, monkeypatch):
+    """Spooled json-seq and raw bodies are decoded from their mapping."""
+    monkeypatch.setattr(http, "SNAPD_SOCKET", FAKE_SNAPD_SOCKET)
+    monkeypatch.setattr(http, "MAX_RESPONSE_MEMORY", 16)
+    records = b'\x1e{"message":"hello"}\n\x1e{"message":"world"}\n'
+    use_snapd_response(200, records, "application/json-seq")
+
+    result = http.get("/logs")
+
+    assert result.result == [{"message": "hello"}, {"message": "world"}]
+
+
+@pytest.fixture
+def serve_raw(monkeypatch):
+    """Serve one connection on a fake snapd socket, replying with the given pieces of data.
+
+    Each piece is sent after the event before it, if any, is set.
+    """
+    if os.path.exists(FAKE_SNAPD_SOCKET):
+        os.remove(FAKE_SNAPD_SOCKET)
+
+    sock = socket.socket(family=socket.AF_UNIX)
+    sock.bind(FAKE_SNAPD_SOCKET)
+    sock.listen()
+    monkeypatch.setattr(http, "SNAPD_SOCKET", FAKE_SNAPD_SOCKET)
+    threads = []
+
+    def serve(*pieces):
+        def run():
+            conn, _ = sock.accept()
+            conn.recv(1024)
+            for piece in pieces:
+                if isinstance(piece, threading.Event):
+                    piece.wait(5)
+                else:
+                    conn.sendall(piece)
+            conn.close()
+
+        threads.append(threading.Thread(target=run))
+        threads[-1].start()
+
+    yield serve
+
+    for thread in threads:
+        thread.join()
+    sock.close()
+
+
+def test_iter_result_streams_items(serve_raw, reset_maintenance):
+    """`http.iter_result` yields items before the rest of the response has arrived."""
+    second_part = threading.Event()
+    serve_raw(
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+        b"Transfer-Encoding: chunked\r\n\r\n"
+        b'1c\r\n{"type":"sync","result":[{"a\r\n'
+        b'5\r\n":1},\r\n',
+        second_part,
+        b'31\r\n{"a":2}],"maintenance":{"kind":"system-restart"}}\r\n0\r\n\r\n',
+    )
+
+    items = http.iter_result("/snaps")
+    assert next(items) == {"a": 1}
+    second_part.set()
+    assert [*items] == [{"a": 2}]
+    assert http.maintenance() == {"kind": "system-restart"}
+
+
+def test_iter_result_error(serve_raw):
+    """`http.iter_result` raises typed exceptions for error responses."""
+    body = json.dumps({"type": "error", "result": {"kind": "snap-not-found"}}).encode()
+    serve_raw(
+        b"HTTP/1.1 404 Not Found\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+
+    with pytest.raises(http.SnapNotFound):
+        [*http.iter_result("/snaps/placeholder")]
+
+
+def test_iter_result_truncated(serve_raw):
+    """`http.iter_result` raises `HTTPProtocolError` if the envelope is cut short."""
+    serve_raw(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{"result":[1,')
+
+    with pytest.raises(http.HTTPProtocolError):
+        [*http.iter_result("/snaps")]
+
+
+def test_iter_result_releases_limiter_slot(serve_raw, monkeypatch):
+    """Requests made while consuming `http.iter_result` don't wait for it to be consumed."""
+    monkeypatch.setattr(http, "LIMITER", limits.Limiter(reads=1))
+    body = b'{"type":"sync","status-code":200,"status":"OK","result":[1,2]}'
+    head = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+    response = head + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    serve_raw(response)
+    serve_raw(response)
+    results = []
+
+    def consume():
+        for item in http.iter_result("/snaps"):
+            results.append((item, http.get("/changes").result))
+            break
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    thread.join(5)
+
+    assert results == [(1, [1, 2])]
+
+
+def test_iter_result_chunked_memory(chunked_socket):
+    """Streaming a chunked result holds about one item and one receive in memory."""
+    snaps = [{"name": f"snap-{i}", "description": "x" * 500} for i in range(2000)]
+    body = json.dumps({"type": "sync", "result": snaps}).encode()
+    reader = PeakReader(chunked_socket(body, 8 * 1024, b"application/json"))
+    items = http._ResultItems()
+    received = buffered = 0
+
+    http._read_head(reader)
+    for piece in http._iter_body(reader, {"transfer-encoding": "chunked"}):
+        for item in items.feed(piece):
+            assert item == snaps[received]
+            received += 1
+        buffered = max(buffered, len(items._buffer))
+    items.close()
+
+    assert received == len(snaps)
+    assert reader.peak <= 2 * http.RECV_BUFFER_SIZE
+    assert buffered <= 2 * http.RECV_BUFFER_SIZE
+
+
+@pytest.mark.parametrize("piece_size", [1, 3, 7, 1000])
+def test_result_items_pieces(piece_size):
+    """Items are decoded the same however the body is split, including mid-character."""
+    envelope = {
+        "type": "sync",
+        "status-code": 200,
+        "result": [{"name": "café", "revision": 12345}, 67890, "x", [True, None]],
+        "sources": ["local"],
+    }
+    raw = json.dumps(envelope, ensure_ascii=False, indent=1).encode()
+
+    decoder = http._ResultItems()
+    items = []
+    for start in range(0, len(raw), piece_size):
+        items.extend(decoder.feed(raw[start : start + piece_size]))
+    decoder.close()
+
+    assert items == envelope["result"]
+    assert decoder.envelope == {"type": "sync", "status-code": 200, "sources": ["local"]}
+
+
+def test_get_mapped(serve_raw):
+    """`http.get_mapped` maps each streamed item, returning a `types.SnapdResponse`."""
+    body = json.dumps(
+        {"type": "sync", "status-code": 200, "status": "OK", "result": [1, 2, 3]}
+    ).encode()
+    serve_raw(
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+
+    result = http.get_mapped("/snaps", lambda n: n * 10)
+
+    assert result == types.SnapdResponse(
+        type="sync", status_code=200, status="OK", result=[10, 20, 30]
+    )
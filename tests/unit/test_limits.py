@@ -0,0 +1,69 @@
+"""Tests for `snap_http.limits`, limiting concurrent requests to snapd."""
+
+import threading
+import time
+
+from snap_http import limits
+
+
+def test_priority_context():
+    """`priority` sets the priority level within its context only."""
+    assert limits._priority.get() == limits.NORMAL
+
+    with limits.priority(limits.INTERACTIVE):
+        assert limits._priority.get() == limits.INTERACTIVE
+
+    assert limits._priority.get() == limits.NORMAL
+
+
+def test_slot_reports_timing():
+    """`Limiter.slot` reports queue and service time separately."""
+    timings = []
+    limiter = limits.Limiter(reads=1, on_timing=timings.append)
+
+    with limits.priority(limits.BACKGROUND), limiter.slot("GET", "/snaps"):
+        time.sleep(0.01)
+
+    [timing] = timings
+    assert (timing.method, timing.path, timing.priority) == ("GET", "/snaps", limits.BACKGROUND)
+    assert timing.queue_time < timing.service_time
+    assert timing.service_time >= 0.01
+
+
+def test_waiters_served_in_priority_order():
+    """Requests waiting for a slot are served by priority, then in arrival order."""
+    limiter = limits.Limiter(mutations=1)
+    order = []
+    threads = []
+
+    def request(name, level):
+        with limits.priority(level), limiter.slot("POST", "/snaps"):
+            order.append(name)
+
+    with limiter.slot("POST", "/snaps"):
+        for name, level in [
+            ("background", limits.BACKGROUND),
+            ("normal", limits.NORMAL),
+            ("interactive", limits.INTERACTIVE),
+            ("normal2", limits.NORMAL),
+        ]:
+            thread = threading.Thread(target=request, args=(name, level))
+            thread.start()
+            threads.append(thread)
+            while len(limiter._mutations._waiting) < len(threads):
+                time.sleep(0.001)
+
+    for thread in threads:
+        thread.join()
+
+    assert order == ["interactive", "normal", "normal2", "background"]
+
+
+def test_reads_and_mutations_have_separate_budgets():
+    """A busy mutation budget doesn't hold up reads, and no budget means no limit."""
+    limiter = limits.Limiter(reads=1, mutations=1)
+    unlimited = limits.Limiter()
+
+    with limiter.slot("POST", "/snaps"), limiter.slot("GET", "/snaps"):
+        with unlimited.slot("GET", "/snaps"), unlimited.slot("GET", "/snaps"):
+            pass
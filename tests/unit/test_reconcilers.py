@@ -0,0 +1,388 @@
+"""Tests for `snap_http.reconcilers`, converging snapd on a declared state."""
+
+import itertools
+import threading
+
+import pytest
+
+from snap_http import http, reconcilers, types
+from snap_http.reconcilers import Connection, Operation, SnapState
+
+INSTALLED = [
+    {
+        "name": "hello",
+        "revision": "42",
+        "tracking-channel": "latest/stable",
+        "status": "active",
+    },
+    {
+        "name": "lxd",
+        "revision": "100",
+        "tracking-channel": "5.21/stable",
+        "status": "active",
+        "hold": "2315-06-19T13:00:37Z",
+    },
+    {
+        "name": "old",
+        "revision": "1",
+        "tracking-channel": "latest/edge",
+        "status": "installed",
+        "install-date": "2026-02-01T10:00:00Z",
+    },
+    # Inactive revisions, kept around for reverting to.
+    {"name": "hello", "revision": "41", "tracking-channel": "latest/edge", "status": "installed"},
+    {
+        "name": "old",
+        "revision": "0",
+        "tracking-channel": "latest/beta",
+        "status": "installed",
+        "install-date": "2026-01-01T10:00:00Z",
+    },
+]
+
+
+CONNECTIONS = {
+    "established": [
+        {
+            "plug": {"snap": "hello", "plug": "network"},
+            "slot": {"snap": "snapd", "slot": "network"},
+            "interface": "network",
+        },
+        {
+            "plug": {"snap": "hello", "plug": "home"},
+            "slot": {"snap": "snapd", "slot": "home"},
+            "interface": "home",
+        },
+        {
+            "plug": {"snap": "lxd", "plug": "network"},
+            "slot": {"snap": "snapd", "slot": "network"},
+            "interface": "network",
+        },
+    ],
+    "plugs": [],
+    "slots": [],
+}
+
+
+CONF = {
+    "hello": {"greeting": "hi", "server": {"port": 80, "host": "localhost"}},
+    "lxd": {"core": {"https_address": ":8443"}},
+}
+
+
+def sync_response(result):
+    return types.SnapdResponse(type="sync", status_code=200, status="OK", result=result)
+
+
+@pytest.fixture
+def snapd(monkeypatch):
+    """Patch `http.get` and `http.post` to act as a snapd with `INSTALLED` snaps.
+
+    Every POST starts a change, which is complete unless its id is in `failing`, in which case
+    it errors. The requests made are recorded.
+    """
+    posts = []
+    gets = []
+    failing = set()
+    ids = itertools.count(1)
+    lock = threading.Lock()
+
+    def mock_get(path, **kwargs):
+        gets.append(path)
+        if path == "/snaps?select=all":
+            return sync_response(INSTALLED)
+        if path == "/connections":
+            assert kwargs == {"query_params": {"select": "all"}}
+            return sync_response(CONNECTIONS)
+        if path.endswith("/conf"):
+            name = path.split("/")[2]
+            if name not in CONF:
+                raise http.SnapNotFound(b'{"result": {"kind": "snap-not-found"}}')
+            return sync_response(CONF[name])
+        if path == "/changes":
+            return sync_response([])
+        cid = path.rsplit("/", 1)[1]
+        return sync_response({"id": cid, "status": "Error" if cid in failing else "Done"})
+
+    def mock_post(path, body):
+        with lock:
+            posts.append((path, body))
+            cid = str(next(ids))
+        return types.SnapdResponse(
+            type="async", status_code=202, status="Accepted", result=None, change=cid
+        )
+
+    monkeypatch.setattr(http, "get", mock_get)
+    monkeypatch.setattr(http, "post", mock_post)
+    monkeypatch.setattr(http, "put", mock_post)
+
+    class Snapd:
+        pass
+
+    fake = Snapd()
+    fake.posts, fake.gets, fake.failing = posts, gets, failing
+    return fake
+
+
+@pytest.mark.parametrize(
+    ("channel", "expected"),
+    [
+        ("stable", "latest/stable"),
+        ("edge/fix-1", "latest/edge/fix-1"),
+        ("5.21", "5.21/stable"),
+        ("5.21/candidate", "5.21/candidate"),
+    ],
+)
+def test_normalize_channel(channel, expected):
+    """`normalize_channel` spells out the track and risk of a channel."""
+    assert reconcilers.normalize_channel(channel) == expected
+
+
+def test_plan_converged():
+    """Nothing is planned when the installed snaps match the desired state."""
+    desired = {
+        "hello": SnapState(channel="stable", revision="42", held=False, enabled=True),
+        "lxd": {"channel": "5.21", "held": True},
+        "old": SnapState(enabled=False),
+        "gone": SnapState(present=False),
+    }
+
+    assert reconcilers.plan_snaps(desired, INSTALLED) == []
+
+
+def test_current_revisions():
+    """The active revision is current, or the most recently installed one of disabled snaps."""
+    current = reconcilers.current_revisions(INSTALLED)
+
+    assert {name: snap["revision"] for name, snap in current.items()} == {
+        "hello": "42",
+        "lxd": "100",
+        "old": "1",
+    }
+    desired = {"old": SnapState(channel="edge", revision="1")}
+    assert reconcilers.plan_snaps(desired, INSTALLED) == []
+
+
+def test_plan_groups_operations():
+    """Operations are grouped into multi-snap requests where snapd supports them."""
+    desired = {
+        "new1": SnapState(),
+        "new2": SnapState(held=True),
+        "pinned": SnapState(channel="beta"),
+        "hello": SnapState(channel="edge", held=True),
+        "lxd": SnapState(held=False),
+        "old": SnapState(present=False),
+    }
+
+    assert reconcilers.plan_snaps(desired, INSTALLED) == [
+        [
+            Operation("remove", ["old"]),
+            Operation("install", ["new1", "new2"]),
+            Operation("install", ["pinned"], {"channel": "beta"}),
+            Operation("refresh", ["hello"], {"channel": "edge"}),
+        ],
+        [
+            Operation("hold", ["new2", "hello"]),
+            Operation("unhold", ["lxd"]),
+        ],
+    ]
+
+
+def test_plan_enable_disable():
+    """Enabling and disabling is planned one snap at a time, after installs."""
+    desired = {"hello": SnapState(enabled=False), "old": SnapState(enabled=True)}
+
+    assert reconcilers.plan_snaps(desired, INSTALLED) == [
+        [Operation("enable", ["old"]), Operation("disable", ["hello"])],
+    ]
+
+
+def test_reconcile_converged(snapd):
+    """Reconciling a converged device costs a single GET."""
+    result = reconcilers.reconcile({"hello": SnapState(channel="latest/stable")})
+
+    assert not result.changed
+    assert result.ok
+    assert snapd.gets == ["/snaps?select=all"]
+    assert snapd.posts == []
+
+
+def test_reconcile(snapd):
+    """`reconcile` makes the planned requests, phase by phase, waiting on their changes."""
+    desired = {
+        "new": SnapState(),
+        "hello": SnapState(revision="43"),
+        "old": SnapState(present=False),
+        "lxd": SnapState(held=False),
+    }
+
+    result = reconcilers.reconcile(desired, poll_interval=0.01)
+
+    assert result.ok
+    assert [o.response.result["status"] for o in result.outcomes] == ["Done"] * 4
+    first_phase = [
+        ("/snaps", {"action": "remove", "snaps": ["old"]}),
+        ("/snaps", {"action": "install", "snaps": ["new"]}),
+        ("/snaps/hello", {"action": "refresh", "revision": "43"}),
+    ]
+    assert sorted(snapd.posts[:3], key=repr) == sorted(first_phase, key=repr)
+    assert snapd.posts[3] == ("/snaps", {"action": "unhold", "snaps": ["lxd"]})
+
+
+def test_reconcile_skips_failed_snaps(snapd):
+    """Later phases skip the snaps an earlier operation failed on."""
+    snapd.failing.add("1")
+    desired = {"new": SnapState(held=True), "other": SnapState(held=True)}
+
+    result = reconcilers.reconcile(desired, poll_interval=0.01)
+
+    assert not result.ok
+    assert not result.outcomes[0].ok
+    assert snapd.posts == [
+        ("/snaps", {"action": "install", "snaps": ["new", "other"]}),
+    ]
+
+
+def test_plan_connections():
+    """Only missing connections are made, and only managed snaps' extra ones removed."""
+    desired = [
+        Connection("hello", "network", "snapd", "network"),
+        ("hello", "camera", "snapd", "camera"),
+    ]
+
+    connect, disconnect = reconcilers.plan_connections(desired, CONNECTIONS)
+
+    assert connect == [Connection("hello", "camera", "snapd", "camera")]
+    assert disconnect == [Connection("hello", "home", "snapd", "home")]
+
+    _, disconnect = reconcilers.plan_connections(
+        desired, CONNECTIONS, managed_snaps=["hello", "lxd"]
+    )
+    assert disconnect == [
+        Connection("hello", "home", "snapd", "home"),
+        Connection("lxd", "network", "snapd", "network"),
+    ]
+
+
+def test_reconcile_connections_converged(snapd):
+    """Reconciling converged connections costs a single GET."""
+    desired = [
+        Connection("hello", "network", "snapd", "network"),
+        Connection("hello", "home", "snapd", "home"),
+    ]
+
+    result = reconcilers.reconcile_connections(desired)
+
+    assert not result.changed
+    assert result.ok
+    assert snapd.gets == ["/connections"]
+
+
+def test_reconcile_connections(snapd):
+    """`reconcile_connections` disconnects, then connects, waiting on the changes."""
+    desired = [Connection("hello", "camera", "snapd", "camera")]
+
+    result = reconcilers.reconcile_connections(desired)
+
+    assert result.ok
+    assert [body["action"] for _, body in snapd.posts] == ["disconnect", "disconnect", "connect"]
+    assert snapd.posts[2][1] == {
+        "action": "connect",
+        "slots": [{"snap": "snapd", "slot": "camera"}],
+        "plugs": [{"snap": "hello", "plug": "camera"}],
+    }
+    assert set(result.responses) == {
+        Connection("hello", "network", "snapd", "network"),
+        Connection("hello", "home", "snapd", "home"),
+        Connection("hello", "camera", "snapd", "camera"),
+    }
+
+
+def test_reconcile_connections_failure(snapd):
+    """Failed changes are reported in the result."""
+    snapd.failing.add("1")
+
+    result = reconcilers.reconcile_connections(
+        [Connection("hello", "network", "snapd", "network")], managed_snaps=["hello"]
+    )
+
+    assert not result.ok
+    assert result.disconnect == [Connection("hello", "home", "snapd", "home")]
+
+
+@pytest.mark.parametrize(
+    ("desired", "prune", "expected"),
+    [
+        ({"greeting": "hi", "server.port": 80}, False, {}),
+        ({"server": {"port": 8080}}, False, {"server.port": 8080}),
+        ({"server.port": 80, "new": {"a": 1}}, False, {"new": {"a": 1}}),
+        ({"greeting": None, "missing": None}, False, {"greeting": None}),
+        ({"server.port": 80}, True, {"greeting": None, "server.host": None}),
+        ({"server": 1}, False, {"server": 1}),
+    ],
+)
+def test_diff_conf(desired, prune, expected):
+    """`diff_conf` patches only the keys whose values differ."""
+    assert reconcilers.diff_conf(CONF["hello"], desired, prune=prune) == expected
+
+
+def test_reconcile_conf(snapd):
+    """Only snaps whose configuration differs are written to, with just the differences."""
+    desired = {
+        "hello": {"greeting": "hi", "server.port": 8080},
+        "lxd": {"core": {"https_address": ":8443"}},
+    }
+
+    result = reconcilers.reconcile_conf(desired)
+
+    assert result.ok
+    assert snapd.posts == [("/snaps/hello/conf", {"server.port": 8080})]
+    assert set(result.responses) == {"hello"}
+
+
+def test_reconcile_conf_converged(snapd):
+    """Reconciling converged configuration only reads it."""
+    result = reconcilers.reconcile_conf({"hello": CONF["hello"]})
+
+    assert not result.changed
+    assert snapd.posts == []
+
+
+def test_reconcile_conf_read_error(snapd):
+    """Snaps whose configuration can't be read are reported, and the others still written."""
+    result = reconcilers.reconcile_conf({"missing": {"a": 1}, "lxd": {"core.debug": True}})
+
+    assert not result.ok
+    assert isinstance(result.errors["missing"], http.SnapNotFound)
+    assert snapd.posts == [("/snaps/lxd/conf", {"core.debug": True})]
+
+
+def test_connect_interfaces(snapd):
+    """`connect_interfaces` connects each pair, in parallel where the snaps differ."""
+    result = reconcilers.connect_interfaces(
+        [("hello", "camera", "snapd", "camera"), ("other", "x11", "desktop", "x11")]
+    )
+
+    assert result.ok
+    assert result.connect == [
+        Connection("hello", "camera", "snapd", "camera"),
+        Connection("other", "x11", "desktop", "x11"),
+    ]
+    assert sorted(body["plugs"][0]["plug"] for _, body in snapd.posts) == ["camera", "x11"]
+    assert {body["action"] for _, body in snapd.posts} == {"connect"}
+
+
+def test_disconnect_interfaces(snapd):
+    """`disconnect_interfaces` disconnects each pair, aggregating the outcomes."""
+    snapd.failing.add("2")
+
+    result = reconcilers.disconnect_interfaces(
+        [("hello", "network", "snapd", "network"), ("hello", "home", "snapd", "home")]
+    )
+
+    assert not result.ok
+    assert [body["action"] for _, body in snapd.posts] == ["disconnect", "disconnect"]
+    assert result.responses[Connection("hello", "home", "snapd", "home")].result == {
+        "id": "2",
+        "status": "Error",
+    }
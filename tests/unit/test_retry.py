@@ -0,0 +1,79 @@
+"""Tests for `snap_http.retry`, retrying transient snapd errors."""
+
+import pytest
+
+from snap_http import http, retry
+
+CONFLICT = b'{"result": {"kind": "snap-change-conflict"}}'
+NOT_FOUND = b'{"result": {"kind": "snap-not-found"}}'
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the delays slept by `retry`, without actually sleeping."""
+    delays = []
+    monkeypatch.setattr(retry.time, "sleep", delays.append)
+
+    return delays
+
+
+def failing(*bodies):
+    """Return a function raising an exception for each of `bodies` in turn, then succeeding."""
+    calls = []
+
+    def func(*args, **kwargs):
+        calls.append((args, kwargs))
+        if len(calls) <= len(bodies):
+            raise http.SnapdHttpException.from_body(bodies[len(calls) - 1])
+        return "ok"
+
+    return func, calls
+
+
+def test_retries_transient_errors(sleeps):
+    """Retryable errors are retried with a backoff."""
+    func, calls = failing(CONFLICT, CONFLICT)
+
+    result = retry.RetryPolicy(base_delay=1, max_delay=3).call(func, "a", b=1)
+
+    assert result == "ok"
+    assert calls == [(("a",), {"b": 1})] * 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1
+    assert 0 <= sleeps[1] <= 2
+
+
+def test_fails_fast_on_permanent_errors(sleeps):
+    """Errors that are not retryable are raised immediately."""
+    func, calls = failing(NOT_FOUND)
+
+    with pytest.raises(http.SnapNotFound):
+        retry.RetryPolicy().call(func)
+
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    """The last error is raised after `max_attempts` attempts."""
+    func, calls = failing(CONFLICT, CONFLICT, CONFLICT)
+
+    with pytest.raises(http.SnapChangeConflict):
+        retry.RetryPolicy(max_attempts=2).call(func)
+
+    assert len(calls) == 2
+
+
+def test_decorator(sleeps):
+    """A `RetryPolicy` can decorate a function."""
+    func, calls = failing(CONFLICT)
+
+    assert retry.RetryPolicy()(func)() == "ok"
+    assert len(calls) == 2
+
+
+def test_delay_is_capped():
+    """Delays never exceed `max_delay`."""
+    policy = retry.RetryPolicy(base_delay=1, max_delay=4)
+
+    assert all(0 <= policy.delay(attempt) <= 4 for attempt in range(10))
@@ -0,0 +1,140 @@
+"""Tests for `snap_http.scheduler`, conflict-aware scheduling of snapd operations."""
+
+import json
+import threading
+
+import pytest
+
+from snap_http import http, scheduler, types
+
+CONFLICT = json.dumps(
+    {
+        "type": "error",
+        "status-code": 409,
+        "result": {
+            "message": "snap is being refreshed",
+            "kind": "snap-change-conflict",
+            "value": {"change-id": "7", "snap-name": "placeholder"},
+        },
+    }
+).encode()
+
+
+def async_response(change):
+    return types.SnapdResponse(
+        type="async", status_code=202, status="Accepted", result=None, change=change
+    )
+
+
+def done_change(cid):
+    return types.SnapdResponse(
+        type="sync", status_code=200, status="OK", result={"id": cid, "status": "Done"}
+    )
+
+
+@pytest.fixture
+def checked_changes(monkeypatch):
+    """Patch `http.get` so that every change is done, recording the changes checked."""
+    checked = []
+
+    def mock_get(path):
+        cid = path.rsplit("/", 1)[1]
+        checked.append(cid)
+        return done_change(cid)
+
+    monkeypatch.setattr(http, "get", mock_get)
+
+    return checked
+
+
+def test_conflicting_change():
+    """`conflicting_change` extracts the change-id of a change conflict."""
+    assert scheduler.conflicting_change(http.SnapdHttpException(CONFLICT)) == "7"
+    assert scheduler.conflicting_change(http.SnapdHttpException(b"not json")) is None
+    assert scheduler.conflicting_change(http.SnapdHttpException()) is None
+    assert (
+        scheduler.conflicting_change(
+            http.SnapdHttpException(b'{"result": {"kind": "snap-change-conflict"}}')
+        )
+        == ""
+    )
+
+
+def test_serializes_per_snap(checked_changes):
+    """Operations on the same snap run in order, each after the previous change completes."""
+    events = []
+
+    def operation(name, cid):
+        events.append(("start", cid))
+        return async_response(cid)
+
+    with scheduler.OperationScheduler(max_workers=4) as ops:
+        first = ops.submit("placeholder", operation, "placeholder", "1")
+        second = ops.submit("placeholder", operation, "placeholder", "2")
+
+    assert first.result() == done_change("1")
+    assert second.result() == done_change("2")
+    assert events == [("start", "1"), ("start", "2")]
+    assert checked_changes == ["1", "2"]
+
+
+def test_parallel_across_snaps(checked_changes):
+    """Operations on different snaps run at the same time."""
+    barrier = threading.Barrier(2, timeout=5)
+
+    def operation(cid):
+        barrier.wait()
+        return async_response(cid)
+
+    with scheduler.OperationScheduler(max_workers=2) as ops:
+        first = ops.submit("one", operation, "1")
+        second = ops.submit(["two"], operation, "2")
+
+    assert first.result() == done_change("1")
+    assert second.result() == done_change("2")
+
+
+def test_waits_for_conflicting_change(checked_changes):
+    """On a change conflict, the conflicting change is waited on before retrying."""
+    attempts = []
+
+    def operation():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise http.SnapdHttpException(CONFLICT)
+        return types.SnapdResponse(type="sync", status_code=200, status="OK", result=None)
+
+    with scheduler.OperationScheduler() as ops:
+        result = ops.submit("placeholder", operation).result()
+
+    assert result.type == "sync"
+    assert len(attempts) == 2
+    assert checked_changes == ["7"]
+
+
+def test_gives_up_after_conflict_retries(checked_changes):
+    """Conflicts are retried at most `conflict_retries` times."""
+
+    def operation():
+        raise http.SnapdHttpException(CONFLICT)
+
+    with scheduler.OperationScheduler(conflict_retries=2) as ops:
+        future = ops.submit("placeholder", operation)
+
+    with pytest.raises(http.SnapdHttpException):
+        future.result()
+    assert checked_changes == ["7", "7"]
+
+
+def test_other_errors_fail_fast(checked_changes):
+    """Errors other than change conflicts are not retried."""
+
+    def operation():
+        raise http.SnapdHttpException(b'{"result": {"kind": "snap-not-found"}}')
+
+    with scheduler.OperationScheduler() as ops:
+        future = ops.submit("placeholder", operation)
+
+    with pytest.raises(http.SnapdHttpException):
+        future.result()
+    assert checked_changes == []
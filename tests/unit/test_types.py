@@ -103,6 +103,29 @@ def test_reading_file_uploads():
         assert file.filename == tmp.name.split("/")[-1]
 
 
+def test_form_data_buffers():
+    """`FormData.buffers` map files instead of reading them, and add up to `serialized`."""
+    with tempfile.NamedTemporaryFile() as tmp, tempfile.NamedTemporaryFile() as empty:
+        tmp.write(b"the answer is 42")
+        tmp.flush()
+
+        files = [types.FileUpload("snap", tmp.name), types.FileUpload("snap", empty.name)]
+        body = types.FormData({"action": "install"}, files)
+
+        buffers = body.buffers
+        assert buffers[2] == files[0].buffer
+        assert not isinstance(buffers[2], bytes)
+        assert buffers[5] == b""
+        assert b"".join(buffers) == body.serialized
+        assert body.content_length == len(body.serialized)
+
+
+def test_default_buffers():
+    """Request bodies other than `FormData` are sent as their serialized form."""
+    body = types.JsonData({"action": "refresh"})
+    assert body.buffers == [body.serialized]
+
+
 def test_assertion_data_serialization():
     """Test serialization of assertion data."""
     body = types.AssertionData("assertion-header: value\n\nsignature")
@@ -126,4 +149,22 @@ def test_data_serialization_filter():
     assert resp.type == "async"
     assert resp.status_code == 200
     assert resp.status == "Accepted"
-    assert resp.result is None
\ No newline at end of file
+    assert resp.result is None
+
+
+def test_record_type():
+    """`record_type` makes one named tuple type per set of fields, with valid names."""
+    record = types.record_type(("name", "tracking-channel"))
+
+    assert record is types.record_type(("name", "tracking-channel"))
+    assert record._fields == ("name", "tracking_channel")
+
+
+def test_projector():
+    """`projector` turns snapd objects into records, missing fields as `None`."""
+    project = types.projector(["name", "revision", "status"])
+
+    snap = project({"name": "hello", "revision": "42", "summary": "hi"})
+
+    assert snap == ("hello", "42", None)
+    assert snap.name == "hello"